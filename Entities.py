@@ -15,9 +15,40 @@ from dxfwrite.entities import Polyline, Solid
 from dxfwrite.vector2d import vadd, vsub
 
 
-from maskLib.utilities import cornerRound
+from maskLib.utilities import arcSegments, cornerRound, transformPoints
+from maskLib.geometryLib import FILL_SOLID, FILL_FAN, FILL_QUADS
 
-class SolidPline(SubscriptAttributes):
+class CachedBuild:
+    ''' Caches the output of _build() so the dxf tags are only made once
+        Reassigning any attribute not listed in _derived (insert, rotation, points, colors ...) throws the cache away.
+        In-place changes to points have to call _invalidate() (add_vertex does)
+    '''
+    _derived = ('transformed_points',) #attributes written by _build itself
+    waferTolerance = None #arc tolerance of the wafer the entity is drawn on (see applyWafer)
+    waferTrueArcs = False #true arc output of that wafer
+    
+    def applyWafer(self,wafer):
+        ''' take the arc settings of the wafer this entity is drawn on (called by Chip.add) '''
+        self.waferTolerance = wafer.arcTolerance
+        self.waferTrueArcs = wafer.trueArcs
+    
+    def __setattr__(self,name,value):
+        if name not in self._derived:
+            object.__setattr__(self,'_tags',None)
+        object.__setattr__(self,name,value)
+    
+    def _invalidate(self):
+        object.__setattr__(self,'_tags',None)
+    
+    def __dxftags__(self):
+        tags = self.__dict__.get('_tags')
+        if tags is None:
+            tags = self._build()
+            object.__setattr__(self,'_tags',tags)
+        return tags
+
+
+class SolidPline(CachedBuild,SubscriptAttributes):
     ''' Shape consisting of a Polyline and solid background** if polyline has 4 points or less
             acts like a Polyline, quacks like a Polyline, but generates a polyline + solid when dxf tags are called
         If polyline has >4 points, builds up solid out of triangles starting at first point
@@ -59,10 +90,8 @@ class SolidPline(SubscriptAttributes):
         return data
         
     def _transform_points(self,points):
-        return [vadd(self.insert,  # move to insert point
-                            rotate_2d(  # rotate at origin
-                                point, self.rotation))
-                       for point in points]
+        #rotate at origin, move to insert point
+        return transformPoints(points,self.insert,self.rotation)
         
     def _build_polyline(self):
         '''Build the polyline (key component)'''
@@ -80,7 +109,10 @@ class SolidPline(SubscriptAttributes):
             
     def add_vertex(self,point,**kwargs):
         '''add a vertex located at point, dump kwargs'''
+        if isinstance(self.points,np.ndarray):
+            self.points = self.points.tolist()
         self.points.append(point)
+        self._invalidate()
 
     def _build_solid(self):
         """ build a single unified background solid (only works for 4 points)"""
@@ -91,18 +123,45 @@ class SolidPline(SubscriptAttributes):
         solidpts = [self.transformed_points[j] for j in [0,i+1,i+2]]
         return Solid(solidpts, color=self.bgcolor, layer=self.layer) 
     
+    def _arc_bulge(self):
+        #bulge of the inner edge going from start to end (clockwise before flips)
+        return -math.tan(self.angle/4)*self.hflip*self.vflip
+    
+    def _build_arc_polyline(self):
+        ''' outline with the two curved edges as bulge arcs: inner start, inner end, outer end, outer start '''
+        polyline = Polyline([], color=self.color, layer=self.layer,flags=0)
+        bulge = self._arc_bulge()
+        for j,b in zip([0,self.segments+1,self.segments+2,-1],[bulge,0,-bulge,0]):
+            polyline.add_vertex(tuple(self.points[j].tolist()),**(b and {'bulge':b} or {}))
+        polyline.close()
+        if self.linetype is not None:
+            polyline['linetype'] = self.linetype
+        return polyline
+    
+    def _build_arc_fill(self):
+        ''' fill as a single wide polyline arc along the centerline (covers the annular sector exactly) '''
+        start = ((self.points[0]+self.points[-1])/2).tolist()
+        end = ((self.points[self.segments+1]+self.points[self.segments+2])/2).tolist()
+        fill = Polyline([], color=self.bgcolor, layer=self.layer,flags=0,startwidth=self.rmax-self.rmin,endwidth=self.rmax-self.rmin)
+        fill.add_vertex(tuple(start),bulge=self._arc_bulge())
+        fill.add_vertex(tuple(end))
+        return fill
+    
     def _build_solid_quad(self,i,center=None):
         ''' build a single background solid quadrangle segment '''
         solidpts = [self.transformed_points[j] for j in [i,i+1,-i-2,-i-1]]
         return Solid(solidpts, color=self.bgcolor, layer=self.layer) 
     
+    def toGeometry(self,store):
+        ''' append the finished shape to a GeometryStore instead of building dxf entities '''
+        self.transformed_points = self._transform_points(self.points)
+        fill = len(self.points) <= 4 and FILL_SOLID or self.solidFillQuads and FILL_QUADS or FILL_FAN
+        store.add(self.transformed_points,self.layer,self.color,self.bgcolor,fill,self.linetype)
+    
     def __dxf__(self):
         ''' get the dxf string '''
         return dxfstr(self.__dxftags__())
     
-    def __dxftags__(self):
-        return self._build()
-
 
 
     
@@ -183,8 +242,9 @@ class CurveRect(SolidPline):
         Connects two flat edges separated by an angle: one or two connecting edges may be curved
     '''
     name = 'CURVERECT'
+    _derived = ('transformed_points','points','rmin','rmax','segments')
     
-    def __init__(self,insert,height,radius,roffset=0,angle=90,ptDensity=60,rotation=0.,color=const.BYLAYER,bgcolor=None,layer='0',linetype=None,ralign=const.BOTTOM,valign=const.BOTTOM,vflip=False,hflip=False, **kwargs):
+    def __init__(self,insert,height,radius,roffset=0,angle=90,ptDensity=60,rotation=0.,color=const.BYLAYER,bgcolor=None,layer='0',linetype=None,ralign=const.BOTTOM,valign=const.BOTTOM,vflip=False,hflip=False,trueArc=None, **kwargs):
         self.insert = insert
         self.rotation = math.radians(rotation)
         self.color = color
@@ -198,13 +258,17 @@ class CurveRect(SolidPline):
         self.height = height
         
         self.roffset=roffset
+        self.angleDeg = angle
         self.angle = math.radians(angle)
-        self.segments = max(int(ptDensity*angle/360),1)
+        self.ptDensity = ptDensity
         
         self.vflip = vflip and -1 or 1
         self.hflip = hflip and -1 or 1
         
         self.r0 = radius
+        self.segments = self._segments()
+        #write the curved edges as bulge arcs (and the fill as one wide arc) instead of segments and solids. None: as the wafer
+        self.trueArc = trueArc
         
     def _get_radius_align(self):
 
@@ -236,6 +300,12 @@ class CurveRect(SolidPline):
         self.points = self._calc_points(ralign)
         align_vector = self._get_align_vector()
         self._transform_points(align_vector)
+        if self._useTrueArc() and self.rmin > 0:
+            if self.color is not None:
+                data.append(self._build_arc_polyline())
+            if self.bgcolor is not None:
+                data.append(self._build_arc_fill())
+            return data
         if self.color is not None:
             data.append(self._build_polyline())
         if self.bgcolor is not None:
@@ -250,29 +320,38 @@ class CurveRect(SolidPline):
         return data
         
     def _transform_points(self,align):
-        self.points = [vadd(self.insert,  # move to insert point
-                            rotate_2d(  # rotate at origin
-                                ((point[0]+align[0])*self.hflip,(point[1]+align[1])*self.vflip), self.rotation))
-                       for point in self.points]
+        #align and flip, rotate at origin, move to insert point
+        self.points = transformPoints((self.points + np.array(align))*(self.hflip,self.vflip),self.insert,self.rotation)
+    
+    def _useTrueArc(self):
+        return self.trueArc if self.trueArc is not None else self.waferTrueArcs
+    
+    def _segments(self):
+        #outer radius bounds the chord error
+        return arcSegments(abs(self.r0)+abs(self.roffset)+abs(self.height),self.angleDeg,self.waferTolerance) or max(int(self.ptDensity*self.angleDeg/360),1)
     
     def _calc_points(self,align):
         #align=self._get_align_vector()
+        self.segments = self._segments()
         self.rmin=self.r0+align[1]+self.roffset
         self.rmax=self.r0+self.height+align[1]+self.roffset
         
         dTheta = self.angle/self.segments
-        pts = []
+        theta = (np.arange(self.segments)+0.5)*dTheta
         if self.rmin <=0:
             if self.angle%(2*math.pi) != math.radians(90):  #not designed for doing more than one nicely rounded corner at a time
                 self.rmin = 0
-            pts = [(0,self.rmin-self.r0),(self.rmax*math.sin(self.angle)-self.rmin,self.rmax*math.cos(self.angle)-self.r0+self.rmin)]
-            pts = pts + [(self.rmax*math.sin(self.angle-(i+0.5)*dTheta)-self.rmin,self.rmax*math.cos(self.angle-(i+0.5)*dTheta)-self.r0) for i in range(self.segments)] + [(0,self.rmax - self.r0)]
+            pts = np.vstack(([(0,self.rmin-self.r0),(self.rmax*math.sin(self.angle)-self.rmin,self.rmax*math.cos(self.angle)-self.r0+self.rmin)],
+                             np.column_stack((self.rmax*np.sin(self.angle-theta)-self.rmin,self.rmax*np.cos(self.angle-theta)-self.r0)),
+                             [(0,self.rmax - self.r0)]))
         else:
-            pts = [(0,self.rmin-self.r0)]+[(self.rmin*math.sin((i+0.5)*dTheta),self.rmin*math.cos((i+0.5)*dTheta)-self.r0) for i in range(self.segments)]+[(self.rmin*math.sin(self.angle),self.rmin*math.cos(self.angle)-self.r0)]
-            pts = pts + [(self.rmax*math.sin(self.angle),self.rmax*math.cos(self.angle)-self.r0)] + [(self.rmax*math.sin(self.angle-(i+0.5)*dTheta),self.rmax*math.cos(self.angle-(i+0.5)*dTheta)-self.r0) for i in range(self.segments)] + [(0,self.rmax - self.r0)]
+            pts = np.vstack(([(0,self.rmin-self.r0)],
+                             np.column_stack((self.rmin*np.sin(theta),self.rmin*np.cos(theta)-self.r0)),
+                             [(self.rmin*math.sin(self.angle),self.rmin*math.cos(self.angle)-self.r0),(self.rmax*math.sin(self.angle),self.rmax*math.cos(self.angle)-self.r0)],
+                             np.column_stack((self.rmax*np.sin(self.angle-theta),self.rmax*np.cos(self.angle-theta)-self.r0)),
+                             [(0,self.rmax - self.r0)]))
         
-        
-        return [vsub(pt,align) for pt in pts]
+        return pts - align
     
     def _build_polyline(self):
         '''Build the polyline (key component)'''
@@ -293,13 +372,19 @@ class CurveRect(SolidPline):
         solidpts = [self.points[j] for j in [0,i+1,i+2]]
         return Solid(solidpts, color=self.bgcolor, layer=self.layer)  
     
+    def toGeometry(self,store):
+        ''' append the finished shape to a GeometryStore instead of building dxf entities '''
+        self.points = self._calc_points(self._get_radius_align())
+        self._transform_points(self._get_align_vector())
+        i = store.add(self.points,self.layer,self.color,self.bgcolor,self.rmin <= 0 and FILL_FAN or FILL_QUADS,self.linetype)
+        if self._useTrueArc() and self.rmin > 0:
+            #the segmented polygon stays in the store for geometry, the dxf gets the arcs
+            store.exact[i] = self
+    
     def __dxf__(self):
         ''' get the dxf string '''
         return dxfstr(self.__dxftags__())
     
-    def __dxftags__(self):
-        return self._build() 
-
     
 class RoundRect(SolidPline):
     ''' Rectangle with rounded edges. Consists of a closed polyline and multiple solids faces.
@@ -329,24 +414,29 @@ class RoundRect(SolidPline):
             self.roundCorners = [0,0,0,0]
         
         SolidPline.__init__(self,insert,points=self._calc_corners(), **kwargs)
-        
+    
+    def applyWafer(self,wafer):
+        #corners are made in __init__, redo them for the wafer's tolerance
+        if wafer.arcTolerance != self.waferTolerance:
+            SolidPline.applyWafer(self,wafer)
+            self.points = self._calc_corners()
 
     def _calc_corners(self):
         square_points = [(0., 0.), (self.width, 0.), (self.width, self.height),
                   (0., self.height)]
         align_vector=self._get_align_vector()
         
-        points = [self._get_flipped_point(vadd((0.,self.height/2),align_vector))]
         quadrants = [3,4,1,2]
         
+        points = [[(0.,self.height/2)]]
         for i,sqpt in enumerate(square_points):
             if self.roundCorners[i]:
-                for p in cornerRound(sqpt, quadrants[i], self.radius,clockwise=False,ptDensity=self.ptDensity):
-                    points.append(self._get_flipped_point(vadd(align_vector,p)))
+                points.append(cornerRound(sqpt, quadrants[i], self.radius,clockwise=False,ptDensity=self.ptDensity,tolerance=self.waferTolerance))
             else:
-                points.append(self._get_flipped_point(vadd(align_vector,sqpt)))
+                points.append([sqpt])
         
-        return points
+        #align and flip all points at once
+        return (np.concatenate(points) + np.array(align_vector))*(self.hflip and -1 or 1,self.vflip and -1 or 1)
 
     def _get_align_vector(self):
         if self.halign == const.CENTER:
@@ -373,10 +463,11 @@ class RoundRect(SolidPline):
         return ((point[0]*cx,point[1]*cy))
 
 
-class InsideCurve(SubscriptAttributes):
+class InsideCurve(CachedBuild,SubscriptAttributes):
     ''' Filled inside corner rounded to radius r consisting of a single Polyline and a number of background solids
     '''
     name = 'INSIDECURVE'
+    _derived = ('transformed_points','points','segments')
     
     def __init__(self,insert,radius,angle=90,ptDensity=60,rotation=0.,color=const.BYLAYER,bgcolor=None,layer='0',linetype=None,halign=const.RIGHT,vflip=False,hflip=False, **kwargs):
         self.insert = insert
@@ -391,7 +482,9 @@ class InsideCurve(SubscriptAttributes):
         self.r0 = radius
         self.angle = math.radians(angle)
         self.curve_angle = math.radians(180-angle)
-        self.segments = int(ptDensity*abs(180-angle)/360)
+        self.angleDeg = angle
+        self.ptDensity = ptDensity
+        self.segments = self._segments()
         
         self.vflip = vflip and -1 or 1
         self.hflip = hflip and -1 or 1
@@ -421,21 +514,20 @@ class InsideCurve(SubscriptAttributes):
         return data
         
     def _transform_points(self):
-        align = self._get_align_vector()
-        self.points = [vadd(self.insert,  # move to insert point
-                            rotate_2d(  # rotate at origin
-                                vadd((point[0]*self.hflip,point[1]*self.vflip),align), self.rotation))
-                       for point in self.points]
+        #flip and align, rotate at origin, move to insert point
+        self.points = transformPoints(self.points*(self.hflip,self.vflip) + np.array(self._get_align_vector()),self.insert,self.rotation)
+    
+    def _segments(self):
+        return arcSegments(self.r0,180-self.angleDeg,self.waferTolerance) or int(self.ptDensity*abs(180-self.angleDeg)/360)
     
     def _calc_points(self):
         #align=self._get_align_vector()
+        self.segments = self._segments()
         center = (-self.r0/math.tan(self.angle/2),-self.r0)
         
         dTheta = self.curve_angle/self.segments
-        pts = []
-        pts = [(0,0)]+[vadd((self.r0*math.sin(i*dTheta),self.r0*math.cos(i*dTheta)),center) for i in range(self.segments+1)]
-        
-        return pts
+        theta = np.arange(self.segments+1)*dTheta
+        return np.vstack(([(0,0)],np.column_stack((self.r0*np.sin(theta)+center[0],self.r0*np.cos(theta)+center[1]))))
     
     def _build_polyline(self):
         '''Build the polyline (key component)'''
@@ -450,13 +542,16 @@ class InsideCurve(SubscriptAttributes):
         solidpts = [self.points[j] for j in [0,i+1,i+2]]
         return Solid(solidpts, color=self.bgcolor, layer=self.layer)  
     
+    def toGeometry(self,store):
+        ''' append the finished shape to a GeometryStore instead of building dxf entities '''
+        self.points = self._calc_points()
+        self._transform_points()
+        store.add(self.points,self.layer,self.color,self.bgcolor,FILL_FAN,self.linetype)
+    
     def __dxf__(self):
         ''' get the dxf string '''
         return dxfstr(self.__dxftags__())
     
-    def __dxftags__(self):
-        return self._build() 
-    
 
 class Star(SolidPline, InsideCurve):
     ''' Six branch star shape consisting of a single Polyline and a number of background solids
@@ -5,6 +5,12 @@ Created on Fri Jan  5 12:35:23 2018
 @author: sasha
 """
 import math
+import copy
+import multiprocessing
+from collections.abc import MutableMapping
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 from dxfwrite import const
 #force all 2D polylines by disabling 3D polyline flags
@@ -15,6 +21,11 @@ from dxfwrite import DXFEngine as dxf
 from dxfwrite.vector2d import vadd,midpoint,vmul_scalar,vsub
 from dxfwrite.algebra import rotate_2d
 
+from maskLib.booleanLib import boolean, rings, trapezoidPolygons, trapezoids
+from maskLib.exportLib import ChipCache, DXFStream, GDSWriter, Raster, drawingGeometry
+from maskLib.geometryLib import FILL_FAN, GeometryRun, GeometryStore, SpatialIndex, polygonBoxes, rectangleCover
+from maskLib.profileLib import Profiler, activeProfiler, profiled, startProfiler, stopProfiler
+
 
 
 # ===============================================================================
@@ -91,17 +102,83 @@ def skewRect(corner,width,height,offset,newLength,edge=1,**kwargs):
     taper.close()
     return taper
 
+# ===============================================================================
+#  WAFER TILING
+# ===============================================================================
+
+def tileWafer(chipX,chipY,waferDiameter,padding=0,flat=0,notch=0,singleChipRow=False,singleChipColumn=False):
+    '''
+    Lower left corners of all chips (chipX by chipY, including saw) that fit on the wafer, on a lattice with
+    chip edges on the x and y axes (or centered on the axis for a single row / column).
+    A chip fits if all its corners are inside waferDiameter/2-padding, it is at least padding above the
+    flat (chord of length flat at the bottom) and at least padding away from the notch (radius notch at the bottom edge).
+    Returns a structured array (x, y, col, row), sorted left to right, then bottom to top.
+    '''
+    r2 = (waferDiameter/2 - padding)**2
+    #lattice big enough to cover the wafer, as integer multiples of the chip size
+    nx,ny = int(waferDiameter/chipX)+1,int(waferDiameter/chipY)+1
+    kx = np.array([-0.5]) if singleChipColumn else np.arange(-nx,nx)
+    ky = np.array([-0.5]) if singleChipRow else np.arange(-ny,ny)
+    kx,ky = [k.ravel() for k in np.meshgrid(kx,ky,indexing='ij')]
+    #farthest corner from the center, in chip units (a single row keeps the full chip height, as before)
+    fx = np.maximum(np.abs(kx),np.abs(kx+1))
+    fy = np.ones_like(ky) if singleChipRow else np.maximum(np.abs(ky),np.abs(ky+1))
+    if singleChipRow and singleChipColumn:
+        fits = np.ones(1,dtype=bool)
+    else:
+        fits = (fy*chipY)**2 + (fx*chipX)**2 < r2
+    x,y = kx*chipX,ky*chipY
+    if flat:
+        fits &= y >= -math.sqrt((waferDiameter/2)**2 - (flat/2)**2) + padding
+    if notch:
+        #distance from the notch center (bottom edge of the wafer) to the chip rectangle
+        dx = np.maximum(np.maximum(x,-(x+chipX)),0)
+        dy = np.maximum(np.maximum(y+waferDiameter/2,-(y+chipY+waferDiameter/2)),0)
+        fits &= dx**2 + dy**2 >= (notch+padding)**2
+    x,y = x[fits],y[fits]
+    grid = np.zeros(len(x),dtype=[('x','f8'),('y','f8'),('col','i8'),('row','i8')])
+    grid['x'],grid['y'] = x,y
+    if len(x):
+        grid['col'] = np.rint((x-x.min())/chipX)
+        grid['row'] = np.rint((y-y.min())/chipY)
+    return grid[np.lexsort((y,x))]
+
+# ===============================================================================
+#  CHIP BUILD WORKERS (used by Wafer.buildChips)
+# ===============================================================================
+_workerWafer = None
+
+def _initChipWorker(wafer):
+    global _workerWafer
+    _workerWafer = wafer
+
+def _buildChipWorker(factory):
+    #build one chip on a fresh copy of the template wafer, return it detached along with any wafer changes
+    wafer = copy.deepcopy(_workerWafer)
+    chip = factory[0](wafer,*(len(factory)>1 and factory[1] or ()),**(len(factory)>2 and factory[2] or {}))
+    if wafer.flattenXOR:
+        #booleans run here, in parallel with the other chips
+        chip.flattenXOR()
+    if wafer.mergeLayers:
+        chip.mergeLayers()
+    chip.wafer = None
+    layers = [(name,wafer.layerColors[name]) for name in wafer.layerNames[len(_workerWafer.layerNames):]]
+    attrs = {k:v for k,v in wafer.__dict__.items() if k not in _workerWafer.__dict__}
+    return chip,layers,attrs
+
 # ===============================================================================
 #  WAFER CLASS  
 #       master class designed to handle all layers, main dxf drawing and stores chips
 # ===============================================================================
 class Wafer:
 
-    def __init__(self,name,path,chipWidth,chipHeight,waferDiameter=50800,padding=2500,sawWidth=203.2,frame=True,markers=True,solid=False,multiLayer=True,singleChipRow=False,singleChipColumn=False):
+    def __init__(self,name,path,chipWidth,chipHeight,waferDiameter=50800,padding=2500,sawWidth=203.2,frame=True,markers=True,solid=False,multiLayer=True,singleChipRow=False,singleChipColumn=False,stream=False,arcTolerance=None,trueArcs=False,flat=0,notch=0,flattenXOR=False,mergeLayers=False,profile=False):
         # initialize drawing
         self.fileName = name
         self.path = path
         self.drawing = dxf.drawing(path + name + '.dxf')
+        #streaming mode: chip blocks are written to disk as they are saved (bounded memory)
+        self.stream = stream and DXFStream(path + name + '.dxf') or None
         
         #get rid of extra layers (we still want '0', and 'VIEWPORTS')
         self.drawing.tables.layers.clear()
@@ -114,12 +191,24 @@ class Wafer:
         self.sawWidth = sawWidth
         self.chipX = chipWidth + sawWidth
         self.chipY = chipHeight + sawWidth
+        self.flat = flat                #length of the wafer flat (0: no flat)
+        self.notch = notch              #radius of the wafer notch (0: no notch)
         self.frame = frame              #draw frame layer?
         self.markers = markers
         self.solid = solid              #draw things solid?
         self.multiLayer = multiLayer    #draw in multiple layers?
         self.singleChipRow = singleChipRow #draw only one row of chips? (horizontal row)
         self.singleChipColumn = singleChipColumn #draw only one column of chips? (vertical column)
+        self.arcTolerance = arcTolerance #max chord error for arcs, overrides ptDensity (None: use ptDensity). Chips read it from their wafer
+        self.trueArcs = trueArcs #write curved edges as dxf bulge arcs where supported (bends). Chips read it from their wafer
+        self.flattenXOR = flattenXOR #write ( LAYERS ) xor XLAYER in each chip instead of the XOR layer. True: chip layer, or a list of layers
+        self.mergeLayers = mergeLayers #union touching polygons in each chip when it is saved. True: all layers, or a list of layers
+        self.profiler = profile and Profiler(name) or None #record time and geometry per component call (see profileLib)
+        if self.profiler is not None:
+            startProfiler(self.profiler)
+        elif activeProfiler() is not None and not activeProfiler().stack:
+            #a new unprofiled wafer ends the previous wafer's profile (wafers made inside a profiled call, like the copy in Chip.save, don't)
+            stopProfiler()
         
         # initialize default layers
         self.layerNames = ['0']
@@ -130,6 +219,8 @@ class Wafer:
         # initialize private variables
         self.chipPts = [] #chip offsets, measring from lower left corner
         self.chipColumns = [] #chip columns
+        self.chipGrid = None #structured array of chip positions with col / row indices
+        self.chipIndex = None #chip index by [col,row], -1 for no chip
         self.chips = [] #cached chip references
         self.defaultChip = None
         
@@ -152,6 +243,8 @@ class Wafer:
         self.waferDiameter = wafer.waferDiameter
         self.padding = wafer.padding
         self.sawWidth = wafer.sawWidth
+        self.flat = wafer.flat
+        self.notch = wafer.notch
         self.chipY = wafer.chipY
         self.chipX = wafer.chipX
         self.frame = wafer.frame              #draw frame layer?
@@ -163,12 +256,77 @@ class Wafer:
         self.layerNums = wafer.layerNums
         self.layerNames = wafer.layerNames
         self.defaultLayer = wafer.defaultLayer 
+        self.arcTolerance = wafer.arcTolerance
+        self.trueArcs = wafer.trueArcs
+        self.flattenXOR = wafer.flattenXOR
+        self.mergeLayers = wafer.mergeLayers
         
         #ignore private vars
     
+    @profiled
     def save(self):
-        self.drawing.save()
+        if self.stream is not None:
+            self.stream.save(self.drawing)
+        else:
+            self.drawing.save()
         print('Saved as: '+ '\x1b[36m' + self.path + self.fileName + '.dxf'+'\x1b[0m')
+        self._endProfile()
+    
+    @profiled
+    def saveGDS(self,precision=1e-3):
+        #write the wafer as GDSII: layerNums become GDS layers, chip blocks become structures
+        if self.stream is not None:
+            print('\x1b[33mError:\x1b[0m Cannot write GDS for streaming wafer '+self.fileName+' (blocks are already on disk)')
+            return
+        GDSWriter(self.path + self.fileName + '.gds',self.layerNums,libName=self.fileName,precision=precision,arcTolerance=self.arcTolerance).save(self.drawing.blocks.blocks,self.drawing.entities.entities,self.fileName)
+        print('Saved as: '+ '\x1b[36m' + self.path + self.fileName + '.gds'+'\x1b[0m')
+    
+    def saveProfile(self,path=None,format=None):
+        ''' write the build profile (Wafer(...,profile=True)) as speedscope json, or as chrome trace json with format='trace' '''
+        if self.profiler is None:
+            print('\x1b[33mError:\x1b[0m Wafer '+self.fileName+' is not profiled (use profile=True)')
+            return
+        if path is None:
+            path = self.path + self.fileName + (format == 'trace' and '.trace.json' or '.speedscope.json')
+        self._endProfile()
+        self.profiler.save(path,format)
+        print('Saved as: '+ '\x1b[36m' + path +'\x1b[0m')
+    
+    def _endProfile(self):
+        #the profile of a wafer ends when it is saved, later wafers and calls are not recorded in it
+        if self.profiler is not None and activeProfiler() is self.profiler:
+            stopProfiler()
+    
+    @profiled
+    def preview(self,path=None,dpi=500,alpha=0.6):
+        '''
+        Rasterize the wafer to a png at dpi pixels per inch of mask, layers in their dxf colors.
+        Each distinct chip is rasterized once and copied to all of its chipPts.
+        path: file name (default: next to the dxf)
+        '''
+        if self.stream is not None:
+            print('\x1b[33mError:\x1b[0m Cannot preview streaming wafer '+self.fileName+' (chips are already on disk)')
+            return
+        if path is None:
+            path = self.path + self.fileName + '.png'
+        pixel = 25400./dpi
+        top = drawingGeometry(self.drawing.entities.entities,self.drawing.blocks.blocks,set(chip.ID for chip in self.chips))
+        #everything on the wafer level plus all chip cells
+        boxes = polygonBoxes(top)
+        pts = np.reshape(self.chipPts,(-1,2))
+        x0,y0 = np.min(np.r_[boxes[0],pts[:,0]]),np.min(np.r_[boxes[1],pts[:,1]])
+        x1,y1 = np.max(np.r_[boxes[2],pts[:,0]+self.chipX]),np.max(np.r_[boxes[3],pts[:,1]+self.chipY])
+        if x0 > x1:
+            print('\x1b[33mError:\x1b[0m Nothing to preview in '+self.fileName)
+            return
+        raster = Raster(x0,y0,x1-x0,y1-y0,pixel).paint([top],self.layerColors,self.layerNames,alpha=alpha)
+        tiles = {}
+        for chip,pt in zip(self.chips,self.chipPts):
+            if chip.ID not in tiles:
+                tiles[chip.ID] = chip.raster(pixel,alpha)
+            raster.blit(tiles[chip.ID],*self.chipSpace(pt))
+        raster.save(path)
+        print('Saved as: '+ '\x1b[36m' + path +'\x1b[0m')
     
     def lyr(self,layerName):
         return self.multiLayer and layerName or '0'
@@ -180,6 +338,16 @@ class Wafer:
         else:
             return self.solid and self.layerColors[self.lyr(layerName)] or None
     
+    def hasBlock(self,name):
+        return (self.stream is not None and self.stream.hasBlock(name)) or name in self.drawing.blocks.blocks
+    
+    def addBlock(self,block):
+        #register a block definition with the drawing (goes straight to disk in streaming mode)
+        if self.stream is not None:
+            self.stream.writeBlock(block)
+        else:
+            self.drawing.blocks.add(block)
+    
     def addLayer(self,layerName,layerColor):
         if layerName not in self.layerNames:
             self.layerNames.append(layerName)
@@ -237,46 +405,25 @@ class Wafer:
         if self.frame:
             self.drawing.add(dxf.circle(radius=self.waferDiameter/2,center=(0,0),layer=fr))
             self.drawing.add(dxf.circle(radius=self.waferDiameter/2-self.padding,center=(0,0),layer=fr))
-        #determine number of chips, chip layout and coordinates
-        nx=0
-        ny=0
+        if self.frame and self.flat:
+            yflat = -math.sqrt((self.waferDiameter/2)**2 - (self.flat/2)**2)
+            self.drawing.add(dxf.line((-self.flat/2,yflat),(self.flat/2,yflat),layer=fr))
+        if self.frame and self.notch:
+            self.drawing.add(dxf.circle(radius=self.notch,center=(0,-self.waferDiameter/2),layer=fr))
+        #determine number of chips, chip layout and coordinates (sorted left to right, then bottom to top)
+        self.chipGrid = tileWafer(self.chipX,self.chipY,self.waferDiameter,self.padding,self.flat,self.notch,self.singleChipRow,self.singleChipColumn)
+        self.chipPts = np.column_stack((self.chipGrid['x'],self.chipGrid['y'])).tolist()
+        #chip index lookup by [col,row], -1 where there is no chip
+        self.chipIndex = np.full((self.chipGrid['col'].max(initial=-1)+1,self.chipGrid['row'].max(initial=-1)+1),-1,dtype=np.int64)
+        self.chipIndex[self.chipGrid['col'],self.chipGrid['row']] = np.arange(len(self.chipGrid))
+        #chip counts of the columns from left to center
         if self.singleChipColumn:
-            if self.singleChipRow:
-                #only one chip on the wafer
-                self.chipPts.append([-0.5*self.chipX,-0.5*self.chipY])
-                self.chipColumns.append(1)
-            else:
-                #vertical column of chips, symmetric about X axis
-                while((ny+1)*self.chipY)**2 + ((0.5)*self.chipX)**2 < (self.waferDiameter/2 - self.padding)**2:
-                    self.chipPts.append([-0.5*self.chipX,ny*self.chipY])
-                    self.chipPts.append([-0.5*self.chipX,(-ny-1)*self.chipY])
-                    ny += 1
-                self.chipColumns.append(2*ny)
-                nx += 1
+            self.chipColumns = [len(self.chipGrid)]
         elif self.singleChipRow:
-            #horizontal row of chips, symmetric about Y axis
-            while ((nx+1)*self.chipX)**2 + self.chipY**2 < (self.waferDiameter/2 - self.padding)**2:
-                self.chipPts.append([nx*self.chipX,-0.5*self.chipY])
-                self.chipPts.append([(-nx-1)*self.chipX,-0.5*self.chipY])
-                self.chipColumns.append(1)
-                nx += 1
+            self.chipColumns = [1]*int((self.chipGrid['x'] < 0).sum())
         else:
-            #grid of chips, symmetric about X and Y axis
-            while ((nx+1)*self.chipX)**2 + self.chipY**2 < (self.waferDiameter/2 - self.padding)**2:
-                ny=0
-                while((ny+1)*self.chipY)**2 + ((nx+1)*self.chipX)**2 < (self.waferDiameter/2 - self.padding)**2:
-                    self.chipPts.append([nx*self.chipX,ny*self.chipY])
-                    self.chipPts.append([nx*self.chipX,(-ny-1)*self.chipY])
-                    self.chipPts.append([(-nx-1)*self.chipX,ny*self.chipY])
-                    self.chipPts.append([(-nx-1)*self.chipX,(-ny-1)*self.chipY])
-                    ny += 1
-                self.chipColumns.append(2*ny)
-                nx += 1
-        #sort chip indices left to right, then bottom to top
-        self.chipPts.sort()
+            self.chipColumns = np.bincount(self.chipGrid['col'][self.chipGrid['x'] < 0]).tolist()
         print('Number of Chips: '+str(len(self.chipPts)))
-        #reverse column counts to go from left to center
-        self.chipColumns = self.chipColumns[::-1]
         
         self.setDefaultChip()
         
@@ -319,7 +466,7 @@ class Wafer:
             
     
     #dicing saw border
-    def DicingBorder(self,maxpts=0,minpts=0,thin=5,thick=20,short=40,long=100,dash=400,layer='MARKERS'):
+    def DicingBorder(self,maxpts=0,minpts=0,thin=5,thick=20,short=40,long=100,dash=400,layer='MARKERS',arrayed=True):
         '''
         # maxpts:     where in chip list to stop putting a dicing border 
         # minpts:     where in chip list to start putting dicing border
@@ -328,6 +475,7 @@ class Wafer:
         # short:40    #short section of crosshair
         # long:100    #long section of crosshair
         # dash:400    #spacing between dashes
+        # arrayed:    merge runs of borders into arrayed inserts (see insertGrid)
         '''
         if maxpts < 0:
             maxpts = len(self.chipPts)+maxpts
@@ -369,40 +517,141 @@ class Wafer:
         for y in range(int(short+long),int(self.chipY-short-long-dash),dash):
             border.add(dxf.rectangle((self.chipX,y+offsetY-thick),-thick,thick,bgcolor=bg))
         
-        self.drawing.blocks.add(border)
+        self.addBlock(border)
 
-        for index,pt in enumerate(self.chipPts):
-            if (maxpts==0 or index<maxpts) and index>=minpts:
+        pts = [pt for index,pt in enumerate(self.chipPts) if (maxpts==0 or index<maxpts) and index>=minpts]
+        if arrayed:
+            self.insertGrid('DICINGBORDER',pts,layer=self.lyr(layer))
+        else:
+            for pt in pts:
                 self.drawing.add(dxf.insert('DICINGBORDER',insert=(pt[0],pt[1]),layer=self.lyr(layer)))
+    
+    def insertGrid(self,name,pts,layer='0'):
+        '''
+        Insert block name at each of pts. Points on a common chipX x chipY lattice are merged into
+        row / column arrays (MINSERT, GDS AREF); anything off the lattice gets its own insert.
+        '''
+        if not len(pts):
+            return
+        pts = np.asarray(pts,dtype=np.float64)
+        x0,y0 = pts.min(axis=0)
+        i,j = np.rint((pts[:,0]-x0)/self.chipX).astype(np.int64),np.rint((pts[:,1]-y0)/self.chipY).astype(np.int64)
+        onGrid = np.isclose(x0+i*self.chipX,pts[:,0],rtol=0,atol=1e-6) & np.isclose(y0+j*self.chipY,pts[:,1],rtol=0,atol=1e-6)
+        if onGrid.any():
+            mask = np.zeros((i[onGrid].max()+1,j[onGrid].max()+1),dtype=bool)
+            mask[i[onGrid],j[onGrid]] = True
+            for i0,j0,ni,nj in zip(*[v.tolist() for v in rectangleCover(mask)]):
+                pos = (x0+i0*self.chipX,y0+j0*self.chipY)
+                if ni == 1 and nj == 1:
+                    self.drawing.add(dxf.insert(name,insert=pos,layer=layer))
+                else:
+                    self.drawing.add(dxf.insert(name,insert=pos,columns=ni,rows=nj,colspacing=self.chipX,rowspacing=self.chipY,layer=layer))
+        for pt in pts[~onGrid].tolist():
+            self.drawing.add(dxf.insert(name,insert=tuple(pt),layer=layer))
                 
     def writeChip(self,chip,index):
         #insert a chip at specified index
         self.drawing.add(dxf.insert(chip.ID,insert=self.chipSpace(self.chipPts[index]),layer=self.lyr(chip.layer)))
         
     #write all chips in the chips buffer
-    def populate(self):
+    def populate(self,arrayed=True):
+        if not arrayed:
+            for i,chip in enumerate(self.chips):
+                self.writeChip(chip,i)
+            return
+        #chips sharing a block (and layer) are placed with arrayed inserts
+        groups = {}
         for i,chip in enumerate(self.chips):
-            self.writeChip(chip,i)
+            groups.setdefault((chip.ID,self.lyr(chip.layer)),[]).append(self.chipSpace(self.chipPts[i]))
+        for (name,layer),pts in groups.items():
+            self.insertGrid(name,pts,layer)
     
     def setChipBuffer(self,chip,index):
         self.chips[index]=chip
     
+    def buildChips(self,factories,indices=None,workers=None,cache=None,**kwargs):
+        '''
+        Build independent chips in a process pool and save them to this wafer in list order.
+        factories: list of (chipClass,args,kwargs) tuples (args and kwargs optional), called as chipClass(wafer,*args,**kwargs)
+        indices: chip buffer index for each chip (None: only save the chips)
+        workers: number of processes (None: all cores, 1: build serially in this process). Profiled wafers always build serially
+        cache: directory (or ChipCache) to load unchanged chips from instead of rebuilding them. Opt-in (None / False: always build).
+            A chip is rebuilt when its class, base classes, their modules (e.g. the wafer script), its arguments, the wafer
+            settings or maskLib change. Edits anywhere else (other imported modules, data files) do NOT invalidate it:
+            build with cache=None or call ChipCache(path).clear() (or delete the directory) after such changes
+        kwargs are passed on to chip.save()
+        Chip classes must be importable by the workers: on platforms without fork, guard the wafer script with if __name__=='__main__'
+        '''
+        factories = [isinstance(f,tuple) and f or (f,) for f in factories]
+        #chips are built on a copy of the wafer without its drawing, stream, chip buffer or profiler
+        template = copy.copy(self)
+        template.drawing = template.stream = template.defaultChip = template.profiler = None
+        template.chips = []
+        if self.profiler is not None:
+            #calls are recorded in this process only
+            workers = 1
+        
+        results = [None]*len(factories)
+        if cache:
+            cache = isinstance(cache,ChipCache) and cache or ChipCache(cache)
+            keys = [cache.key(f,template) for f in factories]
+            results = [key and cache.load(key) for key in keys]
+        todo = [i for i,result in enumerate(results) if result is None]
+        if workers == 1 or len(todo) < 2:
+            _initChipWorker(template)
+            built = [_buildChipWorker(factories[i]) for i in todo]
+            _initChipWorker(None)
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' in methods and 'fork' or None)
+            with ProcessPoolExecutor(workers,mp_context=context,initializer=_initChipWorker,initargs=(template,)) as pool:
+                built = list(pool.map(_buildChipWorker,[factories[i] for i in todo]))
+        for i,result in zip(todo,built):
+            results[i] = result
+            if cache and keys[i] is not None:
+                cache.store(keys[i],result)
+        
+        chips = []
+        for i,(chip,layers,attrs) in enumerate(results):
+            #replay wafer changes made while building (layer setup etc.) in index order
+            for name,color in layers:
+                self.addLayer(name,color)
+            for k,v in attrs.items():
+                if not hasattr(self,k):
+                    setattr(self,k,v)
+            chip.wafer = self
+            chip.save(self,**kwargs)
+            if indices is not None:
+                self.setChipBuffer(chip,indices[i])
+            chips.append(chip)
+        return chips
+    
     #define high visibility markers as blocks '00' - '09'
     def defineHiVisMarker09(self,width,layer):
         for i in range(10):
             num = dxf.block('0'+str(i))
             HiVisMarker09(num,0,0,i,width,self.bg(layer))
-            self.drawing.blocks.add(num)
+            self.addBlock(num)
     
     #draw a high visibility marker on each chip in the lower left corner
-    def mark1000(self,markHeight,start,stop,layer):
+    def mark1000(self,markHeight,start,stop,layer,arrayed=True):
         width = markHeight/4
         #default spacing is 
+        if not arrayed:
+            for i in range(start,stop+1):
+                n=i-start
+                self.drawing.add(dxf.insert('0'+str(n//100),insert=self.chipSpace(vadd((width,width),self.chipPts[i])),layer=self.lyr(layer)))
+                self.drawing.add(dxf.insert('0'+str(n%100//10),insert=self.chipSpace(vadd((width*5,width),self.chipPts[i])),layer=self.lyr(layer)))
+                self.drawing.add(dxf.insert('0'+str(n%10),insert=self.chipSpace(vadd((width*9,width),self.chipPts[i])),layer=self.lyr(layer)))
+            return
+        #group each digit position by marker block, runs of equal digits become arrays
+        groups = {}
         for i in range(start,stop+1):
             n=i-start
-            self.drawing.add(dxf.insert('0'+str(n//100),insert=self.chipSpace(vadd((width,width),self.chipPts[i])),layer=self.lyr(layer)))
-            self.drawing.add(dxf.insert('0'+str(n%100//10),insert=self.chipSpace(vadd((width*5,width),self.chipPts[i])),layer=self.lyr(layer)))
-            self.drawing.add(dxf.insert('0'+str(n%10),insert=self.chipSpace(vadd((width*9,width),self.chipPts[i])),layer=self.lyr(layer)))
+            for digit,dx in ((n//100,width),(n%100//10,width*5),(n%10,width*9)):
+                groups.setdefault(('0'+str(digit),dx),[]).append(self.chipSpace(vadd((dx,width),self.chipPts[i])))
+        for (name,dx),pts in groups.items():
+            self.insertGrid(name,pts,self.lyr(layer))
     
     #return chip centered coordinates in wafer space
     def center(self,xy=(0,0)):
@@ -484,6 +733,7 @@ class Chip:
     #cached chip propoerties
     solid = 1
     frame = 1
+    streamed = False #saved to a streaming wafer: the geometry was written to disk and dropped
     def __init__(self,wafer,chipID,layer,structures=None,defaults=None, FRAME_NAME='FRAME'):
         self.wafer = wafer
         self.width = wafer.chipX - wafer.sawWidth
@@ -496,11 +746,14 @@ class Chip:
         if defaults is None:
             self.defaults = {}
         else:
-            self.defaults = defaults.copy()
+            self.defaults = defaults
         #setup centering
         self.center = (self.width/2,self.height/2)
-        #initialize the block
+        #initialize the block and the polygon store behind it
         self.chipBlock = dxf.block(self.ID)
+        self.geometry = GeometryStore()
+        self.subBlocks = {} #blocks referenced by inserts in this chip, saved along with it
+        self._index = None #spatial index state, built on the first query
         
         #setup structures
         if structures is not None:
@@ -510,14 +763,33 @@ class Chip:
         if wafer.frame:
             self.add(dxf.rectangle((0,0),self.width,self.height,layer=wafer.lyr(FRAME_NAME)))
     
+    @profiled
     def save(self,wafer,drawCopyDXF=False,dicingBorder=True,center=False, FRAME_LAYER=['FRAME',8,-1], MARKER_LAYER=['MARKERS',5,-1]):
-        wafer.drawing.blocks.add(self.chipBlock)
+        if wafer.flattenXOR:
+            self.flattenXOR()
+        if wafer.mergeLayers:
+            self.mergeLayers()
+        blockNames = list(self.subBlocks) + [self.ID]
+        for block in self.subBlocks.values():
+            wafer.addBlock(block)
+        wafer.addBlock(self.chipBlock)
+        if wafer.stream is not None:
+            #blocks are already on disk, free up the entities
+            self.chipBlock = dxf.block(self.ID)
+            self.geometry = GeometryStore()
+            self.subBlocks = {}
+            self.streamed = True
         if drawCopyDXF:
             #make a copy DXF with only the chip
-            temp_wafer = Wafer(wafer.fileName+'_'+self.ID,wafer.path,10,10)
+            temp_wafer = Wafer(wafer.fileName+'_'+self.ID,wafer.path,10,10,stream=wafer.stream is not None)
             #height and width don't matter since the next line copies all settings
             temp_wafer.copyPropertiesFrom(wafer)
-            temp_wafer.drawing.blocks.add(self.chipBlock)
+            if wafer.stream is not None:
+                for name in blockNames:
+                    temp_wafer.stream.copyBlock(wafer.stream,name)
+            else:
+                for block in list(self.subBlocks.values()) + [self.chipBlock]:
+                    temp_wafer.addBlock(block)
             temp_wafer.initChipOnly(center=center, FRAME_LAYER=FRAME_LAYER, MARKER_LAYER=MARKER_LAYER)
             if dicingBorder:
                 temp_wafer.DicingBorder()
@@ -526,8 +798,112 @@ class Chip:
             temp_wafer.save()
         return self
         
+    def addBlock(self,block):
+        #register a block definition used by inserts in this chip (written to the wafer when the chip is saved)
+        self.subBlocks[block['name']] = block
+        
+    def hasBlock(self,name):
+        return name in self.subBlocks
+        
+    def defineBlock(self,name,draw):
+        #draw(chip) into a new sub-block instead of the chip (local coordinates), once per name. Returns name for inserts
+        if name not in self.subBlocks:
+            chipBlock,geometry = self.chipBlock,self.geometry
+            self.chipBlock,self.geometry = dxf.block(name),GeometryStore()
+            try:
+                draw(self)
+            finally:
+                block = self.chipBlock
+                self.chipBlock,self.geometry = chipBlock,geometry
+            self.addBlock(block)
+        return name
+        
+    @profiled
+    def flattenXOR(self,layers=None):
+        '''
+        Replace the polygons on layers and on the XOR layer by OUT = ( LAYER1 or LAYER2 ... or LAYERN ) xor XLAYER,
+        drawn on the first layer as trapezoids (layer '0' for the chip layer). Does nothing if the chip has no XOR polygons (so it only runs once).
+        layers: default wafer.flattenXOR if it is a list, otherwise the chip layer. Polygons inside sub-blocks are left as they are
+        '''
+        XLAYER = getattr(self.wafer,'XLAYER',None)
+        if layers is None:
+            layers = isinstance(self.wafer.flattenXOR,(list,tuple)) and self.wafer.flattenXOR or [self.layer]
+        layers = [self.lyr(l) for l in layers]
+        if XLAYER is None or self.lyr(XLAYER) in layers:
+            return
+        #layer '0' in the chip block is the chip layer, the result goes there if the chip layer comes first
+        target = layers[0] == self.lyr(self.layer) and '0' or layers[0]
+        if self.lyr(self.layer) in layers:
+            layers = layers + ['0']
+        store = self.geometry
+        ids = lambda names: [store.layerIds[l] for l in names if l in store.layerIds]
+        closed = (store.flags[:store.n] & const.POLYLINE_CLOSED) > 0
+        xor = np.nonzero(closed & np.isin(store.layers[:store.n],ids([self.lyr(XLAYER)])))[0]
+        if len(xor) == 0:
+            return
+        ors = np.nonzero(closed & np.isin(store.layers[:store.n],ids(layers)))[0]
+        out = boolean([store.polygon(i) for i in ors],[store.polygon(i) for i in xor],'xor')
+        store.remove(np.r_[ors,xor],self.chipBlock)
+        start = store.n
+        store.addMany(out,target,const.BYLAYER,self.bg(target))
+        store.extendRun(self.chipBlock,start)
+        
+    @profiled
+    def mergeLayers(self,layers=None):
+        '''
+        Union touching or overlapping polygons with the same layer and colors into as few polygons as possible
+        (holes are joined to their outline by a slit, solid fills are written as trapezoids).
+        layers: default wafer.mergeLayers if it is a list, otherwise all layers.
+        Polygons with an exact entity (true arcs) and polygons inside sub-blocks are left as they are
+        '''
+        store = self.geometry
+        if layers is None:
+            layers = isinstance(self.wafer.mergeLayers,(list,tuple)) and self.wafer.mergeLayers or store.layerNames
+        layers = [self.lyr(l) for l in layers]
+        #layer '0' in the chip block is the chip layer
+        if self.lyr(self.layer) in layers:
+            layers.append('0')
+        n = store.n
+        candidates = (store.flags[:n] & const.POLYLINE_CLOSED) > 0
+        candidates &= np.isin(store.layers[:n],[store.layerIds[l] for l in layers if l in store.layerIds])
+        candidates[list(store.exact)] = False
+        ids = np.nonzero(candidates)[0]
+        keys = np.column_stack((store.layers[ids],store.colors[ids],store.bgcolors[ids],store.linetypes[ids],store.flags[ids]))
+        groups,inverse = np.unique(keys,axis=0,return_inverse=True)
+        merged,removed = [],[]
+        for g in range(len(groups)):
+            members = ids[inverse.ravel() == g]
+            if len(members) < 2:
+                continue
+            traps = trapezoids([store.polygon(i) for i in members])
+            merged.append((store.properties(members[0]),traps,*rings(traps)))
+            removed.append(members)
+        if not removed:
+            return
+        store.remove(np.concatenate(removed),self.chipBlock)
+        start = store.n
+        for (layer,color,bgcolor,fill,linetype,flags),traps,outlines,owner in merged:
+            corners = trapezoidPolygons(traps)
+            for r,pts in enumerate(outlines):
+                i = store.add(pts,layer,color,bgcolor,FILL_FAN,linetype,flags)
+                if bgcolor is not None:
+                    #the dxf gets the outline plus the trapezoids as solids, a fan would not fill a concave polygon
+                    solids = GeometryStore()
+                    if color is not None:
+                        solids.add(pts,layer,color,None,FILL_FAN,linetype,flags)
+                    solids.addMany(corners[owner == r],layer,None,bgcolor,linetype=linetype,flags=flags)
+                    store.exact[i] = GeometryRun(solids,0,solids.n)
+        store.extendRun(self.chipBlock,start)
+        
     def add(self,obj,structure=None,length=None,offsetVector=None,absolutePos=None,angle=0,newDir=None):
-        self.chipBlock.add(obj)
+        if hasattr(obj,'applyWafer'):
+            #curved entities are segmented with this chip's wafer settings
+            obj.applyWafer(self.wafer)
+        if self.geometry.addEntity(obj):
+            #polygons go into the geometry store, the block keeps their place in drawing order
+            self.geometry.extendRun(self.chipBlock)
+        else:
+            self.chipBlock.add(obj)
         def struct():
             if isinstance(structure,Structure):
                 return structure
@@ -542,6 +918,69 @@ class Chip:
         elif absolutePos is not None:
             struct().updatePos(newStart=absolutePos, angle=angle, newDir=newDir)
         
+    def spatialIndex(self):
+        '''
+        (own, placed): SpatialIndex over the chip's polygons and one over the polygons placed by inserts of its sub-blocks
+        (in chip coordinates). Chip.add does not touch the index: it is synced lazily here (so on every query / nearest)
+        with the polygons and inserts added since the last call, which keeps drawing as fast as without an index
+        '''
+        state = self._index
+        if state is None or state['block'] is not self.chipBlock or state['own'].store is not self.geometry or state['revision'] != self.geometry.revision:
+            #new chip block or store, or polygons were removed: start over
+            state = self._index = {'block':self.chipBlock,'revision':self.geometry.revision,'seen':0,'blocks':{},
+                                   'own':SpatialIndex(self.geometry),'placed':SpatialIndex(GeometryStore())}
+        data = self.chipBlock.get_data()
+        state['placed'].store.addReferences(data[state['seen']:],self.subBlocks,state['blocks'])
+        state['seen'] = len(data)
+        return state['own'].sync(),state['placed'].sync()
+    
+    def raster(self,pixel,alpha=0.6):
+        #Raster of the chip and its share of the dicing lane, origin at the chip corner
+        saw = self.wafer.sawWidth/2
+        return Raster(-saw,-saw,self.wafer.chipX,self.wafer.chipY,pixel).paint([index.store for index in self.spatialIndex()],
+                      self.wafer.layerColors,self.wafer.layerNames,self.lyr(self.layer),alpha)
+    
+    def preview(self,path=None,dpi=2540,alpha=0.6):
+        ''' rasterize the chip to a png at dpi pixels per inch of mask. path: file name (default: next to the wafer dxf) '''
+        if self.onDisk('preview'):
+            return
+        if path is None:
+            path = self.wafer.path + self.wafer.fileName + '_' + self.ID + '.png'
+        self.raster(25400./dpi,alpha).save(path)
+        print('Saved as: '+ '\x1b[36m' + path +'\x1b[0m')
+    
+    def onDisk(self,action):
+        #True (with an error) if the chip was saved to a streaming wafer, so there is nothing left to action
+        if self.streamed:
+            print('\x1b[33mError:\x1b[0m Cannot '+action+' chip '+self.ID+' after saving it to streaming wafer '+self.wafer.fileName+' (its geometry is already on disk)')
+        return self.streamed
+    
+    def _queryLayers(self,layers):
+        #layer '0' in the chip block is the chip layer
+        if layers is None:
+            return None
+        layers = [self.lyr(l) for l in layers]
+        return self.lyr(self.layer) in layers and layers + ['0'] or layers
+    
+    def query(self,bbox,layers=None,exclude=('FRAME',)):
+        ''' polygons (point arrays) whose bounding box overlaps bbox (x0,y0,x1,y1), including the ones placed by inserts '''
+        if self.onDisk('query'):
+            return []
+        layers = self._queryLayers(layers)
+        return [index.store.polygon(i) for index in self.spatialIndex() for i in index.query(bbox,layers,exclude)]
+    
+    def nearest(self,point,layers=None,exclude=('FRAME',)):
+        ''' (polygon, distance) closest to point, distance is 0 inside a closed polygon. (None, inf) on an empty chip '''
+        best = None,math.inf
+        if self.onDisk('query'):
+            return best
+        layers = self._queryLayers(layers)
+        for index in self.spatialIndex():
+            i,dist = index.nearest(point,layers,exclude)
+            if dist < best[1]:
+                best = index.store.polygon(i),dist
+        return best
+    
     #return chip centered coordinates in chip space
     def centered(self,xy=(0,0)):
         return (xy[0]+self.center[0],xy[1]+self.center[1])
@@ -578,6 +1017,15 @@ class Chip:
     #get layer from wafer 
     def lyr(self,layerName):
         return self.wafer.lyr(layerName)
+    
+    #chip defaults are always a Defaults (a copy of whatever is assigned), so structures can share them until either side writes
+    @property
+    def defaults(self):
+        return self._defaults
+    
+    @defaults.setter
+    def defaults(self,defaults):
+        self._defaults = Defaults(defaults)
 
    
 # ===============================================================================
@@ -585,8 +1033,60 @@ class Chip:
 #       Coordinate system. keeps track of current location and direction, as well as any defaults
 # ===============================================================================    
 
+class Defaults(MutableMapping):
+    ''' Copy-on-write dict of structure defaults. copy() shares the underlying dict, whichever side writes first
+        copies it, so every copy still behaves as an independent snapshot
+    '''
+    __slots__ = ('_data','_shared')
+    
+    def __init__(self,defaults=()):
+        self._data = dict(defaults)
+        self._shared = False
+    
+    def copy(self):
+        new = Defaults.__new__(Defaults)
+        new._data = self._data
+        new._shared = self._shared = True
+        return new
+    
+    def _own(self):
+        if self._shared:
+            self._data = dict(self._data)
+            self._shared = False
+    
+    def __getitem__(self,key):
+        return self._data[key]
+    
+    def __contains__(self,key):
+        return key in self._data
+    
+    def get(self,key,default=None):
+        return self._data.get(key,default)
+    
+    def __setitem__(self,key,value):
+        self._own()
+        self._data[key] = value
+    
+    def __delitem__(self,key):
+        self._own()
+        del self._data[key]
+    
+    def __iter__(self):
+        return iter(self._data)
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def __repr__(self):
+        return 'Defaults('+repr(self._data)+')'
+    
+    def __reduce__(self):
+        #pickle as a plain snapshot, independent of the sharing state (chip cache keys pickle defaults)
+        return (Defaults,(dict(self._data),))
+
 class Structure:
     #start = current coordinates, direction is angle of +x axis in degrees
+    __slots__ = ('chip','start','direction','last','last_direction','current_length','last_length','defaults','_trig','_lastTrig')
     
     def __init__(self,chip,start=(0,0),direction=0,defaults=None,current_length=0.0):
         self.chip = chip #parent block reference
@@ -597,16 +1097,35 @@ class Structure:
         self.current_length = current_length #for keeping track of length
         self.last_length = current_length
         if defaults is None:
-            self.defaults = chip.defaults.copy()
-        else:
+            defaults = chip.defaults
+        #shared with the chip / parent structure until one of them changes a default
+        if isinstance(defaults,Defaults):
             self.defaults = defaults.copy()
+        else:
+            self.defaults = Defaults(defaults)
+        #cached (direction, cos, sin) of the current and previous direction, checked against the direction on use
+        #since components also assign direction directly
+        self._trig = self._lastTrig = (None,1.,0.)
         
+    def _cosSin(self):
+        if self._trig[0] != self.direction:
+            a = math.radians(self.direction)
+            self._trig = (self.direction,math.cos(a),math.sin(a))
+        return self._trig[1:]
+    
+    def _lastCosSin(self):
+        if self._lastTrig[0] != self.last_direction:
+            a = math.radians(self.last_direction)
+            self._lastTrig = (self.last_direction,math.cos(a),math.sin(a))
+        return self._lastTrig[1:]
+    
     def zeroLength(self):
         self.current_length=0.0
     
     def updatePos(self,newStart=(0,0), angle=0, newDir=None): #set exact start position, add angle to direction, or set new direction
         self.last = self.start
         self.last_direction = self.direction
+        self._lastTrig = self._trig
         self.start = newStart
         if newDir is not None:
             self.direction = newDir
@@ -619,35 +1138,53 @@ class Structure:
     
     def shiftPos(self, distance, angle=0, newDir=None):
         #move by a specified distance, set new direction
-        self.updatePos(newStart = vadd(self.start,rotate_2d((distance,0),math.radians(self.direction))),angle=angle,newDir=newDir)
+        c,s = self._cosSin()
+        self.updatePos(newStart = (self.start[0] + distance*c,self.start[1] + distance*s),angle=angle,newDir=newDir)
         
     def getPos(self,vector=None,distance=None,angle=0):
         #return global position from local position based on current location and direction
+        #(same arithmetic as vadd(start,rotate_2d(vector,radians(direction))), with the trig cached)
         if vector is not None:
-            return vadd(self.start,rotate_2d(vector,math.radians(self.direction)))
+            c,s = self._cosSin()
+            return (self.start[0] + (vector[0]*c - vector[1]*s),self.start[1] + (vector[1]*c + vector[0]*s))
         elif distance is not None:
+            if angle == 0:
+                c,s = self._cosSin()
+                return (self.start[0] + distance*c,self.start[1] + distance*s)
             return vadd(self.start,rotate_2d((distance,0),math.radians(angle+self.direction)))
         else:
             return self.start
+    
+    def getPosMany(self,points):
+        ''' global positions of an (N,2) array of local points, vectorized getPos(vector) '''
+        p = np.asarray(points,dtype=np.float64)
+        c,s = self._cosSin()
+        out = np.empty(p.shape)
+        out[...,0] = self.start[0] + (p[...,0]*c - p[...,1]*s)
+        out[...,1] = self.start[1] + (p[...,1]*c + p[...,0]*s)
+        return out
         
     def getLastPos(self,vector=None,distance=None,angle=0):
         #return global position from local position based on previous location and direction
         if vector is not None:
-            return vadd(self.last,rotate_2d(vector,math.radians(self.last_direction)))
+            c,s = self._lastCosSin()
+            return (self.last[0] + (vector[0]*c - vector[1]*s),self.last[1] + (vector[1]*c + vector[0]*s))
         elif distance is not None:
             return vadd(self.last,rotate_2d((distance,0),math.radians(angle+self.last_direction)))
         else:
             return self.last
         
     def getGlobalPos(self,pos=(0,0)):
-        #return local position from global position based on current location and direction
-        localPos = vsub(pos,self.start)
-        return rotate_2d(localPos,-math.radians(self.direction))
+        #return local position from global position based on current location and direction (rotation by -direction)
+        x,y = pos[0]-self.start[0],pos[1]-self.start[1]
+        c,s = self._cosSin()
+        return (x*c - y*-s,y*c + x*-s)
     
     def getLastGlobalPos(self,pos=(0,0)):
         #return local position from global position based on previous location and direction
-        localPos = vsub(pos,self.last)
-        return rotate_2d(localPos,-math.radians(self.last_direction))
+        x,y = pos[0]-self.last[0],pos[1]-self.last[1]
+        c,s = self._lastCosSin()
+        return (x*c - y*-s,y*c + x*-s)
     
     def clone(self,defaults=None):
         return Structure(self.chip,start=self.start,direction=self.direction,defaults=defaults is not None and defaults or self.defaults)
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:05:48 2026
+
+@author: sasha
+
+Benchmark harness built from the example wafers. Every example runs in a fresh process, in a scratch directory, against
+the maskLib checkout given by --root (any checkout works, the harness itself does not have to be part of it).
+
+    python benchmarkLib.py run -o new.json [--root path/to/checkout] [--repeat 3] [--examples CPWResonatorExample ...]
+    python benchmarkLib.py compare old.json new.json [--threshold 0.1]
+
+Per example: wall time split into chip construction / waffle / save (wafer and chip saves, dxf serialization included),
+peak RSS, dxf entity and vertex counts and bytes written. compare exits with status 1 if anything regressed.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import re
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+EXAMPLES = ['StructuresTest','3DMultimodeExample','CPWResonatorExample','ReflectionQubitExample','JellyfishResonatorExample']
+
+#metric: (kind, noise floor) regressions are reported when new > old*(1+threshold) and new-old > floor
+METRICS = {'total':('s',0.05),'construction':('s',0.05),'waffle':('s',0.02),'save':('s',0.05),'peakRSS':('MB',5),
+           'entities':('',0),'vertices':('',0),'bytes':('',1024)}
+
+# ===============================================================================
+#  WORKER
+#       runs one example script (in the current directory) and writes its measurements as json
+# ===============================================================================
+
+def _timePhases(phases):
+    #time saves and waffle by wrapping them in place, outermost call only (Chip.save can save a copy wafer)
+    import maskLib.MaskLib as m
+    import maskLib.microwaveLib as mw
+    running = []
+    def timed(obj,name,phase):
+        func = getattr(obj,name,None)
+        if func is None:
+            return
+        def wrapper(*args,**kwargs):
+            if running:
+                return func(*args,**kwargs)
+            running.append(phase)
+            t = time.perf_counter()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                phases[phase] += time.perf_counter()-t
+                running.pop()
+        setattr(obj,name,wrapper)
+    for name in ('save','saveGDS'):
+        timed(m.Wafer,name,'save')
+    timed(m.Chip,'save','save')
+    timed(mw,'waffle','waffle')
+
+def dxfCounts(fileName):
+    ''' (entities, vertices) of a dxf file: all entity records in the blocks and entities sections, vertices of polylines '''
+    with open(fileName,'rb') as f:
+        data = f.read()
+    records = re.findall(rb'\n  0\r?\n([A-Z_0-9]+)(?=\r?\n)',data)
+    skip = {b'SECTION',b'ENDSEC',b'TABLE',b'ENDTAB',b'BLOCK',b'ENDBLK',b'SEQEND',b'EOF',b'LAYER',b'LTYPE',b'STYLE',b'VPORT',b'VIEW',b'UCS',b'APPID',b'DIMSTYLE'}
+    vertices = records.count(b'VERTEX')
+    return sum(1 for r in records if r not in skip)-vertices,vertices
+
+def worker(script,out):
+    import resource
+    phases = {'waffle':0.,'save':0.}
+    #warm up imports so they do not count as construction
+    import maskLib.MaskLib
+    import maskLib.microwaveLib
+    _timePhases(phases)
+    result = {}
+    devnull = open(os.devnull,'w')
+    stdout,sys.stdout = sys.stdout,devnull
+    t = time.perf_counter()
+    try:
+        runpy.run_path(script,run_name='__main__')
+    except Exception as e:
+        result['error'] = type(e).__name__+': '+str(e)
+    finally:
+        total = time.perf_counter()-t
+        sys.stdout = stdout
+        devnull.close()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result.update(total=total,construction=total-phases['save']-phases['waffle'],waffle=phases['waffle'],save=phases['save'],
+                  peakRSS=rss/(sys.platform == 'darwin' and 2**20 or 2**10))
+    entities = vertices = size = 0
+    for name in glob.glob('**/*',recursive=True):
+        if os.path.isfile(name) and name != os.path.basename(out):
+            size += os.path.getsize(name)
+            if name.lower().endswith('.dxf'):
+                e,v = dxfCounts(name)
+                entities,vertices = entities+e,vertices+v
+    result.update(entities=entities,vertices=vertices,bytes=size)
+    with open(out,'w') as f:
+        json.dump(result,f)
+
+# ===============================================================================
+#  RUN / COMPARE
+# ===============================================================================
+
+def _describe(root):
+    #commit of the checkout under test, if it is a git checkout
+    try:
+        out = subprocess.run(['git','-C',root,'describe','--always','--dirty'],capture_output=True,text=True,timeout=30)
+        return out.returncode == 0 and out.stdout.strip() or None
+    except (OSError,subprocess.SubprocessError):
+        return None
+
+def runExample(root,name,repeat=3):
+    ''' best of repeat runs of one example (min of the times, max of peak RSS), each in a fresh process '''
+    runs = []
+    for r in range(repeat):
+        scratch = tempfile.mkdtemp(prefix='maskLib_bench_')
+        try:
+            #the checkout is imported as maskLib whatever its directory is called
+            os.symlink(os.path.abspath(root),os.path.join(scratch,'maskLib'))
+            os.makedirs(os.path.join(scratch,'run','DXF'))
+            env = dict(os.environ,PYTHONPATH=scratch+os.pathsep+os.environ.get('PYTHONPATH',''))
+            out = os.path.join(scratch,'run','benchmark.json')
+            proc = subprocess.run([sys.executable,os.path.abspath(__file__),'worker',os.path.join(os.path.abspath(root),'example',name+'.py'),out],
+                                  cwd=os.path.join(scratch,'run'),env=env,capture_output=True,text=True)
+            if proc.returncode != 0 or not os.path.exists(out):
+                return {'error':(proc.stderr.strip().splitlines() or ['worker failed'])[-1]}
+            with open(out) as f:
+                runs.append(json.load(f))
+        finally:
+            shutil.rmtree(scratch,ignore_errors=True)
+        if 'error' in runs[-1]:
+            break
+    best = dict(runs[-1])
+    for key,(kind,floor) in METRICS.items():
+        if kind == 's':
+            best[key] = min(run[key] for run in runs)
+        elif key == 'peakRSS':
+            best[key] = max(run[key] for run in runs)
+    best['runs'] = len(runs)
+    return best
+
+def run(root,examples=None,repeat=3,verbose=True):
+    ''' benchmark the examples of a checkout, returns the result dict (see save / compare) '''
+    results = {}
+    for name in examples or EXAMPLES:
+        if not os.path.exists(os.path.join(root,'example',name+'.py')):
+            print('\x1b[33mError:\x1b[0m No example '+name+' in '+root)
+            continue
+        results[name] = runExample(root,name,repeat)
+        if verbose:
+            r = results[name]
+            if 'error' in r:
+                print('    %-28s \x1b[33mfailed\x1b[0m %s' % (name,r['error']))
+            else:
+                print('    %-28s %7.2fs (construction %.2fs, waffle %.2fs, save %.2fs) %6.0f MB %9d entities %10d vertices %11d bytes' %
+                      (name,r['total'],r['construction'],r['waffle'],r['save'],r['peakRSS'],r['entities'],r['vertices'],r['bytes']))
+    import numpy
+    return {'root':os.path.abspath(root),'commit':_describe(root),'date':datetime.datetime.now().isoformat(timespec='seconds'),
+            'python':platform.python_version(),'numpy':numpy.__version__,'machine':platform.machine(),'cpus':os.cpu_count(),
+            'repeat':repeat,'results':results}
+
+def compare(old,new,threshold=0.1):
+    ''' print old vs new per example and metric, returns the list of (example, metric, old, new) regressions '''
+    print('Benchmark %s -> %s' % (old.get('commit') or old.get('root'),new.get('commit') or new.get('root')))
+    regressions = []
+    for name in new['results']:
+        if name not in old['results']:
+            continue
+        a,b = old['results'][name],new['results'][name]
+        if 'error' in a or 'error' in b:
+            print('    %-28s %s' % (name,'error' in b and '\x1b[33mfailed\x1b[0m '+b['error'] or 'failed before, runs now'))
+            if 'error' in b and 'error' not in a:
+                regressions.append((name,'error',None,b['error']))
+            continue
+        print('    '+name)
+        for key,(kind,floor) in METRICS.items():
+            if key not in a or key not in b:
+                continue
+            if a[key]:
+                ratio = b[key]/a[key]
+            else:
+                ratio = b[key] and float('inf') or 1.
+            worse = b[key] > a[key]*(1+threshold) and b[key]-a[key] > floor
+            if worse:
+                regressions.append((name,key,a[key],b[key]))
+            flag = worse and '\x1b[31mREGRESSION\x1b[0m' or (b[key] < a[key]*(1-threshold) and a[key]-b[key] > floor and '\x1b[32mimproved\x1b[0m' or '')
+            if kind == 's':
+                print('        %-14s %10.3f s  %10.3f s  x%.2f %s' % (key,a[key],b[key],ratio,flag))
+            elif kind == 'MB':
+                print('        %-14s %10.1f MB %10.1f MB x%.2f %s' % (key,a[key],b[key],ratio,flag))
+            else:
+                print('        %-14s %12d %12d x%.2f %s' % (key,a[key],b[key],ratio,flag or (a[key] != b[key] and 'changed' or '')))
+    print(regressions and '\x1b[31m'+str(len(regressions))+' regressions\x1b[0m' or '\x1b[32mno regressions\x1b[0m')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='maskLib example benchmarks')
+    sub = parser.add_subparsers(dest='command',required=True)
+    p = sub.add_parser('run',help='benchmark the examples of a checkout')
+    p.add_argument('-o','--output',default='benchmark.json')
+    p.add_argument('--root',default=os.path.dirname(os.path.abspath(__file__)),help='maskLib checkout to benchmark')
+    p.add_argument('--repeat',type=int,default=3)
+    p.add_argument('--examples',nargs='+')
+    p = sub.add_parser('compare',help='compare two result files')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('--threshold',type=float,default=0.1,help='relative slow down that counts as a regression')
+    p = sub.add_parser('worker')
+    p.add_argument('script')
+    p.add_argument('out')
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        #this file's directory is not the maskLib package here, the checkout under test comes from PYTHONPATH
+        here = os.path.dirname(os.path.abspath(__file__))
+        sys.path[:] = [p for p in sys.path if os.path.abspath(p or '.') != here]
+        worker(args.script,args.out)
+    elif args.command == 'run':
+        result = run(args.root,args.examples,args.repeat)
+        with open(args.output,'w') as f:
+            json.dump(result,f,indent=1)
+        print('Saved as: '+ '\x1b[36m' + args.output +'\x1b[0m')
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return compare(old,new,args.threshold) and 1 or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:40:27 2026
+
+@author: sasha
+
+Polygon booleans (or, and, xor, not) by scanline trapezoidation.
+The plane is cut into horizontal slabs at every vertex and every edge crossing, so inside a slab
+the edges never cross and the result is a list of trapezoids between pairs of edges.
+All slabs are handled at once with numpy (no per-polygon python loops).
+"""
+import numpy as np
+
+# ===============================================================================
+#  OPERATIONS
+#       result of an operation given the inside state of operands A and B
+# ===============================================================================
+
+OPERATIONS = {
+    'or': np.logical_or,
+    'and': np.logical_and,
+    'xor': np.logical_xor,
+    'not': lambda a,b: a & ~b,    #A - B
+    }
+
+# ===============================================================================
+#  EDGES
+# ===============================================================================
+
+def polygonEdges(polygons,operand=0):
+    ''' non-horizontal edges of a list of (N,2) polygons as arrays (x1,y1,x2,y2,winding,operand), with y1 < y2
+        every polygon is oriented counterclockwise first, so overlapping polygons of one operand add up (union)
+    '''
+    polygons = [np.asarray(p,dtype=np.float64).reshape(-1,2) for p in polygons if len(p) > 2]
+    if not polygons:
+        return tuple(np.empty(0) for i in range(4)) + (np.empty(0,dtype=np.int64),np.empty(0,dtype=np.int8))
+    counts = np.array([len(p) for p in polygons])
+    pts = np.concatenate(polygons)
+    poly = np.repeat(np.arange(len(polygons)),counts)
+    #next vertex within each polygon (closing edge included)
+    first = np.repeat(np.cumsum(counts)-counts,counts)
+    nxt = first + (np.arange(len(pts)) - first + 1) % np.repeat(counts,counts)
+    x1,y1,x2,y2 = pts[:,0],pts[:,1],pts[nxt,0],pts[nxt,1]
+    #shoelace area per polygon for the orientation
+    area = np.bincount(poly,x1*y2 - x2*y1,minlength=len(polygons))
+    sign = np.where(area[poly] < 0,-1,1)
+    keep = y1 != y2
+    x1,y1,x2,y2,sign = x1[keep],y1[keep],x2[keep],y2[keep],sign[keep]
+    #upward edges of a counterclockwise polygon are on its right side: winding -1 when crossed left to right
+    up = y2 > y1
+    winding = np.where(up,-1,1)*sign
+    return (np.where(up,x1,x2),np.where(up,y1,y2),np.where(up,x2,x1),np.where(up,y2,y1),
+            winding.astype(np.int64),np.full(len(x1),operand,dtype=np.int8))
+
+def _slabEdges(ys,x1,y1,x2,y2):
+    #every (edge, slab) pair with the x of the edge at the bottom (xa) and top (xb) of the slab
+    lo = np.searchsorted(ys,y1)
+    counts = np.searchsorted(ys,y2)-lo
+    e = np.repeat(np.arange(len(x1)),counts)
+    s = lo[e] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts)-counts,counts)
+    slope = (x2[e]-x1[e])/(y2[e]-y1[e])
+    xa = x1[e] + (ys[s]-y1[e])*slope
+    xb = x1[e] + (ys[s+1]-y1[e])*slope
+    #keep edge end points exact
+    xa = np.where(ys[s] == y1[e],x1[e],xa)
+    xb = np.where(ys[s+1] == y2[e],x2[e],xb)
+    #edges that do not cross keep their order at every height of the slab, the midpoint is the most robust key
+    order = np.lexsort((xa+xb,s))
+    return e[order],s[order],xa[order],xb[order]
+
+# ===============================================================================
+#  TRAPEZOIDS
+# ===============================================================================
+
+def trapezoids(a,b=(),op='or',eps=1e-9):
+    '''
+    Boolean of two polygon lists as disjoint trapezoids with horizontal top and bottom.
+    a,b: lists of (N,2) point lists. Overlaps inside one list are unioned (orientation does not matter)
+    op: 'or', 'and', 'xor' or 'not' (a - b)
+    Returns arrays (y0,y1,xl0,xr0,xl1,xr1): bottom y, top y, left / right x at the bottom, left / right x at the top
+    '''
+    if op not in OPERATIONS:
+        print('\x1b[33mError:\x1b[0m Unknown boolean operation '+str(op)+'!')
+        return tuple(np.empty(0) for i in range(6))
+    ea,eb = polygonEdges(a,0),polygonEdges(b,1)
+    x1,y1,x2,y2,winding,operand = [np.concatenate((u,v)) for u,v in zip(ea,eb)]
+    if len(x1) == 0:
+        return tuple(np.empty(0) for i in range(6))
+    ys = np.unique(np.concatenate((y1,y2)))
+    tol = eps*max(np.abs(ys).max(),np.abs(x1).max(),np.abs(x2).max(),1)
+
+    #split slabs at edge crossings until neighbouring edges keep their order from bottom to top of every slab
+    while True:
+        e,s,xa,xb = _slabEdges(ys,x1,y1,x2,y2)
+        #neighbours out of order at the bottom or the top of a slab cross inside it
+        k = np.nonzero((s[1:] == s[:-1]) & ((xa[1:] < xa[:-1]-tol) | (xb[1:] < xb[:-1]-tol)))[0]
+        #crossing height from the linear x(y) of both edges inside the slab
+        da,db = xa[k+1]-xa[k],xb[k]-xb[k+1]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            yc = ys[s[k]] + da/(da+db)*(ys[s[k]+1]-ys[s[k]])
+        yc = yc[(yc > ys[s[k]]) & (yc < ys[s[k]+1])]
+        if len(yc) == 0:
+            break
+        ys = np.unique(np.concatenate((ys,yc)))
+
+    #winding numbers of both operands right of every edge, per slab
+    starts = np.r_[0,np.nonzero(s[1:] != s[:-1])[0]+1]
+    wa = np.where(operand[e] == 0,winding[e],0)
+    wb = np.where(operand[e] == 1,winding[e],0)
+    ca,cb = np.cumsum(wa),np.cumsum(wb)
+    base = np.repeat(starts,np.diff(np.r_[starts,len(e)]))
+    ca = ca - (ca[base]-wa[base])
+    cb = cb - (cb[base]-wb[base])
+    inside = OPERATIONS[op](ca != 0,cb != 0)
+    #the result is outside left of the first edge of a slab
+    before = np.r_[False,inside[:-1]]
+    before[starts] = False
+    left,right = np.nonzero(inside & ~before)[0],np.nonzero(~inside & before)[0]
+    if len(left) == 0:
+        return tuple(np.empty(0) for i in range(6))
+    #spans that touch along coincident edges (abutting polygons) are one span
+    touch = np.r_[(s[left[1:]] == s[right[:-1]]) & (np.abs(xa[left[1:]]-xa[right[:-1]]) <= tol) & (np.abs(xb[left[1:]]-xb[right[:-1]]) <= tol),False]
+    left,right = left[np.r_[True,~touch[:-1]]],right[~touch]
+    #stack trapezoids between the same two edges in consecutive slabs into one
+    order = np.lexsort((s[left],e[right],e[left]))
+    left,right = left[order],right[order]
+    new = np.r_[True,(e[left][1:] != e[left][:-1]) | (e[right][1:] != e[right][:-1]) | (s[left][1:] != s[left][:-1]+1)]
+    first,last = np.nonzero(new)[0],np.r_[np.nonzero(new)[0][1:],len(new)]-1
+    traps = (ys[s[left[first]]],ys[s[left[last]]+1],xa[left[first]],xa[right[first]],xb[left[last]],xb[right[last]])
+    #drop slivers with no width
+    keep = (traps[3]-traps[2] > tol) | (traps[5]-traps[4] > tol)
+    return tuple(v[keep] for v in traps)
+
+def trapezoidPolygons(traps):
+    ''' (K,4,2) counterclockwise corner array of trapezoids from trapezoids() '''
+    y0,y1,xl0,xr0,xl1,xr1 = traps
+    return np.stack((np.column_stack((xl0,y0)),np.column_stack((xr0,y0)),np.column_stack((xr1,y1)),np.column_stack((xl1,y1))),axis=1)
+
+def boolean(a,b=(),op='or'):
+    ''' boolean of two polygon lists, returns a (K,4,2) array of disjoint trapezoids '''
+    return trapezoidPolygons(trapezoids(a,b,op))
+
+def area(traps):
+    ''' total area of trapezoids from trapezoids() '''
+    y0,y1,xl0,xr0,xl1,xr1 = traps
+    return float(np.sum((y1-y0)*((xr0-xl0)+(xr1-xl1))/2))
+
+# ===============================================================================
+#  RING STITCHING
+#       outlines of a trapezoid set as closed polygons, holes joined to their outline with a slit
+# ===============================================================================
+
+def boundaryEdges(traps):
+    ''' directed boundary edges (x1,y1,x2,y2) of disjoint trapezoids, interior on the left
+        edge k < len(traps[0]) is the left side of trapezoid k
+    '''
+    y0,y1,xl0,xr0,xl1,xr1 = traps
+    #left sides go down, right sides go up
+    sx,sy,ex,ey = [np.r_[u,v] for u,v in ((xl1,xr0),(y1,y0),(xl0,xr1),(y0,y1))]
+    #horizontal edges: where only the tops of the trapezoids below (a) or only the bottoms above (b) cover a level
+    hy = np.r_[y1,y1,y0,y0]
+    hx = np.r_[xl1,xr1,xl0,xr0]
+    n = len(y0)
+    da = np.r_[np.ones(n),-np.ones(n),np.zeros(2*n)]
+    db = np.r_[np.zeros(2*n),np.ones(n),-np.ones(n)]
+    order = np.lexsort((hx,hy))
+    hx,hy,ca,cb = hx[order],hy[order],np.cumsum(da[order]),np.cumsum(db[order])
+    k = np.nonzero((hy[1:] == hy[:-1]) & (hx[1:] > hx[:-1]) & ((ca[:-1] > 0) != (cb[:-1] > 0)))[0]
+    #interior below (a) runs right to left, interior above (b) left to right
+    below = ca[k] > 0
+    hx1,hx2 = np.where(below,hx[k+1],hx[k]),np.where(below,hx[k],hx[k+1])
+    return np.r_[sx,hx1],np.r_[sy,hy[k]],np.r_[ex,hx2],np.r_[ey,hy[k]]
+
+def _snapCorners(traps,tol):
+    #corners on the same level closer than tol get the same x, so neighbouring trapezoids meet exactly
+    y0,y1,xl0,xr0,xl1,xr1 = [np.array(v,dtype=np.float64) for v in traps]
+    y = np.r_[y0,y0,y1,y1]
+    x = np.r_[xl0,xr0,xl1,xr1]
+    order = np.lexsort((x,y))
+    xs,ys = x[order],y[order]
+    new = np.r_[True,(ys[1:] != ys[:-1]) | (xs[1:]-xs[:-1] > tol)]
+    x[order] = xs[np.nonzero(new)[0][np.cumsum(new)-1]]
+    return (y0,y1) + tuple(np.split(x,4))
+
+def _ringArea(pts):
+    return 0.5*float(np.sum(pts[:,0]*np.roll(pts[:,1],-1) - np.roll(pts[:,0],-1)*pts[:,1]))
+
+def _simplify(pts,tol):
+    #drop repeated and collinear vertices
+    while len(pts) > 2:
+        d = np.roll(pts,-1,axis=0) - pts
+        keep = np.hypot(d[:,0],d[:,1]) > tol
+        pts = pts[keep]
+        prev,nxt = np.roll(pts,1,axis=0),np.roll(pts,-1,axis=0)
+        cross = (pts[:,0]-prev[:,0])*(nxt[:,1]-pts[:,1]) - (pts[:,1]-prev[:,1])*(nxt[:,0]-pts[:,0])
+        span = np.hypot(nxt[:,0]-prev[:,0],nxt[:,1]-prev[:,1])
+        straight = np.abs(cross) <= tol*np.maximum(span,tol)
+        if keep.all() and not straight.any():
+            break
+        #remove every other straight vertex per pass, so two neighbours never disappear together
+        straight &= ~np.roll(straight,1) | (np.arange(len(pts)) % 2 == 0)
+        pts = pts[~straight]
+    return pts
+
+def _tolerance(traps,eps):
+    return eps*max(np.abs(traps[0]).max(),np.abs(traps[1]).max(),np.abs(traps[2]).max(),np.abs(traps[3]).max(),1)
+
+def _loops(traps,tol):
+    #boundary edges chained into closed loops: edge arrays, loop of every edge, loop vertices. None if the outline is open
+    x1,y1,x2,y2 = boundaryEdges(_snapCorners(traps,tol))
+    #every edge continues with the edge starting where it ends (exact coordinates)
+    nxt = np.empty(len(x1),dtype=np.int64)
+    nxt[np.lexsort((y2,x2))] = np.lexsort((y1,x1))
+    if (x2 != x1[nxt]).any() or (y2 != y1[nxt]).any():
+        print('\x1b[33mError:\x1b[0m Open outline while stitching trapezoids, kept them as they are')
+        return None
+    ring = np.full(len(x1),-1,dtype=np.int64)
+    loops = []
+    for k in range(len(x1)):
+        if ring[k] >= 0:
+            continue
+        loop = []
+        while ring[k] < 0:
+            ring[k] = len(loops)
+            loop.append(k)
+            k = nxt[k]
+        loops.append(np.array(loop))
+    return x1,y1,x2,y2,ring,[np.column_stack((x1[l],y1[l])) for l in loops]
+
+def outlines(traps,eps=1e-9):
+    ''' boundary loops of the union of disjoint trapezoids: outlines counterclockwise, holes clockwise (no slits) '''
+    if len(traps[0]) == 0:
+        return []
+    tol = _tolerance(traps,eps)
+    loops = _loops(traps,tol)
+    if loops is None:
+        return list(trapezoidPolygons(traps))
+    return [_simplify(p,tol) for p in loops[5]]
+
+def rings(traps,eps=1e-9):
+    '''
+    Outlines of the union of disjoint trapezoids (from trapezoids()) as counterclockwise polygons without holes:
+    every hole is joined to the polygon around it by a zero width slit from its leftmost vertex.
+    Returns (list of (N,2) arrays, polygon index of every trapezoid)
+    '''
+    if len(traps[0]) == 0:
+        return [],np.empty(0,dtype=np.int64)
+    tol = _tolerance(traps,eps)
+    loops = _loops(traps,tol)
+    if loops is None:
+        return list(trapezoidPolygons(traps)),np.arange(len(traps[0]))
+    x1,y1,x2,y2,ring,pts = loops
+    areas = np.array([_ringArea(p) for p in pts])
+
+    #holes (clockwise) from left to right, each one is bridged to the nearest edge left of its leftmost vertex
+    owner = np.arange(len(pts))
+    holes = [h for h in np.nonzero(areas < 0)[0]]
+    holes.sort(key=lambda h: pts[h][:,0].min())
+    edges = [(x1,y1,x2,y2,ring)]
+    for h in holes:
+        v = np.lexsort((pts[h][:,1],pts[h][:,0]))[0]
+        hx,hy = pts[h][v]
+        ex1,ey1,ex2,ey2,er = [np.concatenate(c) for c in zip(*edges)]
+        cand = (er != h) & (np.minimum(ey1,ey2) <= hy) & (np.maximum(ey1,ey2) >= hy) & (ey1 != ey2)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            xc = ex1 + (hy-ey1)*(ex2-ex1)/(ey2-ey1)
+        cand &= xc <= hx
+        if not cand.any():
+            continue
+        k = np.nonzero(cand)[0][np.argmax(xc[cand])]
+        target = owner[er[k]]
+        #splice the hole into the target ring after the start of edge k, through the hit point
+        tp = pts[target]
+        a = np.nonzero((tp[:,0] == ex1[k]) & (tp[:,1] == ey1[k]))[0]
+        if len(a) == 0:
+            continue
+        hole = np.roll(pts[h],-v,axis=0)
+        hit = np.array([[xc[k],hy]])
+        pts[target] = np.concatenate((tp[:a[0]+1],hit,hole,hole[:1],hit,tp[a[0]+1:]))
+        pts[h] = None
+        owner[owner == h] = target
+        #the slit and the hole edges now belong to the target ring
+        edges.append((np.r_[hit[0,0],hx],np.r_[hy,hy],np.r_[hx,hit[0,0]],np.r_[hy,hy],np.r_[target,target]))
+        ring[ring == h] = target
+        edges[0] = (x1,y1,x2,y2,ring)
+
+    index = -np.ones(len(pts),dtype=np.int64)
+    out = []
+    for r,p in enumerate(pts):
+        if p is not None and areas[r] > 0:
+            index[r] = len(out)
+            out.append(_simplify(p,tol))
+    return out,index[owner[ring[:len(traps[0])]]]
+
+def merge(polygons):
+    ''' union of a polygon list as a list of polygons without holes (see rings()) '''
+    return rings(trapezoids(polygons))[0]
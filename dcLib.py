@@ -13,6 +13,7 @@ from dxfwrite import const
 from maskLib.microwaveLib import Strip_straight, Strip_stub_open
 from maskLib.microwaveLib import CPW_stub_open,CPW_stub_short,CPW_straight,CPW_taper
 from maskLib.Entities import SolidPline, SkewRect, CurveRect, RoundRect, InsideCurve
+from maskLib.profileLib import instrument
 import numpy as np
 
 
@@ -203,3 +204,4 @@ def FluxLineFlagTee(chip, structure, tee_width, tee_extend, w=None, s=None, r_ou
     chip.add(RoundRect(s_left.getPos((0, -dx/2)), r_out, tee_width-dx, r_out, roundCorners=[0,1,0,0],hflip=False,valign=const.MIDDLE,rotation=s_left.direction,**kwargs), structure=s_left.clone(), length=r_out)
     chip.add(CurveRect(s_left.getPos((dy, tee_width/2-dx)), r_corner, r_corner, ralign=const.TOP,angle=90+(90-theta*180/np.pi), hflip=False, vflip=True, rotation=s_left.direction + 90, **kwargs), structure=s_left.clone(), length=r_out)
 
+instrument(globals())
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:05:41 2026
+
+@author: sasha
+
+Design rule checks on the final chip geometry (polygons of the chip and of its sub-block inserts).
+Layers are unioned first (booleanLib), so abutting primitives do not count as edges.
+Edges are binned into a uniform grid (spatial hash) and only edges sharing a cell are compared,
+the distances themselves are computed for all candidate pairs at once with numpy.
+
+Rules are tuples (name, check, layers, value):
+    ('BR.W.1','width','BRIDGE',5)           minimum width of a layer
+    ('M.S.1','space','BASEMETAL',3)         minimum spacing of a layer
+    ('RR.BR.E.1','enclosure',('TETHER','BRIDGE'),1.5)   first layer inside the second by at least value
+    ('RR.E.1','overlap',('TETHER','BASEMETAL'),0)       the two layers must not overlap
+"""
+import numpy as np
+
+from maskLib.booleanLib import outlines, trapezoids
+from maskLib.geometryLib import GeometryStore, _expand
+
+# ===============================================================================
+#  RULE SETS
+# ===============================================================================
+
+def lincolnLabsRules(wafer,jfingerMin=0.1):
+    ''' airbridge rules from Airbridge() and the junction finger minimum from DolanJunction() as checks on the drawn layers (jfingerMin None: no junction rule)
+        widths below a minimum are flagged, a finger exactly jfingerMin wide passes in both places '''
+    BRLAYER = getattr(wafer,'BRLAYER','BRIDGE')
+    RRLAYER = getattr(wafer,'RRLAYER','TETHER')
+    rules = [('BR.W.1','width',BRLAYER,5),
+             ('RR.W.1','width',RRLAYER,8),
+             ('RR.BR.E.1','enclosure',(RRLAYER,BRLAYER),1.5),
+             ('RR.E.1','overlap',(RRLAYER,wafer.defaultLayer),0)]
+    if jfingerMin is not None:
+        rules.append(('JJ.W.1','width',getattr(wafer,'JLAYER','JUNCTION'),jfingerMin))
+    return rules
+
+# ===============================================================================
+#  GEOMETRY
+# ===============================================================================
+
+def chipGeometry(chip):
+    ''' all polygons of a chip in one GeometryStore: its own plus the ones placed by inserts of its sub-blocks '''
+    store = GeometryStore()
+    for i in range(chip.geometry.n):
+        store.add(chip.geometry.polygon(i),*chip.geometry.properties(i))
+    return store.addReferences(chip.chipBlock.get_data(),chip.subBlocks)
+
+def layerEdges(store,layer,chipLayer='0'):
+    ''' edges of the union of a layer as arrays (x1,y1,x2,y2), interior on the left. Layer '0' counts as chipLayer '''
+    names = [l for l in store.layerNames if l == layer or (l == '0' and chipLayer == layer)]
+    ids = [store.layerIds[l] for l in names]
+    polys = [store.polygon(i) for i in np.nonzero(np.isin(store.layers[:store.n],ids))[0]]
+    loops = outlines(trapezoids(polys))
+    if not loops:
+        return tuple(np.empty(0) for i in range(4))
+    a = np.concatenate(loops)
+    b = np.concatenate([np.roll(p,-1,axis=0) for p in loops])
+    return a[:,0],a[:,1],b[:,0],b[:,1]
+
+def layerPolygons(store,layer,chipLayer='0'):
+    ids = [store.layerIds[l] for l in store.layerNames if l == layer or (l == '0' and chipLayer == layer)]
+    return [store.polygon(i) for i in np.nonzero(np.isin(store.layers[:store.n],ids))[0]]
+
+# ===============================================================================
+#  SPATIAL HASH
+# ===============================================================================
+
+def candidatePairs(boxA,boxB=None,cell=1.):
+    '''
+    index pairs (i,j) of boxes (x0,y0,x1,y1 arrays) that share a grid cell of size cell, each pair once.
+    boxB None: pairs within boxA with i < j
+    '''
+    def cells(box):
+        #(box index, cell column, cell row) for every cell a box touches
+        x0,y0,x1,y1 = [np.floor(np.asarray(v)/cell).astype(np.int64) for v in box]
+        k,cx = _expand(x0,x1)
+        c,cy = _expand(y0[k],y1[k])
+        return k[c],cx[c],cy
+    same = boxB is None
+    ka,xa,ya = cells(boxA)
+    kb,xb,yb = same and (ka,xa,ya) or cells(boxB)
+    if len(ka) == 0 or len(kb) == 0:
+        return np.empty(0,dtype=np.int64),np.empty(0,dtype=np.int64)
+    #one integer key per cell
+    x0,y0 = min(xa.min(),xb.min()),min(ya.min(),yb.min())
+    span = max(xa.max(),xb.max())-x0+1
+    keyA,keyB = (ya-y0)*span + xa-x0,(yb-y0)*span + xb-x0
+    #join on the cell key: for every entry of A, the run of B entries in the same cell
+    order = np.argsort(keyB,kind='stable')
+    keyB,kb = keyB[order],kb[order]
+    lo,hi = np.searchsorted(keyB,keyA,'left'),np.searchsorted(keyB,keyA,'right')
+    r,j = _expand(lo,hi-1)
+    i,j = ka[r],kb[j]
+    keep = i < j if same else np.ones(len(i),dtype=bool)
+    pairs = np.unique(np.column_stack((i[keep],j[keep])),axis=0)
+    return pairs[:,0],pairs[:,1]
+
+def _boxes(x1,y1,x2,y2,margin=0):
+    return np.minimum(x1,x2)-margin,np.minimum(y1,y2)-margin,np.maximum(x1,x2)+margin,np.maximum(y1,y2)+margin
+
+# ===============================================================================
+#  EDGE PAIR MATH
+# ===============================================================================
+
+def _pointSegment(px,py,x1,y1,x2,y2):
+    #closest point on segments to points
+    dx,dy = x2-x1,y2-y1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        t = np.clip(((px-x1)*dx + (py-y1)*dy)/(dx*dx+dy*dy),0,1)
+    t = np.nan_to_num(t)
+    return x1+t*dx,y1+t*dy
+
+def segmentDistance(a,b):
+    ''' distance between segments a[k] and b[k] (tuples of x1,y1,x2,y2 arrays) and the closest points (pax,pay,pbx,pby) '''
+    ax1,ay1,ax2,ay2 = a
+    bx1,by1,bx2,by2 = b
+    #the minimum is always at an end point of one of the segments (unless they cross)
+    cands = []
+    for px,py,seg,onA in ((ax1,ay1,b,True),(ax2,ay2,b,True),(bx1,by1,a,False),(bx2,by2,a,False)):
+        qx,qy = _pointSegment(px,py,*seg)
+        cands.append(onA and (px,py,qx,qy) or (qx,qy,px,py)) #(point on a, point on b)
+    d = np.array([np.hypot(c[2]-c[0],c[3]-c[1]) for c in cands])
+    best = np.argmin(d,axis=0)
+    k = np.arange(len(ax1))
+    pts = [np.array([c[n] for c in cands])[best,k] for n in range(4)]
+    dist = d[best,k]
+    #crossing segments
+    def side(x1,y1,x2,y2,px,py):
+        return (x2-x1)*(py-y1) - (y2-y1)*(px-x1)
+    cross = (side(*a,bx1,by1)*side(*a,bx2,by2) < 0) & (side(*b,ax1,ay1)*side(*b,ax2,ay2) < 0)
+    dist[cross] = 0
+    return dist,pts
+
+def edgePairs(a,b,value,mode,tol=1e-9):
+    '''
+    closest approach of edges a against edges b (x1,y1,x2,y2 arrays, interior on the left) below value
+    mode 'width': facing each other across the interior, 'space': across the outside,
+    'enclosure': a inside b, b on the outside of a
+    returns (distance, x, y) at the midpoint of the closest points
+    '''
+    same = b is None
+    if same:
+        b = a
+    if len(a[0]) == 0 or len(b[0]) == 0:
+        return np.empty(0),np.empty(0),np.empty(0)
+    cell = max(value,1e-3)
+    i,j = candidatePairs(_boxes(*a,value/2),None if same else _boxes(*b,value/2),2*cell)
+    ea,eb = [v[i] for v in a],[v[j] for v in b]
+    dist,(pax,pay,pbx,pby) = segmentDistance(ea,eb)
+    ua = np.array([ea[2]-ea[0],ea[3]-ea[1]])
+    ub = np.array([eb[2]-eb[0],eb[3]-eb[1]])
+    la,lb = np.hypot(*ua),np.hypot(*ub)
+    #which side of each edge the other one's closest point is on (positive: interior)
+    sa = (ua[0]*(pby-ea[1]) - ua[1]*(pbx-ea[0]))/la
+    sb = (ub[0]*(pay-eb[1]) - ub[1]*(pax-eb[0]))/lb
+    dot = (ua*ub).sum(axis=0)/(la*lb)
+    tol = tol*max(value,1)
+    if mode == 'width':
+        hit = (sa > tol) & (sb > tol) & (dot < 0)
+    elif mode == 'space':
+        hit = (sa < -tol) & (sb < -tol) & (dot < 0)
+    else:
+        hit = (sa < -tol) & (sb > tol) & (dot > 0)
+    hit &= (dist < value - tol) & (dist > tol)
+    return dist[hit],(pax[hit]+pbx[hit])/2,(pay[hit]+pby[hit])/2
+
+# ===============================================================================
+#  CHECKS
+#       each returns (value, x, y) arrays for the violations of one rule
+# ===============================================================================
+
+def checkWidth(store,layers,value,chipLayer='0'):
+    return edgePairs(layerEdges(store,layers,chipLayer),None,value,'width')
+
+def checkSpace(store,layers,value,chipLayer='0'):
+    return edgePairs(layerEdges(store,layers,chipLayer),None,value,'space')
+
+def checkEnclosure(store,layers,value,chipLayer='0'):
+    inner,outer = layers
+    #parts of the inner layer outside the outer layer
+    y0,y1,xl0,xr0,xl1,xr1 = trapezoids(layerPolygons(store,inner,chipLayer),layerPolygons(store,outer,chipLayer),'not')
+    d,x,y = edgePairs(layerEdges(store,inner,chipLayer),layerEdges(store,outer,chipLayer),value,'enclosure')
+    return np.r_[-np.ones(len(y0)),d],np.r_[(xl0+xr0+xl1+xr1)/4,x],np.r_[(y0+y1)/2,y]
+
+def checkOverlap(store,layers,value,chipLayer='0'):
+    ''' areas where the two layers overlap (value is ignored), reported by trapezoid area '''
+    y0,y1,xl0,xr0,xl1,xr1 = trapezoids(layerPolygons(store,layers[0],chipLayer),layerPolygons(store,layers[1],chipLayer),'and')
+    sizes = (y1-y0)*((xr0-xl0)+(xr1-xl1))/2
+    return sizes,(xl0+xr0+xl1+xr1)/4,(y0+y1)/2
+
+CHECKS = {'width':checkWidth,'space':checkSpace,'enclosure':checkEnclosure,'overlap':checkOverlap}
+
+# ===============================================================================
+#  RUNNING CHECKS
+# ===============================================================================
+
+def _dedupe(value,x,y,grid):
+    #one report per rule and grid cell (arcs give many edge pairs for the same spot)
+    if len(x) == 0:
+        return value,x,y
+    key = np.column_stack((np.floor(x/grid),np.floor(y/grid)))
+    order = np.lexsort((value,key[:,1],key[:,0]))
+    key = key[order]
+    first = np.r_[True,(key[1:] != key[:-1]).any(axis=1)]
+    keep = order[first]
+    return value[keep],x[keep],y[keep]
+
+def checkChip(chip,rules,verbose=True):
+    '''
+    Run rules on a chip. Returns a list of violations (rule name, x, y, measured value) in chip coordinates.
+    measured value: distance for width / space / enclosure (-1: inner layer outside the outer layer), area for overlap
+    '''
+    if chip.onDisk('check'):
+        return []
+    store = chipGeometry(chip)
+    chipLayer = chip.lyr(chip.layer)
+    violations = []
+    for name,check,layers,value in rules:
+        if check not in CHECKS:
+            print('\x1b[33mError:\x1b[0m Unknown DRC check '+str(check)+' in rule '+str(name)+'!')
+            continue
+        found = _dedupe(*CHECKS[check](store,layers,value,chipLayer),max(value,1))
+        violations.extend((name,x,y,v) for v,x,y in zip(*[f.tolist() for f in found]))
+    if verbose:
+        report(chip.ID,violations)
+    return violations
+
+def checkWafer(wafer,rules,verbose=True):
+    ''' run rules once per distinct chip in the wafer chip buffer, returns a dict of chip ID -> violations '''
+    results = {}
+    for chip in wafer.chips:
+        if chip is not None and chip.ID not in results:
+            results[chip.ID] = checkChip(chip,rules,verbose)
+    return results
+
+def report(name,violations,limit=10):
+    if not violations:
+        print('DRC '+name+': \x1b[32mclean\x1b[0m')
+        return
+    print('DRC '+name+': \x1b[33m'+str(len(violations))+' violations\x1b[0m')
+    for rule,x,y,value in violations[:limit]:
+        print('    %s at (%.3f, %.3f): %.4g' % (rule,x,y,value))
+    if len(violations) > limit:
+        print('    ...')
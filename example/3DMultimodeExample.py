@@ -95,13 +95,19 @@ w.setDefaultChip(MultimodeTransmon3D(w,'3DMM2_CHIP_DEFAULT',w.defaultLayer,jfing
 
 #this goes through the chip buffer and sets each entry to a new chip we define.
 #Note: the CHIPID has to be unique for each chip 
-for i in range(1,len(w.chips)):
-    w.setChipBuffer(MultimodeTransmon3D(w,'3DMM2_CHIP'+str(i),w.defaultLayer,jfingerw=junc_ws[i]).save(w), i)
-    #Note: You need to generate the chip, then call chip.save(wafer) to make sure the chip is written to the wafer block list!
-    #alternative example:
-    #temp_chip = MultimodeTransmon3D(w,'3DMM2_CHIP'+str(i),w.defaultLayer,jfingerw=junc_ws[i])
-    #temp_chip.save(w)
-    #wafer.chips[i]=temp_chip
+#The chips are independent, so they are built in parallel worker processes and saved to the wafer in order
+w.buildChips([(MultimodeTransmon3D,('3DMM2_CHIP'+str(i),w.defaultLayer),{'jfingerw':junc_ws[i]}) for i in range(1,len(w.chips))],
+             indices=range(1,len(w.chips)))
+#Note: buildChips calls chip.save(wafer) for you. When building chips yourself, you need to generate the chip, 
+#then call chip.save(wafer) to make sure the chip is written to the wafer block list!
+#serial example:
+#for i in range(1,len(w.chips)):
+#    w.setChipBuffer(MultimodeTransmon3D(w,'3DMM2_CHIP'+str(i),w.defaultLayer,jfingerw=junc_ws[i]).save(w), i)
+#alternative example:
+#for i in range(1,len(w.chips)):
+#    temp_chip = MultimodeTransmon3D(w,'3DMM2_CHIP'+str(i),w.defaultLayer,jfingerw=junc_ws[i])
+#    temp_chip.save(w)
+#    w.chips[i]=temp_chip
     
 #Let's also save a dxf of just one of the chips but without the dicing border 
 #(this will technically overwrite the block list with itself, so best to do this when you set the chip buffer)
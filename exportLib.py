@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:40 2026
+
+@author: sasha
+
+Writers for getting a finished wafer out of maskLib (streaming dxf, gdsii, chip cache)
+"""
+import glob
+import hashlib
+import inspect
+import math
+import os
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from dxfwrite import const
+from dxfwrite.base import DXFAtom, DXFName, tags2str
+from dxfwrite.entities import _Entity, Arc, Circle, Insert, Line, Polyline, Solid, Text
+
+from maskLib.geometryLib import GeometryRun, GeometryStore, edgeCells, rasterize
+from maskLib.utilities import arcSegments, bulgePoints
+
+# ===============================================================================
+#  STREAMING DXF WRITER
+#       block definitions are serialized to a spool file as soon as they are finalized,
+#       so peak memory is set by the largest chip instead of the whole wafer
+# ===============================================================================
+
+class DXFStream:
+    ''' Bounded memory replacement for Drawing.save()
+        writeBlock() spools a finished block to disk, save() assembles the final file:
+        HEADER and TABLES from the drawing, the spooled BLOCKS, then ENTITIES one at a time.
+    '''
+
+    def __init__(self,fileName,encoding='cp1252'):
+        self.fileName = fileName
+        self.encoding = encoding
+        self.spool = tempfile.TemporaryFile(mode='w+',encoding=encoding,errors='replace')
+        self.blocks = {} #block name -> (offset, length) in spool
+
+    def hasBlock(self,name):
+        return name in self.blocks
+
+    def writeBlock(self,block):
+        #serialize a dxfwrite block, returns False if a block with this name was already written
+        name = block['name']
+        if name in self.blocks:
+            return False
+        self.writeRaw(name,tags2str(block))
+        return True
+
+    def writeRaw(self,name,text):
+        #append already serialized block text to the spool
+        self.spool.seek(0,2)
+        self.blocks[name] = (self.spool.tell(),len(text))
+        self.spool.write(text)
+
+    def readBlock(self,name):
+        #return the serialized text of a spooled block
+        offset,length = self.blocks[name]
+        self.spool.seek(offset)
+        text = self.spool.read(length)
+        self.spool.seek(0,2)
+        return text
+
+    def copyBlock(self,other,name):
+        #copy a spooled block from another stream (used for single chip copy dxfs)
+        if name not in self.blocks:
+            self.writeRaw(name,other.readBlock(name))
+
+    def save(self,drawing):
+        #assemble the final dxf. Blocks added directly to drawing.blocks are written after the spooled ones
+        with open(self.fileName,'w',encoding=self.encoding,errors='replace') as f:
+            f.write(tags2str(drawing.header))
+            f.write(tags2str(drawing.tables))
+
+            f.write(DXFAtom('SECTION').__dxf__())
+            f.write(DXFName('BLOCKS').__dxf__())
+            self.spool.seek(0)
+            shutil.copyfileobj(self.spool,f)
+            for name,block in drawing.blocks.blocks.items():
+                if name not in self.blocks:
+                    f.write(tags2str(block))
+            f.write(DXFAtom('ENDSEC').__dxf__())
+
+            f.write(DXFAtom('SECTION').__dxf__())
+            f.write(DXFName('ENTITIES').__dxf__())
+            for entity in drawing.entities.entities:
+                f.write(tags2str(entity))
+            f.write(DXFAtom('ENDSEC').__dxf__())
+            f.write(DXFAtom('EOF').__dxf__())
+        self.spool.seek(0,2)
+
+# ===============================================================================
+#  GDSII WRITER
+#       binary stream format: big-endian records of (length, record type, data type, data)
+#       dxf blocks become structures, inserts become SREF / AREF (MINSERT), closed polylines become BOUNDARY
+# ===============================================================================
+
+#record types (upper byte) and data types (lower byte)
+GDS_HEADER = 0x0002
+GDS_BGNLIB = 0x0102
+GDS_LIBNAME = 0x0206
+GDS_UNITS = 0x0305
+GDS_ENDLIB = 0x0400
+GDS_BGNSTR = 0x0502
+GDS_STRNAME = 0x0606
+GDS_ENDSTR = 0x0700
+GDS_BOUNDARY = 0x0800
+GDS_PATH = 0x0900
+GDS_SREF = 0x0A00
+GDS_AREF = 0x0B00
+GDS_TEXT = 0x0C00
+GDS_LAYER = 0x0D02
+GDS_DATATYPE = 0x0E02
+GDS_WIDTH = 0x0F03
+GDS_XY = 0x1003
+GDS_ENDEL = 0x1100
+GDS_SNAME = 0x1206
+GDS_COLROW = 0x1302
+GDS_TEXTTYPE = 0x1602
+GDS_STRING = 0x1906
+GDS_STRANS = 0x1A01
+GDS_MAG = 0x1B05
+GDS_ANGLE = 0x1C05
+
+GDS_MAXPOINTS = 8190 #XY record is limited to 65535 bytes (including closing point)
+
+def gdsReal8(value):
+    #excess-64 base-16 floating point used by GDSII
+    if value == 0:
+        return bytes(8)
+    sign = value < 0 and 0x80 or 0
+    value = abs(value)
+    exponent = int(math.floor(math.log(value,16))) + 65
+    mantissa = value * 16.0**(64-exponent)
+    if mantissa >= 1:
+        exponent,mantissa = exponent+1,mantissa/16
+    elif mantissa < 1/16:
+        exponent,mantissa = exponent-1,mantissa*16
+    return struct.pack('>Q',(sign | exponent) << 56 | min(int(round(mantissa * 2**56)),2**56-1))
+
+def _attr(entity,key,default=None):
+    #dxfwrite raises KeyError for attributes that were never set
+    try:
+        value = entity[key]
+    except KeyError:
+        return default
+    return value is None and default or value
+
+def _polylinePoints(polyline,ptDensity,tolerance=None):
+    #vertex locations, with bulge arcs (gds has no arcs) flattened
+    verts = [v for v in polyline.vertices if isinstance(v,_Entity)]
+    closed = _attr(polyline,'flags',0) & const.POLYLINE_CLOSED
+    pts = []
+    for k,v in enumerate(verts):
+        pts.append(v['location']['xy'])
+        bulge = _attr(v,'bulge',0)
+        if bulge and (closed or k+1 < len(verts)):
+            pts.extend(map(tuple,bulgePoints(pts[-1],verts[(k+1) % len(verts)]['location']['xy'],bulge,ptDensity,tolerance)[1:-1].tolist()))
+    return pts
+
+def _splitPolygon(pts,maxPts=GDS_MAXPOINTS):
+    #cut a polygon into vertical slabs until every piece fits in one XY record (Sutherland-Hodgman against x=c)
+    if len(pts) <= maxPts:
+        return [pts]
+    c = np.median(pts[:,0])
+    pieces = []
+    for side in (1,-1):
+        out = []
+        prev = pts[-1]
+        pin = side*(prev[0]-c) <= 0
+        for p in pts:
+            cin = side*(p[0]-c) <= 0
+            if cin != pin:
+                t = (c-prev[0])/(p[0]-prev[0])
+                out.append((c,prev[1]+t*(p[1]-prev[1])))
+            if cin:
+                out.append((p[0],p[1]))
+            prev,pin = p,cin
+        if len(out) >= 3 and len(out) < len(pts):
+            pieces.extend(_splitPolygon(np.array(out),maxPts))
+        elif len(out) >= 3:
+            #could not reduce (all points on the cut line), give up on this piece
+            pieces.append(np.array(out))
+    return pieces
+
+class GDSWriter:
+    ''' Binary GDSII writer for a wafer drawing
+        layerNums maps layer names to GDS layer numbers (Wafer.layerNums).
+        Entities on layer '0' inherit the layer of the insert, like in dxf. Blocks that are inserted on
+        more than one layer are written once per layer as NAME_LAYER.
+        precision is the database unit in drawing units (1e-3 = 1nm grid for um drawings)
+    '''
+
+    def __init__(self,fileName,layerNums,libName='MASKLIB',precision=1e-3,userUnit=1e-6,ptDensity=120,arcTolerance=None):
+        self.fileName = fileName
+        self.layerNums = layerNums
+        self.libName = libName
+        self.precision = precision
+        self.userUnit = userUnit
+        self.ptDensity = ptDensity #circle and arc segmentation (#pts / revolution), unless arcTolerance is set
+        self.arcTolerance = arcTolerance #max chord error of segmented arcs (the wafer's arcTolerance)
+        self.f = None
+
+    # ------------------------------ records ------------------------------
+
+    def record(self,rtype,data=b''):
+        self.f.write(struct.pack('>HH',len(data)+4,rtype))
+        self.f.write(data)
+
+    def recordInts(self,rtype,values):
+        self.record(rtype,struct.pack('>%dh' % len(values),*values))
+
+    def recordString(self,rtype,text):
+        data = text.encode('ascii','replace')
+        self.record(rtype,len(data) % 2 and data + b'\0' or data)
+
+    def recordXY(self,pts):
+        #pts: (N,2) array in drawing units
+        self.record(GDS_XY,np.rint(np.asarray(pts,dtype=np.float64)/self.precision).astype('>i4').tobytes())
+
+    # ------------------------------ elements ------------------------------
+
+    def boundary(self,layer,pts,datatype=0):
+        pts = np.asarray(pts,dtype=np.float64)[:,:2]
+        if len(pts) and np.array_equal(pts[0],pts[-1]):
+            pts = pts[:-1]
+        if len(pts) < 3:
+            return
+        for piece in _splitPolygon(pts):
+            self.record(GDS_BOUNDARY)
+            self.recordInts(GDS_LAYER,[layer])
+            self.recordInts(GDS_DATATYPE,[datatype])
+            self.recordXY(np.vstack((piece,piece[:1])))
+            self.record(GDS_ENDEL)
+
+    def path(self,layer,pts,width=0,datatype=0):
+        pts = np.asarray(pts,dtype=np.float64)[:,:2]
+        if len(pts) < 2:
+            return
+        for i in range(0,len(pts)-1,GDS_MAXPOINTS):
+            self.record(GDS_PATH)
+            self.recordInts(GDS_LAYER,[layer])
+            self.recordInts(GDS_DATATYPE,[datatype])
+            self.record(GDS_WIDTH,struct.pack('>i',int(round(width/self.precision))))
+            self.recordXY(pts[i:i+GDS_MAXPOINTS+1])
+            self.record(GDS_ENDEL)
+
+    def transform(self,xscale=1,yscale=1,rotation=0):
+        #STRANS / MAG / ANGLE records. dxf scales then rotates, GDS reflects about x then rotates
+        if xscale*yscale < 0:
+            rotation += xscale < 0 and 180 or 0
+        mag = abs(xscale)
+        if xscale*yscale < 0 or mag != 1 or rotation % 360:
+            self.record(GDS_STRANS,struct.pack('>H',xscale*yscale < 0 and 0x8000 or 0))
+            if mag != 1:
+                self.record(GDS_MAG,gdsReal8(mag))
+            if rotation % 360:
+                self.record(GDS_ANGLE,gdsReal8(rotation % 360))
+
+    def reference(self,sname,insert,xscale=1,yscale=1,rotation=0,columns=1,rows=1,colspacing=0,rowspacing=0):
+        #SREF, or AREF for a MINSERT style array
+        array = columns > 1 or rows > 1
+        self.record(array and GDS_AREF or GDS_SREF)
+        self.recordString(GDS_SNAME,sname)
+        self.transform(xscale,yscale,rotation)
+        if array:
+            self.recordInts(GDS_COLROW,[columns,rows])
+            a = math.radians(rotation)
+            cvec = (math.cos(a)*columns*colspacing,math.sin(a)*columns*colspacing)
+            rvec = (-math.sin(a)*rows*rowspacing,math.cos(a)*rows*rowspacing)
+            self.recordXY([insert,(insert[0]+cvec[0],insert[1]+cvec[1]),(insert[0]+rvec[0],insert[1]+rvec[1])])
+        else:
+            self.recordXY([insert])
+        self.record(GDS_ENDEL)
+
+    def text(self,layer,string,insert,height=1,rotation=0):
+        self.record(GDS_TEXT)
+        self.recordInts(GDS_LAYER,[layer])
+        self.recordInts(GDS_TEXTTYPE,[0])
+        self.transform(height,height,rotation)
+        self.recordXY([insert])
+        self.recordString(GDS_STRING,string)
+        self.record(GDS_ENDEL)
+
+    # ------------------------------ dxf conversion ------------------------------
+
+    def gdsLayer(self,layer,parentLayer):
+        #layer '0' inherits the layer of the insert
+        return self.layerNums.get(layer == '0' and parentLayer or layer,0)
+
+    def layerNum(self,entity,parentLayer):
+        return self.gdsLayer(_attr(entity,'layer','0'),parentLayer)
+
+    def iterEntities(self,obj):
+        #flatten composite entities (rectangles, SolidPlines, ...) into dxfwrite primitives
+        if isinstance(obj,_Entity):
+            yield obj
+        elif isinstance(obj,(list,tuple)):
+            for item in obj:
+                yield from self.iterEntities(item)
+        elif hasattr(obj,'__dxftags__'):
+            yield from self.iterEntities(obj.__dxftags__())
+
+    def collectLayers(self,entities,parentLayer,blocks,variants):
+        #find the effective layer(s) each block gets inserted on
+        for entity in entities:
+            if isinstance(entity,Insert):
+                name = _attr(entity,'blockname')
+                layer = _attr(entity,'layer','0')
+                layer = layer == '0' and parentLayer or layer
+                if name in blocks and layer not in variants.setdefault(name,[]):
+                    variants[name].append(layer)
+                    self.collectLayers(blocks[name].data,layer,blocks,variants)
+
+    def writeGeometry(self,store,start,stop,parentLayer):
+        #bulk path for chip polygons kept in a GeometryStore: anything outlined or filled is a BOUNDARY
+        layerNums = [self.gdsLayer(layer,parentLayer) for layer in store.layerNames]
+        drawn = (store.colors[start:stop] >= 0) | (store.bgcolors[start:stop] >= 0)
+        for i in np.nonzero(drawn)[0] + start:
+            self.boundary(layerNums[store.layers[i]],store.polygon(i))
+
+    def writeEntity(self,entity,parentLayer,names):
+        if isinstance(entity,GeometryRun):
+            self.writeGeometry(entity.store,entity.start,entity.stop,parentLayer)
+            return
+        primitives = list(self.iterEntities(entity))
+        outlines = [e for e in primitives if isinstance(e,Polyline) and _attr(e,'flags',0) & const.POLYLINE_CLOSED]
+        for e in primitives:
+            if isinstance(e,Insert):
+                self.reference(names(_attr(e,'blockname'),_attr(e,'layer','0') == '0' and parentLayer or _attr(e,'layer')),
+                               _attr(e,'insert')['xy'],_attr(e,'xscale',1),_attr(e,'yscale',1),_attr(e,'rotation',0),
+                               _attr(e,'columns',1),_attr(e,'rows',1),_attr(e,'colspacing',0),_attr(e,'rowspacing',0))
+            elif isinstance(e,Polyline):
+                pts = _polylinePoints(e,self.ptDensity,self.arcTolerance)
+                if _attr(e,'flags',0) & const.POLYLINE_CLOSED:
+                    self.boundary(self.layerNum(e,parentLayer),pts)
+                else:
+                    self.path(self.layerNum(e,parentLayer),pts,_attr(e,'startwidth',0))
+            elif isinstance(e,Solid) and not outlines:
+                #solid fill without an outline: the solid itself is the shape
+                pts = [e[i]['xy'] for i in range(4) if i in e.attribs]
+                if len(pts) == 4 and pts[3] == pts[2]:
+                    pts = pts[:3]
+                self.boundary(self.layerNum(e,parentLayer),pts)
+            elif isinstance(e,(Circle,Arc)):
+                center,r = _attr(e,'center')['xy'],_attr(e,'radius')
+                a0,a1 = isinstance(e,Arc) and (_attr(e,'startangle',0),_attr(e,'endangle',360)) or (0,360)
+                a1 = a1 <= a0 and a1+360 or a1
+                t = np.radians(np.linspace(a0,a1,max(arcSegments(r,a1-a0,self.arcTolerance) or int((a1-a0)/360*self.ptDensity),2)+1))
+                self.path(self.layerNum(e,parentLayer),np.column_stack((center[0]+r*np.cos(t),center[1]+r*np.sin(t))))
+            elif isinstance(e,Line):
+                self.path(self.layerNum(e,parentLayer),[_attr(e,'start')['xy'],_attr(e,'end')['xy']])
+            elif isinstance(e,Text):
+                self.text(self.layerNum(e,parentLayer),str(_attr(e,'text','')),_attr(e,'insert')['xy'],_attr(e,'height',1),_attr(e,'rotation',0))
+
+    def structure(self,name,entities,parentLayer,names):
+        self.recordInts(GDS_BGNSTR,self.timestamp)
+        self.recordString(GDS_STRNAME,name)
+        for entity in entities:
+            self.writeEntity(entity,parentLayer,names)
+        self.record(GDS_ENDSTR)
+
+    def save(self,blocks,entities,topName='TOP'):
+        #blocks: dict of name -> dxfwrite block, entities: top level entities
+        variants = {}
+        self.collectLayers(entities,'0',blocks,variants)
+        for name in blocks:
+            #keep unreferenced blocks, same as the dxf
+            if name not in variants:
+                variants[name] = ['0']
+                self.collectLayers(blocks[name].data,'0',blocks,variants)
+        def names(name,layer):
+            return len(variants.get(name,())) > 1 and name+'_'+layer or name
+
+        self.timestamp = list(time.localtime()[:6])*2
+        with open(self.fileName,'wb') as self.f:
+            self.recordInts(GDS_HEADER,[600])
+            self.recordInts(GDS_BGNLIB,self.timestamp)
+            self.recordString(GDS_LIBNAME,self.libName)
+            self.record(GDS_UNITS,gdsReal8(self.precision)+gdsReal8(self.precision*self.userUnit))
+            for name,layers in variants.items():
+                for layer in layers:
+                    self.structure(names(name,layer),blocks[name].data,layer,names)
+            self.structure(topName,entities,'0',names)
+            self.record(GDS_ENDLIB)
+        self.f = None
+
+# ===============================================================================
+#  PNG PREVIEW
+#       polygons are rasterized straight to an RGB image with the layer colors (AutoCAD color index),
+#       a quick look at a design without opening it in a CAD tool
+# ===============================================================================
+
+def _aciTable():
+    #RGB of the 256 AutoCAD colors: 1-9 named, 10-249 hue wheel (24 hues x 5 shades, full and half saturation), 250-255 grays
+    table = np.zeros((256,3))
+    table[1:10] = [(255,0,0),(255,255,0),(0,255,0),(0,255,255),(0,0,255),(255,0,255),(255,255,255),(128,128,128),(192,192,192)]
+    k = np.arange(240)
+    hue = (k//10)*15/60.
+    value = np.array([255,165,127,76,38])[(k%10)//2]
+    chroma = value*np.where(k%2,0.5,1)
+    x = chroma*(1-np.abs(hue%2-1))
+    sector = (hue//1).astype(int)
+    rgb = np.zeros((240,3))
+    for s,(a,b) in enumerate(((0,1),(1,0),(1,2),(2,1),(2,0),(0,2))):
+        on = sector == s
+        rgb[on,a],rgb[on,b] = chroma[on],x[on]
+    table[10:250] = rgb + (value-chroma)[:,None]
+    table[250:256] = np.linspace(51,255,6)[:,None]
+    return table
+
+ACI_RGB = _aciTable()
+
+def writePNG(fileName,rgb):
+    ''' write an (height,width,3) uint8 array as an 8 bit RGB png '''
+    height,width = rgb.shape[:2]
+    rows = np.zeros((height,1+3*width),dtype=np.uint8) #filter byte 0 in front of each row
+    rows[:,1:] = rgb.reshape(height,-1)
+    def chunk(tag,data):
+        return struct.pack('>I',len(data)) + tag + data + struct.pack('>I',zlib.crc32(tag+data) & 0xffffffff)
+    with open(fileName,'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR',struct.pack('>IIBBBBB',width,height,8,2,0,0,0)))
+        f.write(chunk(b'IDAT',zlib.compress(rows.tobytes(),6)))
+        f.write(chunk(b'IEND',b''))
+
+def drawingGeometry(entities,blocks,skip=()):
+    ''' polygons of top level drawing entities as a GeometryStore: store runs, rectangles and the like, circles and lines
+        as outlines, inserts of blocks (except the ones named in skip) expanded one level deep. Text is left out
+    '''
+    store = GeometryStore()
+    inserts = []
+    for e in entities:
+        if isinstance(e,GeometryRun):
+            for i in range(e.start,e.stop):
+                store.add(e.store.polygon(i),*e.store.properties(i))
+        elif isinstance(e,Insert):
+            if _attr(e,'blockname') not in skip:
+                inserts.append(e)
+        elif isinstance(e,Circle):
+            center,r = _attr(e,'center')['xy'],_attr(e,'radius')
+            t = np.linspace(0,2*math.pi,257)[:-1]
+            store.add(np.column_stack((center[0]+r*np.cos(t),center[1]+r*np.sin(t))),_attr(e,'layer','0'))
+        elif isinstance(e,Line):
+            store.add([_attr(e,'start')['xy'][:2],_attr(e,'end')['xy'][:2]],_attr(e,'layer','0'),const.BYLAYER,flags=0)
+        else:
+            store.addEntity(e)
+    return store.addReferences(inserts,blocks)
+
+class Raster:
+    ''' RGB image of the drawing region [x0,x0+width] x [y0,y0+height] with square pixels.
+        paint() rasterizes GeometryStores layer by layer (filled polygons with their outline, outline-only polygons as their edges),
+        blit() copies another Raster of the same pixel size in at a drawing position
+    '''
+
+    def __init__(self,x0,y0,width,height,pixel):
+        self.x0,self.y0 = x0,y0
+        self.pixel = pixel
+        self.nx,self.ny = max(int(math.ceil(width/pixel)),1),max(int(math.ceil(height/pixel)),1)
+        self.rgb = np.zeros((self.nx,self.ny,3),dtype=np.float32) #indexed [i,j], j going up like the drawing
+        self.covered = np.zeros((self.nx,self.ny),dtype=bool)
+
+    def paint(self,stores,layerColors,layerOrder=(),chipLayer='0',alpha=0.6):
+        ''' draw polygons of all stores, layers in layerOrder first (later layers on top). Layer '0' is drawn as chipLayer '''
+        groups = {}
+        for store in stores:
+            layers = [name == '0' and chipLayer or name for name in store.layerNames]
+            closed = (store.flags[:store.n] & const.POLYLINE_CLOSED) > 0
+            filled = closed & (store.bgcolors[:store.n] >= 0)
+            outlined = ~filled & (store.colors[:store.n] >= 0)
+            for lid,name in enumerate(layers):
+                on = store.layers[:store.n] == lid
+                groups.setdefault(name,[]).append((store,np.nonzero(on & filled)[0],np.nonzero(on & outlined)[0]))
+        rank = {name:k for k,name in enumerate(layerOrder)}
+        for name in sorted(groups,key=lambda name: rank.get(name,len(rank))):
+            mask = np.zeros((self.nx,self.ny),dtype=bool)
+            for store,filled,outlined in groups[name]:
+                if len(filled):
+                    x1,y1,x2,y2,poly = self._edges(store,filled)
+                    mask |= rasterize(x1,y1,x2,y2,poly,self.nx,self.ny)
+                if len(outlined):
+                    e,i,j = edgeCells(*self._edges(store,outlined)[:4])
+                    keep = (i >= 0) & (i < self.nx) & (j >= 0) & (j < self.ny)
+                    mask[i[keep],j[keep]] = True
+            color = ACI_RGB[layerColors.get(name,7) % 256]
+            self.rgb[mask] = self.rgb[mask]*(1-alpha) + color*alpha
+            self.covered |= mask
+        return self
+
+    def _edges(self,store,indices):
+        #polygon edges in pixel units
+        x1,y1,x2,y2,poly = store.edges(indices)
+        return (x1-self.x0)/self.pixel,(y1-self.y0)/self.pixel,(x2-self.x0)/self.pixel,(y2-self.y0)/self.pixel,poly
+
+    def blit(self,tile,x,y):
+        #covered pixels of tile go on top, its lower left corner at drawing position (x,y) rounded to whole pixels
+        i0,j0 = int(round((x+tile.x0-self.x0)/self.pixel)),int(round((y+tile.y0-self.y0)/self.pixel))
+        a0,b0 = max(i0,0),max(j0,0)
+        a1,b1 = min(i0+tile.nx,self.nx),min(j0+tile.ny,self.ny)
+        if a0 >= a1 or b0 >= b1:
+            return
+        covered = tile.covered[a0-i0:a1-i0,b0-j0:b1-j0]
+        self.rgb[a0:a1,b0:b1][covered] = tile.rgb[a0-i0:a1-i0,b0-j0:b1-j0][covered]
+        self.covered[a0:a1,b0:b1] |= covered
+
+    def save(self,fileName):
+        writePNG(fileName,np.ascontiguousarray(np.clip(self.rgb,0,255).astype(np.uint8).transpose(1,0,2)[::-1]))
+
+# ===============================================================================
+#  CHIP CACHE
+#       built chips are pickled to disk, keyed by a hash of everything that went into building them
+# ===============================================================================
+
+_libraryHash = None
+
+def libraryHash():
+    #hash of the maskLib sources, stands in for a version number
+    global _libraryHash
+    if _libraryHash is None:
+        h = hashlib.sha1()
+        for fileName in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)),'*.py'))):
+            with open(fileName,'rb') as f:
+                h.update(f.read())
+        _libraryHash = h.digest()
+    return _libraryHash
+
+class ChipCache:
+    ''' Content addressed on-disk store for chips built by Wafer.buildChips
+        key() hashes the chip class, the sources of every class in its MRO and of the modules they are defined in
+        (the wafer script itself for chips defined there), the constructor arguments, the wafer properties and
+        layer table, and the maskLib sources.
+        Anything else the chip reads (other imported modules, data files ...) is NOT part of the key: after changing
+        such things, clear() the cache or build without it.
+        Arguments that can't be pickled make a chip uncacheable (key is None).
+    '''
+    #wafer attributes that don't affect chip geometry
+    ignore = ('drawing','stream','chips','defaultChip','chipPts','chipColumns','chipGrid','chipIndex','fileName','path','profiler')
+
+    def __init__(self,path):
+        self.path = path
+        os.makedirs(path,exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _sources(self,cls):
+        #source of each class in the MRO (factory functions: the function) and all of the files they come from
+        h = hashlib.sha1()
+        files = []
+        for c in getattr(cls,'__mro__',(cls,)):
+            h.update((getattr(c,'__module__','')+'.'+getattr(c,'__qualname__',repr(c))).encode())
+            try:
+                h.update(inspect.getsource(c).encode())
+            except (OSError,TypeError):
+                pass
+            fileName = getattr(sys.modules.get(getattr(c,'__module__',None)),'__file__',None)
+            if fileName and fileName not in files:
+                files.append(fileName)
+        for fileName in files:
+            try:
+                with open(fileName,'rb') as f:
+                    h.update(f.read())
+            except OSError:
+                pass
+        return h.digest()
+
+    def key(self,factory,wafer):
+        h = hashlib.sha1(libraryHash())
+        h.update(self._sources(factory[0]))
+        props = sorted((k,v) for k,v in vars(wafer).items() if k not in self.ignore)
+        try:
+            h.update(pickle.dumps((factory[1:],props),protocol=4))
+        except Exception:
+            return None
+        return h.hexdigest()
+
+    def fileName(self,key):
+        return os.path.join(self.path,key+'.pkl')
+
+    def clear(self):
+        ''' delete all cached chips '''
+        for fileName in glob.glob(os.path.join(self.path,'*.pkl')):
+            os.remove(fileName)
+
+    def load(self,key):
+        #return the cached build result, or None on a miss
+        try:
+            with open(self.fileName(key),'rb') as f:
+                result = pickle.load(f)
+        except Exception:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def store(self,key,result):
+        #write to a temporary file first so an interrupted run never leaves a truncated entry
+        temp = self.fileName(key)+'.'+str(os.getpid())
+        try:
+            with open(temp,'wb') as f:
+                pickle.dump(result,f,protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp,self.fileName(key))
+        except Exception as e:
+            print('\x1b[33mError:\x1b[0m Could not cache chip: '+str(e))
+            if os.path.exists(temp):
+                os.remove(temp)
@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 14:02:11 2026
+
+@author: sasha
+
+Columnar geometry storage for chips. Polygons live in flat numpy arrays instead of one
+dxfwrite object (and one tuple per vertex) per shape. DXF tags are only generated at save time.
+"""
+import math
+
+import numpy as np
+
+from dxfwrite import const
+from dxfwrite.entities import Insert, Polyline
+from dxfwrite.rect import Rectangle
+
+# ===============================================================================
+#  FILL MODES
+#       how the background solids of a polygon are built (same as the Entities classes)
+# ===============================================================================
+
+FILL_SOLID = 0  #single solid from the first (up to) 4 points
+FILL_FAN = 1    #triangles [0,i+1,i+2]
+FILL_QUADS = 2  #quads [i,i+1,-i-2,-i-1] between the two halves of the outline
+
+SOLID_CODES = (10,11,13,12) #dxf solids store their 3rd and 4th corner swapped
+
+def solidIndices(n,fill):
+    #vertex indices of each background solid for a polygon of n points
+    if fill == FILL_SOLID:
+        return [list(range(min(n,4)))]
+    elif fill == FILL_QUADS:
+        return [[i,i+1,n-i-2,n-i-1] for i in range(n//2-1)]
+    else:
+        return [[0,i+1,i+2] for i in range(n-2)]
+
+# ===============================================================================
+#  GEOMETRY STORE
+# ===============================================================================
+
+class GeometryStore:
+    ''' Flat polygon storage: one float64 vertex array plus per-polygon columns
+        offsets[i]:offsets[i+1] are the vertices of polygon i
+        colors / bgcolors use -1 for None (no outline / no fill)
+    '''
+
+    def __init__(self,capacity=64):
+        self.vertices = np.empty((capacity*8,2),dtype=np.float64)
+        self.offsets = np.zeros(capacity+1,dtype=np.int64)
+        self.layers = np.empty(capacity,dtype=np.int32)
+        self.fills = np.empty(capacity,dtype=np.uint8)
+        self.flags = np.empty(capacity,dtype=np.int16) #dxf group 70 bitmask (16 bit)
+        self.colors = np.empty(capacity,dtype=np.int16)
+        self.bgcolors = np.empty(capacity,dtype=np.int16)
+        self.linetypes = np.empty(capacity,dtype=np.int16)
+        self.n = 0 #number of polygons
+        self.revision = 0 #bumped when polygons are removed (indices change)
+
+        self.layerNames = [] #layer id -> name
+        self.layerIds = {}
+        self.linetypeNames = []
+        self.exact = {} #polygon index -> entity written to the dxf in place of the segmented polygon (true arcs)
+
+    def __len__(self):
+        return self.n
+
+    def nverts(self):
+        return int(self.offsets[self.n])
+
+    def _grow(self,npolys,nverts):
+        #amortized doubling of the column arrays
+        if self.n + npolys >= len(self.layers):
+            size = max(2*len(self.layers),self.n+npolys+1)
+            self.offsets = np.resize(self.offsets,size+1)
+            for col in ('layers','fills','flags','colors','bgcolors','linetypes'):
+                setattr(self,col,np.resize(getattr(self,col),size))
+        if self.nverts() + nverts > len(self.vertices):
+            size = max(2*len(self.vertices),self.nverts()+nverts)
+            self.vertices = np.resize(self.vertices,(size,2))
+
+    def layerId(self,name):
+        if name not in self.layerIds:
+            self.layerIds[name] = len(self.layerNames)
+            self.layerNames.append(name)
+        return self.layerIds[name]
+
+    def add(self,points,layer='0',color=const.BYLAYER,bgcolor=None,fill=FILL_SOLID,linetype=None,flags=const.POLYLINE_CLOSED):
+        ''' append one polygon, returns its index '''
+        pts = np.asarray(points,dtype=np.float64).reshape(-1,2) if len(points) else np.empty((0,2))
+        self._grow(1,len(pts))
+        i = self.n
+        v0 = self.offsets[i]
+        self.vertices[v0:v0+len(pts)] = pts
+        self.offsets[i+1] = v0+len(pts)
+        self.layers[i] = self.layerId(layer)
+        self.fills[i] = fill
+        self.flags[i] = flags
+        self.colors[i] = color is None and -1 or color
+        self.bgcolors[i] = bgcolor is None and -1 or bgcolor
+        if linetype is None:
+            self.linetypes[i] = -1
+        else:
+            if linetype not in self.linetypeNames:
+                self.linetypeNames.append(linetype)
+            self.linetypes[i] = self.linetypeNames.index(linetype)
+        self.n += 1
+        return i
+
+    def addMany(self,points,layer='0',color=const.BYLAYER,bgcolor=None,fill=FILL_SOLID,linetype=None,flags=const.POLYLINE_CLOSED):
+        ''' append K polygons with the same number of points and properties, points is a (K,N,2) array '''
+        pts = np.asarray(points,dtype=np.float64)
+        k,npts = pts.shape[0],pts.shape[1]
+        if k == 0:
+            return
+        self._grow(k,k*npts)
+        i,v0 = self.n,self.offsets[self.n]
+        self.vertices[v0:v0+k*npts] = pts.reshape(-1,2)
+        self.offsets[i+1:i+k+1] = v0 + npts*np.arange(1,k+1)
+        self.layers[i:i+k] = self.layerId(layer)
+        self.fills[i:i+k] = fill
+        self.flags[i:i+k] = flags
+        self.colors[i:i+k] = color is None and -1 or color
+        self.bgcolors[i:i+k] = bgcolor is None and -1 or bgcolor
+        if linetype is None:
+            self.linetypes[i:i+k] = -1
+        else:
+            if linetype not in self.linetypeNames:
+                self.linetypeNames.append(linetype)
+            self.linetypes[i:i+k] = self.linetypeNames.index(linetype)
+        self.n += k
+
+    def addEntity(self,obj):
+        ''' convert a drawing entity into the store
+            returns False for entities that have to stay dxfwrite objects (text, inserts, circles ...)
+        '''
+        if hasattr(obj,'toGeometry'):
+            obj.toGeometry(self)
+            return True
+        if isinstance(obj,Rectangle):
+            obj._calc_corners()
+            self.add(obj.points,obj.layer,obj.color,obj.bgcolor,FILL_SOLID,obj.linetype,const.POLYLINE_3D_POLYLINE | const.POLYLINE_CLOSED)
+            return True
+        return False
+
+    def extendRun(self,block,start=None):
+        #keep drawing order: polygons [start,n) join the run at the end of the block, or start a new one
+        if start is None:
+            start = self.n-1
+        if start >= self.n:
+            return
+        data = block.get_data()
+        if data and isinstance(data[-1],GeometryRun) and data[-1].store is self and data[-1].stop == start:
+            data[-1].stop = self.n
+        else:
+            data.append(GeometryRun(self,start,self.n))
+
+    def remove(self,indices,block=None):
+        ''' delete polygons, the runs of block that point to this store are renumbered (and dropped when empty) '''
+        keep = np.ones(self.n,dtype=bool)
+        keep[np.asarray(indices,dtype=np.int64)] = False
+        #new index of every old polygon boundary
+        moved = np.r_[0,np.cumsum(keep)]
+        counts = np.diff(self.offsets[:self.n+1])
+        self.vertices = self.vertices[:self.nverts()][np.repeat(keep,counts)]
+        self.offsets = np.r_[0,np.cumsum(counts[keep])]
+        for col in ('layers','fills','flags','colors','bgcolors','linetypes'):
+            setattr(self,col,getattr(self,col)[:self.n][keep])
+        self.exact = {int(moved[i]):e for i,e in self.exact.items() if keep[i]}
+        self.n = int(moved[-1])
+        self.revision += 1
+        if block is not None:
+            data = block.get_data()
+            for obj in data:
+                if isinstance(obj,GeometryRun) and obj.store is self:
+                    obj.start,obj.stop = int(moved[obj.start]),int(moved[obj.stop])
+            data[:] = [obj for obj in data if not (isinstance(obj,GeometryRun) and obj.store is self and obj.start == obj.stop)]
+
+    def addReferences(self,entities,blocks,cache=None):
+        ''' append transformed copies of the polygons of blocks placed by (arrayed) inserts, one level deep
+            blocks: dict of block name -> dxfwrite block. cache: dict of block name -> store, kept between calls. Returns self
+        '''
+        stores = {} if cache is None else cache
+        for e in entities:
+            if not isinstance(e,Insert) or e['blockname'] not in blocks:
+                continue
+            name = e['blockname']
+            if name not in stores:
+                stores[name] = blockGeometry(blocks[name])
+            store = stores[name]
+            attr = lambda key,default: key in e.attribs and e[key] or default
+            layer = attr('layer','0')
+            angle = math.radians(attr('rotation',0))
+            cos,sin = math.cos(angle),math.sin(angle)
+            #array offsets are in the rotated block frame
+            c,r = np.meshgrid(np.arange(attr('columns',1)),np.arange(attr('rows',1)),indexing='ij')
+            ox,oy = c.ravel()*attr('colspacing',0),r.ravel()*attr('rowspacing',0)
+            x0,y0 = e['insert']['xy'][:2]
+            offsets = np.column_stack((x0 + ox*cos - oy*sin,y0 + oy*cos + ox*sin))
+            scale = np.array([attr('xscale',1),attr('yscale',1)])
+            for k in range(store.n):
+                pts = store.polygon(k)*scale
+                pts = np.column_stack((pts[:,0]*cos - pts[:,1]*sin,pts[:,1]*cos + pts[:,0]*sin))
+                props = store.properties(k)
+                #layer '0' in a block means the layer of the insert
+                self.addMany(offsets[:,None,:] + pts,props[0] == '0' and layer or props[0],*props[1:])
+        return self
+
+    def addPolylines(self,entities):
+        ''' append the closed dxfwrite polylines among entities (dxf.polyline is written as it is, addEntity leaves it in the block). Returns self '''
+        for e in entities:
+            if isinstance(e,Polyline) and e['flags'] & const.POLYLINE_CLOSED and not e['flags'] & (const.POLYLINE_3D_POLYMESH | const.POLYLINE_POLYFACE) and e.vertices:
+                self.add([v['location']['xy'][:2] for v in e.vertices],e['layer'],const.BYLAYER,None,FILL_SOLID,None,e['flags'])
+        return self
+
+    # ------------------------------ access ------------------------------
+
+    def polygon(self,i):
+        return self.vertices[self.offsets[i]:self.offsets[i+1]]
+
+    def layer(self,i):
+        return self.layerNames[self.layers[i]]
+
+    def properties(self,i):
+        #(layer, color, bgcolor, fill, linetype, flags) of polygon i, in the same form add() takes them
+        return (self.layerNames[self.layers[i]],
+                None if self.colors[i] < 0 else int(self.colors[i]),
+                None if self.bgcolors[i] < 0 else int(self.bgcolors[i]),
+                int(self.fills[i]),
+                None if self.linetypes[i] < 0 else self.linetypeNames[self.linetypes[i]],
+                int(self.flags[i]))
+
+    def select(self,exclude=(),outline=False,start=0,stop=None):
+        ''' indices of polygons not on an excluded layer (optionally only the ones with an outline) '''
+        if stop is None:
+            stop = self.n
+        mask = ~np.isin(self.layers[start:stop],[self.layerIds[l] for l in exclude if l in self.layerIds])
+        if outline:
+            mask &= self.colors[start:stop] >= 0
+        return np.nonzero(mask)[0] + start
+
+    def edges(self,indices):
+        ''' all edges (closing edge included) of the given polygons as x1,y1,x2,y2 arrays, plus the position in indices of each edge's polygon '''
+        indices = np.asarray(indices,dtype=np.int64)
+        starts,stops = self.offsets[indices],self.offsets[indices+1]
+        counts = stops-starts
+        poly = np.repeat(np.arange(len(indices)),counts)
+        first = np.repeat(starts,counts)
+        k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts)-counts,counts)
+        a = first + k
+        b = first + (k+1) % np.repeat(counts,counts)
+        return self.vertices[a,0],self.vertices[a,1],self.vertices[b,0],self.vertices[b,1],poly
+
+    # ------------------------------ dxf output ------------------------------
+
+    def dxf(self,start=0,stop=None):
+        ''' serialize polygons [start,stop) exactly like the Polyline + Solid entities they replace
+            (polygons with an exact entity write that entity instead)
+        '''
+        if stop is None:
+            stop = self.n
+        base = int(self.offsets[start])
+        verts = self.vertices[base:self.offsets[stop]].tolist()
+        offsets = (self.offsets[start:stop+1] - base).tolist()
+        out = []
+        for k,i in enumerate(range(start,stop)):
+            if i in self.exact:
+                out.append(self.exact[i].__dxf__())
+                continue
+            pts = verts[offsets[k]:offsets[k+1]]
+            layer = self.layerNames[self.layers[i]]
+            if self.colors[i] >= 0:
+                out.append('  0\nPOLYLINE\n')
+                if self.linetypes[i] >= 0:
+                    out.append('  6\n%s\n' % self.linetypeNames[self.linetypes[i]])
+                out.append(' 62\n%d\n  8\n%s\n 66\n1\n 10\n0.0\n 20\n0.0\n 30\n0.0\n 70\n%d\n' % (self.colors[i],layer,self.flags[i]))
+                vertex = '  0\nVERTEX\n  8\n'+layer+'\n 10\n%s\n 20\n%s\n 30\n0.0\n'
+                out.extend([vertex % (x,y) for x,y in pts])
+                out.append('  0\nSEQEND\n')
+            if self.bgcolors[i] >= 0:
+                head = '  0\nSOLID\n 62\n%d\n  8\n%s\n' % (self.bgcolors[i],layer)
+                for idx in solidIndices(len(pts),self.fills[i]):
+                    if len(idx) == 3:
+                        idx = idx + idx[-1:]
+                    out.append(head)
+                    out.extend(['%3d\n%s\n%3d\n%s\n%3d\n0.0\n' % (c,pts[j][0],c+10,pts[j][1],c+20) for c,j in zip(SOLID_CODES,idx)])
+        return ''.join(out)
+
+def blockGeometry(block):
+    ''' polygons of a dxfwrite block as a new GeometryStore (store runs are copied, entities converted) '''
+    store = GeometryStore()
+    for obj in block.get_data():
+        if isinstance(obj,GeometryRun):
+            for i in range(obj.start,obj.stop):
+                store.add(obj.store.polygon(i),*obj.store.properties(i))
+        else:
+            store.addEntity(obj)
+    return store
+
+class GeometryRun:
+    ''' Placeholder for a consecutive range of store polygons inside a dxfwrite block '''
+
+    def __init__(self,store,start,stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __dxf__(self):
+        return self.store.dxf(self.start,self.stop)
+
+# ===============================================================================
+#  RASTERIZATION
+#       boolean cell grids from polygons: cell (i,j) spans [i,i+1] x [j,j+1] in grid units
+# ===============================================================================
+
+def _expand(lo,hi):
+    #for ranges [lo,hi] (inclusive) return (range index, value) of every integer in each range
+    counts = np.maximum(hi-lo+1,0)
+    idx = np.repeat(np.arange(len(lo)),counts)
+    return idx,lo[idx] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts)-counts,counts)
+
+def edgeCells(x1,y1,x2,y2):
+    ''' cells whose open square is crossed by an edge (touching a cell border does not count)
+        returns (edge index, i, j). Same separating axis test as matplotlib's path_intersects_rectangle
+    '''
+    xmin,xmax = np.minimum(x1,x2),np.maximum(x1,x2)
+    #candidate columns, then the rows the edge spans inside each column strip
+    e,i = _expand(np.floor(xmin).astype(np.int64)-1,np.floor(xmax).astype(np.int64)+1)
+    dx,dy = x2-x1,y2-y1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        slope = np.where(dx != 0,dy/dx,0)
+    ya = np.where(dx[e] != 0,y1[e] + slope[e]*(np.clip(i,xmin[e],xmax[e])-x1[e]),y1[e])
+    yb = np.where(dx[e] != 0,y1[e] + slope[e]*(np.clip(i+1,xmin[e],xmax[e])-x1[e]),y2[e])
+    c,j = _expand(np.floor(np.minimum(ya,yb)).astype(np.int64)-1,np.floor(np.maximum(ya,yb)).astype(np.int64)+1)
+    e,i = e[c],i[c]
+    m1x,m1y,m2x,m2y = x1[e],y1[e],x2[e],y2[e]
+    cx,cy = i+0.5,j+0.5
+    hit = (np.abs(m1x + m2x - 2.0*cx) < np.abs(m1x - m2x) + 1) & \
+          (np.abs(m1y + m2y - 2.0*cy) < np.abs(m1y - m2y) + 1) & \
+          (2.0*np.abs((m1x - cx)*(m1y - m2y) - (m1y - cy)*(m1x - m2x)) < np.abs(m1y - m2y) + np.abs(m1x - m2x))
+    return e[hit],i[hit],j[hit]
+
+def scanlineSpans(x1,y1,x2,y2,poly):
+    ''' even-odd scanline fill of cell centers
+        returns (polygon, row j, first column, last column) for every run of cells whose center is inside a polygon
+    '''
+    ylo,yhi = np.minimum(y1,y2),np.maximum(y1,y2)
+    #rows with ylo < j+0.5 <= yhi cross the edge (half open, so vertices are counted once)
+    e,j = _expand(np.floor(ylo-0.5).astype(np.int64),np.ceil(yhi-0.5).astype(np.int64))
+    yc = j+0.5
+    keep = (ylo[e] < yc) & (yc <= yhi[e])
+    e,j,yc = e[keep],j[keep],yc[keep]
+    xc = x1[e] + (yc-y1[e])*(x2[e]-x1[e])/(y2[e]-y1[e])
+    order = np.lexsort((xc,j,poly[e]))
+    p,j,xc = poly[e][order],j[order],xc[order]
+    #crossings pair up within each (polygon,row)
+    xa,xb = xc[0::2],xc[1::2]
+    i0 = np.floor(xa-0.5).astype(np.int64)+1
+    i1 = np.ceil(xb-0.5).astype(np.int64)-1
+    return p[0::2],j[0::2],i0,i1
+
+def pointCells(x,y):
+    ''' cells whose closed square contains a point (up to 4 when the point is on a grid corner), returns (point index, i, j) '''
+    e,i = _expand(np.floor(x).astype(np.int64)-1,np.floor(x).astype(np.int64))
+    c,j = _expand(np.floor(y[e]).astype(np.int64)-1,np.floor(y[e]).astype(np.int64))
+    e,i = e[c],i[c]
+    hit = (2.0*np.abs(x[e]-(i+0.5)) <= 1) & (2.0*np.abs(y[e]-(j+0.5)) <= 1)
+    return e[hit],i[hit],j[hit]
+
+def rasterize(x1,y1,x2,y2,poly,nx,ny,windows=None,firstVertex=False):
+    ''' boolean (nx,ny) grid of cells touched by polygons given as edge arrays (already in grid units)
+        a cell is set if its center is inside a polygon or an edge passes through it.
+        windows: optional (npoly,4) array of inclusive cell ranges [i0,i1,j0,j1] each polygon is limited to
+        firstVertex: also set the cells touching the first vertex of each polygon, like matplotlib's Path.intersects_bbox
+    '''
+    grid = np.zeros((nx,ny),dtype=bool)
+    if len(x1) == 0:
+        return grid
+    if windows is None:
+        windows = np.array([[0,nx-1,0,ny-1]]).repeat(poly.max()+1,axis=0)
+    lo = np.maximum(windows[:,[0,2]],0)
+    hi = np.minimum(windows[:,[1,3]],[nx-1,ny-1])
+
+    #interior: difference array over columns, one +1/-1 pair per span
+    p,j,i0,i1 = scanlineSpans(x1,y1,x2,y2,poly)
+    i0,i1 = np.maximum(i0,lo[p,0]),np.minimum(i1,hi[p,0])
+    keep = (i0 <= i1) & (j >= lo[p,1]) & (j <= hi[p,1])
+    diff = np.zeros((nx+1,ny),dtype=np.int32)
+    np.add.at(diff,(i0[keep],j[keep]),1)
+    np.add.at(diff,(i1[keep]+1,j[keep]),-1)
+    grid |= np.cumsum(diff[:-1],axis=0) > 0
+
+    #edges
+    e,i,j = edgeCells(x1,y1,x2,y2)
+    p = poly[e]
+    keep = (i >= lo[p,0]) & (i <= hi[p,0]) & (j >= lo[p,1]) & (j <= hi[p,1])
+    grid[i[keep],j[keep]] = True
+
+    if firstVertex:
+        first = np.nonzero(np.r_[True,poly[1:] != poly[:-1]])[0]
+        e,i,j = pointCells(x1[first],y1[first])
+        p = poly[first][e]
+        keep = (i >= lo[p,0]) & (i <= hi[p,0]) & (j >= lo[p,1]) & (j <= hi[p,1])
+        grid[i[keep],j[keep]] = True
+    return grid
+
+def dilate(grid,radius=1):
+    #grow set cells by radius steps of their 4-neighbourhood
+    for r in range(radius):
+        out = grid.copy()
+        out[1:] |= grid[:-1]
+        out[:-1] |= grid[1:]
+        out[:,1:] |= grid[:,:-1]
+        out[:,:-1] |= grid[:,1:]
+        grid = out
+    return grid
+
+def _columnRuns(mask):
+    #runs of True along axis 1 in every column: (i, j0, length)
+    padded = np.zeros((mask.shape[0],mask.shape[1]+2),dtype=np.int8)
+    padded[:,1:-1] = mask
+    d = np.diff(padded,axis=1)
+    si,sj = np.nonzero(d == 1)
+    ei,ej = np.nonzero(d == -1)
+    return si,sj,ej-sj
+
+def _mergeRuns(i,j0,length):
+    #join identical runs in consecutive columns into rectangles (i0, j0, ni, nj)
+    if len(i) == 0:
+        return i,j0,i,length
+    order = np.lexsort((i,length,j0))
+    i,j0,length = i[order],j0[order],length[order]
+    new = np.r_[True,(j0[1:] != j0[:-1]) | (length[1:] != length[:-1]) | (i[1:] != i[:-1]+1)]
+    group = np.cumsum(new)-1
+    starts = np.nonzero(new)[0]
+    ni = np.bincount(group)
+    return i[starts],j0[starts],ni,length[starts]
+
+def rectangleCover(mask):
+    ''' cover the True cells of a 2D boolean array with disjoint rectangles
+        runs along one axis are merged across the other, whichever orientation needs fewer rectangles is kept.
+        returns arrays (i0, j0, ni, nj) sorted by i0 then j0
+    '''
+    mask = np.asarray(mask,dtype=bool)
+    a = _mergeRuns(*_columnRuns(mask))
+    b = _mergeRuns(*_columnRuns(mask.T))
+    if len(b[0]) < len(a[0]):
+        a = (b[1],b[0],b[3],b[2])
+    order = np.lexsort((a[1],a[0]))
+    return tuple(v[order] for v in a)
+
+# ===============================================================================
+#  SPATIAL INDEX
+#       uniform grid over polygon bounding boxes, for "what is near here" queries
+# ===============================================================================
+
+KEY_ROW = 2**31 #cell (i,j) has the key i*KEY_ROW + j, so the cells of one column are consecutive keys
+
+def polygonBoxes(store,start=0,stop=None):
+    ''' bounding boxes (x0,y0,x1,y1 arrays) of polygons [start,stop), empty polygons get an inverted (inf) box '''
+    if stop is None:
+        stop = store.n
+    offsets = store.offsets[start:stop+1]
+    counts = np.diff(offsets)
+    boxes = np.empty((4,stop-start))
+    boxes[:2],boxes[2:] = np.inf,-np.inf
+    full = counts > 0
+    if full.any():
+        v = store.vertices[offsets[0]:offsets[-1]]
+        first = (offsets[:-1]-offsets[0])[full]
+        boxes[:2,full] = np.minimum.reduceat(v,first,axis=0).T
+        boxes[2:,full] = np.maximum.reduceat(v,first,axis=0).T
+    return boxes
+
+def polygonDistance(store,indices,x,y):
+    ''' distance from the point (x,y) to each polygon (0 inside closed polygons) '''
+    indices = np.asarray(indices,dtype=np.int64)
+    x1,y1,x2,y2,poly = store.edges(indices)
+    dx,dy = x2-x1,y2-y1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        t = np.nan_to_num(np.clip(((x-x1)*dx + (y-y1)*dy)/(dx*dx+dy*dy),0,1))
+    dist = np.full(len(indices),np.inf)
+    np.minimum.at(dist,poly,np.hypot(x1+t*dx-x,y1+t*dy-y))
+    #even-odd ray cast towards +x
+    cross = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        cross &= x < x1 + (y-y1)*dx/dy
+    inside = np.bincount(poly[cross],minlength=len(indices)) % 2 == 1
+    inside &= (store.flags[indices] & const.POLYLINE_CLOSED) > 0
+    dist[inside] = 0
+    return dist
+
+class SpatialIndex:
+    ''' Grid hash over the bounding boxes of the polygons of one GeometryStore.
+        Polygons appended to the store are bucketed at the next query, removing polygons from the store rebuilds the index.
+        Cell keys are kept in sorted chunks (merged when a chunk grows as large as the one before it), so a query is a
+        binary search per chunk and column. Polygons spanning more than maxCells cells are checked on every query instead.
+    '''
+
+    def __init__(self,store,cell=100.,maxCells=1024):
+        self.store = store
+        self.cell = cell
+        self.maxCells = maxCells
+        self.reset()
+
+    def reset(self):
+        self.n = 0 #polygons indexed so far
+        self.revision = self.store.revision
+        self.boxes = np.empty((4,64))
+        self.chunks = [] #(sorted cell keys, polygon of each key)
+        self.large = np.empty(0,dtype=np.int64)
+        self.extent = [math.inf,math.inf,-math.inf,-math.inf] #box around all indexed polygons
+
+    def sync(self):
+        ''' bucket the polygons added to the store since the last call, returns self '''
+        store = self.store
+        if store.revision != self.revision:
+            self.reset()
+        if self.n == store.n:
+            return self
+        start,stop = self.n,store.n
+        if stop > self.boxes.shape[1]:
+            boxes = np.empty((4,max(2*self.boxes.shape[1],stop)))
+            boxes[:,:start] = self.boxes[:,:start]
+            self.boxes = boxes
+        boxes = polygonBoxes(store,start,stop)
+        self.boxes[:,start:stop] = boxes
+        full = np.nonzero(boxes[0] <= boxes[2])[0]
+        if len(full):
+            self.extent = [min(self.extent[0],boxes[0,full].min()),min(self.extent[1],boxes[1,full].min()),
+                           max(self.extent[2],boxes[2,full].max()),max(self.extent[3],boxes[3,full].max())]
+        x0,y0,x1,y1 = [np.floor(v[full]/self.cell).astype(np.int64) for v in boxes]
+        large = (x1-x0+1)*(y1-y0+1) > self.maxCells
+        self.large = np.r_[self.large,full[large]+start]
+        k,cx = _expand(x0[~large],x1[~large])
+        c,cy = _expand(y0[~large][k],y1[~large][k])
+        keys = cx[c]*KEY_ROW + cy
+        order = np.argsort(keys,kind='stable')
+        chunk = keys[order],(full[~large][k[c]]+start)[order]
+        while self.chunks and len(self.chunks[-1][0]) <= len(chunk[0]):
+            keys,ids = self.chunks.pop()
+            keys,ids = np.r_[keys,chunk[0]],np.r_[ids,chunk[1]]
+            order = np.argsort(keys,kind='stable')
+            chunk = keys[order],ids[order]
+        self.chunks.append(chunk)
+        self.n = stop
+        return self
+
+    def query(self,bbox,layers=None,exclude=()):
+        ''' sorted indices of the polygons whose bounding box overlaps bbox (x0,y0,x1,y1), touching included.
+            layers: only these layer names, exclude: not these
+        '''
+        self.sync()
+        x0,y0,x1,y1 = bbox
+        cx0,cy0,cx1,cy1 = [int(math.floor(v/self.cell)) for v in bbox]
+        cols = np.arange(cx0,cx1+1,dtype=np.int64)*KEY_ROW
+        found = [self.large]
+        for keys,ids in self.chunks:
+            lo,hi = np.searchsorted(keys,cols+cy0,'left'),np.searchsorted(keys,cols+cy1,'right')
+            found.append(ids[_expand(lo,hi-1)[1]])
+        ids = np.unique(np.concatenate(found))
+        bx0,by0,bx1,by1 = self.boxes[:,ids]
+        ids = ids[(bx0 <= x1) & (bx1 >= x0) & (by0 <= y1) & (by1 >= y0)]
+        store = self.store
+        if layers is not None:
+            ids = ids[np.isin(store.layers[ids],[store.layerIds[l] for l in layers if l in store.layerIds])]
+        if exclude:
+            ids = ids[~np.isin(store.layers[ids],[store.layerIds[l] for l in exclude if l in store.layerIds])]
+        return ids
+
+    def nearest(self,point,layers=None,exclude=()):
+        ''' (index, distance) of the polygon closest to point (distance 0 inside a closed polygon), (None, inf) if there is none.
+            The search box is widened until it holds a polygon that is closer than the box edge
+        '''
+        self.sync()
+        x,y = point
+        X0,Y0,X1,Y1 = self.extent
+        if X0 > X1:
+            return None,math.inf
+        #no polygon is further than the corners of the box around all of them
+        rmax = math.hypot(max(abs(x-X0),abs(x-X1)),max(abs(y-Y0),abs(y-Y1)))
+        r = self.cell
+        while True:
+            ids = self.query((x-r,y-r,x+r,y+r),layers,exclude)
+            if len(ids):
+                dist = polygonDistance(self.store,ids,x,y)
+                best = np.argmin(dist)
+                if dist[best] <= r:
+                    return int(ids[best]),float(dist[best])
+                r = dist[best]
+            elif r > rmax:
+                return None,math.inf
+            else:
+                r *= 2
@@ -18,6 +18,7 @@ from maskLib.Entities import SolidPline, CurveRect, RoundRect, InsideCurve
 from maskLib.microwaveLib import Strip_straight, Strip_taper, Strip_pad
 
 from maskLib.utilities import curveAB, kwargStrip
+from maskLib.profileLib import instrument
 
 import math
 
@@ -496,16 +497,16 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             else: # corner 1
                 jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.cos(rot)),-jpadh/2+jpadr*(1-math.sin(rot))),
                                              (-separation/2+jpadOverhang-jpadTaper-jpadr,-jpadh/2),
-                                             clockwise=True,angleDeg=90-angle))
+                                             clockwise=True,angleDeg=90-angle,tolerance=chip.wafer.arcTolerance))
         if angle < 180: # corner 2
             jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadw+jpadr*(1-math.sin(rot90)),-jpadh/2+jpadr*(1-math.cos(rot90))),
                                          (-separation/2+jpadOverhang-jpadTaper-jpadw,-jpadh/2+jpadr),
-                                         clockwise=True,angleDeg=min(180-angle,90)))
+                                         clockwise=True,angleDeg=min(180-angle,90),tolerance=chip.wafer.arcTolerance))
         
         # corner 3 (this one never goes away)
         jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadw,jpadh/2-jpadr),
                                      (-separation/2+jpadOverhang-jpadTaper-jpadw+jpadr,jpadh/2),
-                                     clockwise=True))
+                                     clockwise=True,tolerance=chip.wafer.arcTolerance))
         
         # corner 4
         if angle > 0:
@@ -514,7 +515,7 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             else:
                 jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadr,jpadh/2),
                                              (-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.sin(rot0)),jpadh/2-jpadr*(1-math.cos(rot0))),
-                                             clockwise=True,angleDeg=min(angle,90)))
+                                             clockwise=True,angleDeg=min(angle,90),tolerance=chip.wafer.arcTolerance))
         if jpadTaper <=0:
             if angle > 90:
                 jpadUCL.add_vertex((-separation/2+jpadOverhang,
@@ -531,17 +532,17 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             else:
                 jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.sin(rot0))-ucdist*math.cos(rot),jpadh/2 -jpadr*(1-math.cos(rot0)) + ucdist* max(math.sin(rot),-math.cos(rot))),
                                              (-separation/2+jpadOverhang-jpadTaper-jpadr-ucdist*math.cos(rot),jpadh/2 + ucdist* max(math.sin(rot),-math.cos(rot))),
-                                             clockwise=False,angleDeg=min(angle,90)))
+                                             clockwise=False,angleDeg=min(angle,90),tolerance=chip.wafer.arcTolerance))
         
         
         # corner 3 (this one never goes away)
         jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadw+jpadr + (math.cos(rot)>math.sin(rot) and -ucdist*math.cos(rot) or -ucdist*math.sin(rot)),jpadh/2+ucdist*max(math.sin(rot),-math.cos(rot))),
                                      (-separation/2+jpadOverhang-jpadTaper-jpadw -ucdist*max(math.sin(rot),math.cos(rot)),jpadh/2-jpadr + ucdist*math.sin(rot0)),
-                                     clockwise=False))
+                                     clockwise=False,tolerance=chip.wafer.arcTolerance))
         if angle < 180: # corner 2
             jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadw-ucdist*max(math.sin(rot),math.cos(rot)),-jpadh/2+jpadr -ucdist*math.cos(rot)),
                                          (-separation/2+jpadOverhang-jpadTaper-jpadw+jpadr*(1-math.sin(rot90))-ucdist*max(math.sin(rot),math.cos(rot)),-jpadh/2+jpadr*(1-math.cos(rot90))-ucdist*math.cos(rot)),
-                                         clockwise=False,angleDeg=min(180-angle,90)))
+                                         clockwise=False,angleDeg=min(180-angle,90),tolerance=chip.wafer.arcTolerance))
         
         if angle < 90: 
             if jpadTaper > 0:
@@ -549,7 +550,7 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             else: # corner 1
                 jpadUCL.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadr-ucdist*math.sin(rot),-jpadh/2-ucdist*math.cos(rot)),
                                              (-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.cos(rot))-ucdist*math.sin(rot),-jpadh/2+jpadr*(1-math.sin(rot))-ucdist*math.cos(rot)),
-                                             clockwise=False,angleDeg=90-angle))
+                                             clockwise=False,angleDeg=90-angle,tolerance=chip.wafer.arcTolerance))
         chip.add(jpadUCL)
         
         if angle > 90 and jpadTaper <=0:
@@ -560,13 +561,13 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             # corner 1
             jpadUCL2.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper,-jpadh/2+jpadr),
                                          (-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.cos(rot90)),-jpadh/2+jpadr*(1-math.sin(rot90))),
-                                             clockwise=True,angleDeg=min(angle-90,90)))
+                                             clockwise=True,angleDeg=min(angle-90,90),tolerance=chip.wafer.arcTolerance))
             # - - - - - - - extend pad - - - - - - -
             # corner 1
             jpadUCL2.add_vertices(curveAB((-separation/2+jpadOverhang-jpadTaper-jpadr*(1-math.cos(rot90))-ucdist*math.cos(rot),
                                           -jpadh/2+jpadr*(1-math.sin(rot90))+ucdist*math.sin(rot)),
                                          (-separation/2+jpadOverhang-jpadTaper-ucdist*math.cos(rot),-jpadh/2+jpadr+ucdist*math.sin(rot)),
-                                             clockwise=False,angleDeg=min(angle-90,90)))
+                                             clockwise=False,angleDeg=min(angle-90,90),tolerance=chip.wafer.arcTolerance))
             jpadUCL2.add_vertex((-separation/2+jpadOverhang-ucdist*math.cos(rot),
                            -(jfingerl-jfingerex)*math.sin(rot)-leadw-jfingerw*math.cos(rot)/2))
             chip.add(jpadUCL2)
@@ -581,14 +582,14 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             if angle < 90: # corner 1
                 jpadUCR.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.cos(rot)),-jpadh/2+jpadr*(1-math.sin(rot))),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadr,-jpadh/2),
-                                             clockwise=True,angleDeg=90-angle))
+                                             clockwise=True,angleDeg=90-angle,tolerance=chip.wafer.arcTolerance))
             if jpadTaper > 0:
                 if angle < 90:
                     jpadUCR.add_vertex((jpadw+separation/2-jpadOverhang+jpadTaper-jpadw,-jpadh/2))
             elif angle < 180: # corner 2
                 jpadUCR.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadw+jpadr*(1-math.sin(rot90)),-jpadh/2+jpadr*(1-math.cos(rot90))),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadw,-jpadh/2+jpadr),
-                                             clockwise=True,angleDeg=min(180-angle,90)))
+                                             clockwise=True,angleDeg=min(180-angle,90),tolerance=chip.wafer.arcTolerance))
             if jpadTaper <=0:
                 if right_top:
                     # j finger stems from top of right lead
@@ -621,12 +622,12 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
             elif angle < 180: # corner 2
                 jpadUCR.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadw-ucdist*max(math.sin(rot),math.cos(rot)),-jpadh/2+jpadr -ucdist*math.cos(rot)),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadw+jpadr*(1-math.sin(rot90))-ucdist*max(math.sin(rot),math.cos(rot)),-jpadh/2+jpadr*(1-math.cos(rot90))-ucdist*math.cos(rot)),
-                                             clockwise=False,angleDeg=min(180-angle,90)))
+                                             clockwise=False,angleDeg=min(180-angle,90),tolerance=chip.wafer.arcTolerance))
             
             if angle < 90: # corner 1
                 jpadUCR.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadr-ucdist*math.sin(rot),-jpadh/2-ucdist*math.cos(rot)),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.cos(rot))-ucdist*math.sin(rot),-jpadh/2+jpadr*(1-math.sin(rot))-ucdist*math.cos(rot)),
-                                             clockwise=False,angleDeg=90-angle))
+                                             clockwise=False,angleDeg=90-angle,tolerance=chip.wafer.arcTolerance))
             chip.add(jpadUCR)
             
         if (jpadTaper > 0 and angle > 0) or jpadTaper <= 0:
@@ -654,31 +655,31 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
                 # corner 3 (this one never goes away)
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadw,jpadh/2-jpadr),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadw+jpadr,jpadh/2),
-                                             clockwise=True))
+                                             clockwise=True,tolerance=chip.wafer.arcTolerance))
             
             # corner 4
             if angle > 0:
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadr,jpadh/2),
                                                  (jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.sin(rot0)),jpadh/2-jpadr*(1-math.cos(rot0))),
-                                                 clockwise=True,angleDeg=min(angle,90)))
+                                                 clockwise=True,angleDeg=min(angle,90),tolerance=chip.wafer.arcTolerance))
             
             # corner 1
             if angle >90:
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper,-jpadh/2+jpadr),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.cos(rot90)),-jpadh/2+jpadr*(1-math.sin(rot90))),
-                                                 clockwise=True,angleDeg=min(angle-90,90)))
+                                                 clockwise=True,angleDeg=min(angle-90,90),tolerance=chip.wafer.arcTolerance))
                 # - - - - - - - extend pad - - - - - - -
                 # corner 1
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.cos(rot90))-ucdist*math.cos(rot),
                                               -jpadh/2+jpadr*(1-math.sin(rot90))+ucdist*math.sin(rot)),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-ucdist*math.cos(rot),-jpadh/2+jpadr+ucdist*math.sin(rot)),
-                                                 clockwise=False,angleDeg=min(angle-90,90)))
+                                                 clockwise=False,angleDeg=min(angle-90,90),tolerance=chip.wafer.arcTolerance))
             
             # corner 4
             if angle > 0:
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadr*(1-math.sin(rot0))-ucdist*math.cos(rot),jpadh/2 -jpadr*(1-math.cos(rot0)) + ucdist* max(math.sin(rot),-math.cos(rot))),
                                                  (jpadw+separation/2-jpadOverhang+jpadTaper-jpadr-ucdist*math.cos(rot),jpadh/2 + ucdist* max(math.sin(rot),-math.cos(rot))),
-                                                 clockwise=False,angleDeg=min(angle,90)))
+                                                 clockwise=False,angleDeg=min(angle,90),tolerance=chip.wafer.arcTolerance))
             
             
             if jpadTaper >0:
@@ -688,7 +689,7 @@ def ManhattanJunction(chip,structure,rotation=0,separation=40,jpadw=20,jpadr=2,j
                 # corner 3 (this one never goes away)
                 jpadUCR2.add_vertices(curveAB((jpadw+separation/2-jpadOverhang+jpadTaper-jpadw+jpadr + (math.cos(rot)>math.sin(rot) and -ucdist*math.cos(rot) or -ucdist*math.sin(rot)),jpadh/2+ucdist*max(math.sin(rot),-math.cos(rot))),
                                              (jpadw+separation/2-jpadOverhang+jpadTaper-jpadw -ucdist*max(math.sin(rot),math.cos(rot)),jpadh/2-jpadr + ucdist*math.sin(rot0)),
-                                             clockwise=False))
+                                             clockwise=False,tolerance=chip.wafer.arcTolerance))
                 if right_top:
                     # j finger stems from top of right lead
                     if not right_switch:
@@ -1273,9 +1274,9 @@ def DolanJunction(
     # assert chip.wafer.JANGLES[0] % 180 == struct().direction % 180, 'Need Dolan junction to be in same direction as JANGLE'
     try:
         for w in jfingerw:
-            if lincolnLabs and not (0.1 < w < 3): print(f'WARNING: fingerw {w} out of range. Recommended 0.150 < jfingerw < 3')
+            if lincolnLabs and not (0.1 <= w < 3): print(f'WARNING: fingerw {w} out of range. Recommended 0.150 < jfingerw < 3')
     except:
-        if lincolnLabs and not (0.1 < jfingerw < 3): print(f'WARNING: fingerw {w} out of range. Recommended 0.150 < jfingerw < 3')
+        if lincolnLabs and not (0.1 <= jfingerw < 3): print(f'WARNING: fingerw {w} out of range. Recommended 0.150 < jfingerw < 3')
         
 
     if not(sidelink):
@@ -1397,18 +1398,4 @@ def DolanJunction(
             struct().translatePos(vector=(jpadl/2,jarmw/2), angle=-90)
             Strip_pad(chip, struct(), jpadw, w=jpadl, r_out=jpadr,layer=JLAYER)
 
-
-
-            
-
-
-
-
-
-
-
-
-
-
-
-
+instrument(globals())
@@ -5,6 +5,10 @@ Created on Thu Jun 17 14:38:27 2021
 
 @author: sasha
 """
+import hashlib
+import math
+
+import numpy as np
 from dxfwrite import DXFEngine as dxf
 from dxfwrite import const
 from dxfwrite.vector2d import vadd
@@ -12,6 +16,7 @@ from dxfwrite.vector2d import vadd
 import maskLib.MaskLib as m
 from maskLib.utilities import kwargStrip
 from maskLib.Entities import SolidPline
+from maskLib.profileLib import instrument
 
 # ===============================================================================
 #  MARKER FUNCTIONS
@@ -105,9 +110,25 @@ alphanum_dict = {
 '.': [[(4,0),(8,0),(8,4),(4,4)]]
 }
 
-def AlphaNumStr(chip, structure, string, size, centered=False, bgcolor=None, **kwargs):
+def glyphBlock(canvas, letter, size, **kwargs):
+    """
+    Defines the block for one character of size (x, y) on canvas (chip or wafer) once, returns the block name.
+    """
+    name = 'GLYPH_' + (letter.isalnum() and letter or '%02X' % ord(letter)) + ('_%gx%g' % size).replace('.','p')
+    if kwargs:
+        name += '_' + hashlib.sha1(repr(sorted(kwargs.items())).encode()).hexdigest()[:8]
+    if not canvas.hasBlock(name):
+        block = dxf.block(name)
+        scaled_size = (size[0] / 16., size[1] / 16.)
+        for pts in alphanum_dict[letter]:
+            block.add(SolidPline(insert=(0,0), points=[(p[0]*scaled_size[0], p[1]*scaled_size[1]) for p in pts], **kwargs))
+        canvas.addBlock(block)
+    return name
+
+def AlphaNumStr(chip, structure, string, size, centered=False, bgcolor=None, instance=True, **kwargs):
     """
     Draws block letters with size (x, y).
+    instance: place each character as an insert of a glyph block instead of drawing its strokes
     """
     def struct():
         if isinstance(structure,m.Structure):
@@ -124,8 +145,32 @@ def AlphaNumStr(chip, structure, string, size, centered=False, bgcolor=None, **k
     for letter in string:
         letter = letter.lower()
         assert letter in alphanum_dict.keys()
-        scaled_size = (size[0] / 16., size[1] / 16.)
-        for pts in alphanum_dict[letter]:
-            scaled_pts = [(p[0]*scaled_size[0], p[1]*scaled_size[1]) for p in pts]
-            chip.add(SolidPline(insert=struct().getPos(), rotation=struct().direction, points=scaled_pts, **kwargs))
-        struct().shiftPos(size[0])
\ No newline at end of file
+        if instance:
+            chip.add(dxf.insert(glyphBlock(chip, letter, size, **kwargs), insert=struct().getPos(), rotation=struct().direction))
+        else:
+            scaled_size = (size[0] / 16., size[1] / 16.)
+            for pts in alphanum_dict[letter]:
+                scaled_pts = [(p[0]*scaled_size[0], p[1]*scaled_size[1]) for p in pts]
+                chip.add(SolidPline(insert=struct().getPos(), rotation=struct().direction, points=scaled_pts, **kwargs))
+        struct().shiftPos(size[0])
+
+def AlphaNumLabels(canvas, positions, strings, size, rotation=0, centered=False, **kwargs):
+    """
+    Labels many positions at once (e.g. chip IDs at wafer.chipPts): strings[i] is drawn at positions[i]
+    with glyph block inserts. canvas is a chip or wafer, rotation in degrees.
+    """
+    strings = [str(string).lower() for string in strings]
+    lengths = np.array([len(string) for string in strings],dtype=np.int64)
+    chars = ''.join(strings)
+    assert all(letter in alphanum_dict for letter in chars)
+    #position of every character: string start + k*size[0] along the baseline
+    idx = np.repeat(np.arange(len(strings)),lengths)
+    k = np.arange(len(chars)) - np.repeat(np.cumsum(lengths)-lengths,lengths)
+    offset = (k - (centered and 0.5 or 0)*lengths[idx])*size[0]
+    angle = math.radians(rotation)
+    pts = np.asarray(positions,dtype=np.float64).reshape(-1,2)[idx] + offset[:,None]*(math.cos(angle),math.sin(angle))
+    names = {letter:glyphBlock(canvas, letter, size, **kwargs) for letter in dict.fromkeys(chars)}
+    for letter,pt in zip(chars,pts.tolist()):
+        canvas.add(dxf.insert(names[letter], insert=tuple(pt), rotation=rotation))
+
+instrument(globals())
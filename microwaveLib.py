@@ -18,11 +18,11 @@ from dxfwrite.vector2d import vadd, midpoint ,vsub, vector2angle, magnitude, dis
 from dxfwrite.algebra import rotate_2d
 
 from maskLib.Entities import SolidPline, SkewRect, CurveRect, RoundRect, InsideCurve, DogBone
-from maskLib.utilities import kwargStrip, curveAB
+from maskLib.utilities import kwargStrip, curveAB, arcSegments
+from maskLib.geometryLib import GeometryStore, rasterize, dilate, rectangleCover
+from maskLib.profileLib import instrument
 
-from copy import deepcopy
-from matplotlib.path import Path
-from matplotlib.transforms import Bbox
+import hashlib
 import math
 from copy import copy
 import numpy as np 
@@ -33,7 +33,11 @@ import numpy as np
 #TODO move to MaskLib
 
 
-def waffle(chip, grid_x, grid_y=None,width=10,height=None,exclude=None,padx=0,pady=None,bleedRadius=1,layer='0'):
+def waffle(chip, grid_x, grid_y=None,width=10,height=None,exclude=None,padx=0,pady=None,bleedRadius=1,layer='0',holeBlock=False):
+    '''
+    holeBlock: define the hole once as a block and cover the free cells with arrayed inserts (MINSERT / GDS AREF)
+               instead of adding one rectangle per hole
+    '''
     radius = max(int(bleedRadius),0)
     
     if exclude is None:
@@ -51,58 +55,56 @@ def waffle(chip, grid_x, grid_y=None,width=10,height=None,exclude=None,padx=0,pa
         pady=padx
         
     nx, ny = list(map(int, [(chip.width) / grid_x, (chip.height) / grid_y]))
-    occupied = [[False]*ny for i in range(nx)]
-    for i in range(nx):
-        occupied[i][0] = True
-        occupied[i][-1] = True
-    for i in range(ny):
-        occupied[0][i] = True
-        occupied[-1][i] = True
+    occupied = np.zeros((nx,ny),dtype=bool)
+    occupied[:,[0,-1]] = True
+    occupied[[0,-1],:] = True
+    
+    #outlined polygons in the chip's geometry store, closed polylines left in the chip block and blocks placed by reference (instanced airbridges etc.), in grid units
+    entities = chip.chipBlock.get_data()
+    for store in [chip.geometry,GeometryStore().addPolylines(entities).addReferences(entities,chip.subBlocks)]:
+        polys = store.select(exclude,outline=True)
+        if not len(polys):
+            continue
+        x1,y1,x2,y2,poly = store.edges(polys)
+        x1,x2,y1,y2 = x1/grid_x,x2/grid_x,y1/grid_y,y2/grid_y
+        #each polygon only marks cells within one cell of the bounding box of its vertices that lie on the chip
+        ox,oy = np.trunc(x1).astype(np.int64),np.trunc(y1).astype(np.int64)
+        onchip = (ox >= 0) & (ox < nx) & (oy >= 0) & (oy < ny)
+        big = nx+ny+2
+        windows = np.full((len(polys),4),[big,-big,big,-big])
+        np.minimum.at(windows[:,0],poly[onchip],ox[onchip]-1)
+        np.maximum.at(windows[:,1],poly[onchip],ox[onchip]+1)
+        np.minimum.at(windows[:,2],poly[onchip],oy[onchip]-1)
+        np.maximum.at(windows[:,3],poly[onchip],oy[onchip]+1)
+        occupied |= rasterize(x1,y1,x2,y2,poly,nx,ny,windows,firstVertex=True)
     
-    for e in chip.chipBlock.get_data():
-        if isinstance(e.__dxftags__()[0], Polyline):
-            if e.layer not in exclude:
-                o_x_list = []
-                o_y_list = []
-                plinePts = [v.__getitem__('location').__getitem__('xy') for v in e.__dxftags__()[0].get_data()]
-                plinePts.append(plinePts[0])
-                for p in plinePts:
-                    o_x, o_y = list(map(int, (p[0] / grid_x, p[1] / grid_y)))
-                    if 0 <= o_x < nx and 0 <= o_y < ny:
-                        o_x_list.append(o_x)
-                        o_y_list.append(o_y)
-                        
-                        #this will however ignore a rectangle with corners outside the chip...
-                if o_x_list:
-                    path = Path([[pt[0]/grid_x,pt[1]/grid_y] for pt in plinePts],closed=True)
-                    for x in range(min(o_x_list)-1, max(o_x_list)+2):
-                        for y in range(min(o_y_list)-1, max(o_y_list)+2):
-                            try:
-                                if path.contains_point([x+.5,y+.5]):
-                                    occupied[x][y]=True
-                                elif path.intersects_bbox(Bbox.from_bounds(x,y,1.,1.),filled=True):
-                                    occupied[x][y]=True
-                            except IndexError:
-                                pass
-       
-
-    second_pass = deepcopy(occupied)
-    for r in range(radius):
-        for i in range(nx):
-            for j in range(ny):
-                if occupied[i][j]:
-                    for ip, jp in [(i+1,j), (i-1,j), (i,j+1), (i,j-1)]:
-                        try:
-                            second_pass[ip][jp] = True
-                        except IndexError:
-                            pass
-        occupied = deepcopy(second_pass)
-   
-    for i in range(int(padx/grid_x),nx-int(padx/grid_x)):
-        for j in range(int(pady/grid_y),ny-int(pady/grid_y)):
-            if not second_pass[i][j]:
-                pos = i*grid_x + grid_x/2., j*grid_y + grid_y/2.
-                chip.add(dxf.rectangle(pos,width,height,bgcolor=chip.wafer.bg(layer),halign=const.CENTER,valign=const.MIDDLE,layer=layer) )   
+    occupied = dilate(occupied,radius)
+    
+    #holes at the centers of free cells, column by column
+    px,py = int(padx/grid_x),int(pady/grid_y)
+    free = np.zeros_like(occupied)
+    free[px:nx-px,py:ny-py] = ~occupied[px:nx-px,py:ny-py]
+    if holeBlock:
+        name = ('WAFFLE_'+layer+'_%gx%g' % (width,height)).replace('.','p')
+        block = dxf.block(name)
+        block.add(dxf.rectangle((0,0),width,height,bgcolor=chip.wafer.bg(layer),halign=const.CENTER,valign=const.MIDDLE,layer=layer))
+        chip.addBlock(block)
+        for i,j,ni,nj in zip(*[v.tolist() for v in rectangleCover(free)]):
+            pos = i*grid_x + grid_x/2., j*grid_y + grid_y/2.
+            if ni == 1 and nj == 1:
+                chip.add(dxf.insert(name,insert=pos,layer=layer))
+            else:
+                chip.add(dxf.insert(name,insert=pos,columns=ni,rows=nj,colspacing=grid_x,rowspacing=grid_y,layer=layer))
+        return chip
+    
+    i,j = np.nonzero(free)
+    centers = np.column_stack((i*grid_x + grid_x/2.,j*grid_y + grid_y/2.))
+    hole = dxf.rectangle((0,0),width,height,halign=const.CENTER,valign=const.MIDDLE)
+    hole._calc_corners()
+    store = chip.geometry
+    start = len(store)
+    store.addMany(centers[:,None,:] + np.array(hole.points),layer=layer,bgcolor=chip.wafer.bg(layer),flags=const.POLYLINE_3D_POLYLINE | const.POLYLINE_CLOSED)
+    store.extendRun(chip.chipBlock,start)
                 
     return chip
 
@@ -1322,6 +1324,210 @@ def CPW_tee_stub(chip,structure,stub_length,stub_w,tee_r=0,outer_width=None,w=No
         struct().updatePos(s_start.getPos(),angle=180)
         #struct.direction = s_start.direction + 180
     
+# ===============================================================================
+# CPW paths
+#       a whole route (straights, tapers, bends, wiggles) drawn as one outline per gap
+# ===============================================================================
+
+class CPWPath:
+    ''' Declarative CPW route. Segments are collected first and drawn in one pass by draw(), which computes the
+        centerline and both gap outlines with numpy and adds a single polygon per gap (instead of two entities per segment)
+        
+        path = CPWPath([('straight',200),('bend',90),('taper',50,{'w1':4,'s1':2}),('wiggles',{'length':2000,'maxWidth':150})])
+        path.straight(100).bend(90,CCW=False)
+        length = path.draw(chip,structure)
+        
+        w, s, radius default to the structure defaults when drawn. Straights and tapers carry their widths forward:
+        a straight without w / s keeps the widths the path has at that point (after a taper: w1, s1)
+        Bends follow CPW_bend conventions (CCW=True turns towards -y, same points per arc as CPW_bend)
+    '''
+    
+    def __init__(self,segments=None,w=None,s=None,radius=None,ptDensity=120):
+        self.w = w
+        self.s = s
+        self.radius = radius
+        self.ptDensity = ptDensity
+        self.segments = [] #(kind, kwargs)
+        self.length = None #exact centerline length of the last draw()
+        for segment in segments or []:
+            args = list(segment[1:])
+            kwargs = args and isinstance(args[-1],dict) and args.pop() or {}
+            getattr(self,segment[0])(*args,**kwargs)
+    
+    def straight(self,length,w=None,s=None):
+        self.segments.append(('straight',{'length':length,'w':w,'s':s}))
+        return self
+    
+    def taper(self,length=None,w1=None,s1=None):
+        self.segments.append(('taper',{'length':length,'w1':w1,'s1':s1}))
+        return self
+    
+    def bend(self,angle=90,CCW=True,radius=None):
+        self.segments.append(('bend',{'angle':angle,'CCW':CCW,'radius':radius}))
+        return self
+    
+    def wiggles(self,length=None,nTurns=None,maxWidth=None,CCW=True,start_bend=True,stop_bend=True,radius=None):
+        self.segments.append(('wiggles',{'length':length,'nTurns':nTurns,'maxWidth':maxWidth,'CCW':CCW,'start_bend':start_bend,'stop_bend':stop_bend,'radius':radius}))
+        return self
+    
+    def _expandWiggles(self,chip,structure,w,s,radius,length=None,nTurns=None,maxWidth=None,CCW=True,start_bend=True,stop_bend=True):
+        #same segment sequence as CPW_wiggles
+        params = wiggle_calc(chip,structure,length,nTurns,maxWidth,None,start_bend,stop_bend,w,s,radius)
+        nTurns,h,length = params['nTurns'],params['h'],params['length']
+        if (length is None) or (h is None) or (nTurns is None):
+            return None
+        out = []
+        def bend(angle,ccw):
+            out.append(('bend',{'angle':angle,'CCW':ccw,'radius':radius}))
+        def straight(l):
+            out.append(('straight',{'length':l}))
+        if start_bend:
+            bend(90,CCW)
+            if h > radius:
+                straight(h-radius)
+        else:
+            straight(h)
+        bend(180,not CCW)
+        straight(h+radius)
+        if h > radius:
+            straight(h-radius)
+        bend(180,CCW)
+        if h > radius:
+            straight(h-radius)
+        for n in range(nTurns-1):
+            straight(h+radius)
+            bend(180,not CCW)
+            straight(h+radius)
+            if h > radius:
+                straight(h-radius)
+            bend(180,CCW)
+            if h > radius:
+                straight(h-radius)
+        if stop_bend:
+            bend(90,not CCW)
+        else:
+            straight(radius)
+        return out
+    
+    def centerline(self,chip,structure):
+        ''' local centerline samples (x, y, heading in radians, w, s) as arrays plus the end pose (x, y, turn in degrees)
+            and the exact length, or None if a parameter is missing
+        '''
+        def struct():
+            if isinstance(structure,m.Structure):
+                return structure
+            elif isinstance(structure,tuple):
+                return m.Structure(chip,structure)
+            else:
+                return chip.structure(structure)
+        defaults = struct().defaults
+        w,s,radius = self.w,self.s,self.radius
+        if w is None:
+            w = defaults.get('w')
+        if s is None:
+            s = defaults.get('s')
+        if radius is None:
+            radius = defaults.get('radius')
+        if w is None or s is None:
+            print('\x1b[33mw or s not defined in ',chip.chipID,'!\x1b[0m')
+            return None
+        
+        x,y,d = 0.,0.,0 #pose, heading in degrees
+        samples = [([0.],[0.],[0.],[w],[s])]
+        length = 0.
+        todo = list(self.segments)
+        while todo:
+            kind,args = todo.pop(0)
+            a = math.radians(d)
+            if kind == 'straight':
+                w1,s1 = args.get('w'),args.get('s')
+                if (w1 is not None and w1 != w) or (s1 is not None and s1 != s):
+                    #width step: second outline point at the same place
+                    w = w1 if w1 is not None else w
+                    s = s1 if s1 is not None else s
+                    samples.append(([x],[y],[a],[w],[s]))
+                if args['length']:
+                    x,y = x + args['length']*math.cos(a),y + args['length']*math.sin(a)
+                    samples.append(([x],[y],[a],[w],[s]))
+                    length += args['length']
+            elif kind == 'taper':
+                w1 = args['w1'] if args['w1'] is not None else w
+                s1 = args['s1'] if args['s1'] is not None else s
+                l = args['length']
+                if l is None:
+                    #same default as CPW_taper: outer angle 30 degrees
+                    l = math.sqrt(3)*abs(w/2+s-w1/2-s1)
+                w,s = w1,s1
+                x,y = x + l*math.cos(a),y + l*math.sin(a)
+                samples.append(([x],[y],[a],[w],[s]))
+                length += l
+            elif kind == 'bend':
+                r = args['radius'] if args['radius'] is not None else radius
+                if r is None:
+                    print('\x1b[33mradius not defined in ',chip.chipID,'!\x1b[0m')
+                    return None
+                if r < w/2+s:
+                    print('\x1b[33mError:\x1b[0m CPWPath bend radius '+str(r)+' is smaller than w/2+s in '+str(chip.chipID))
+                    return None
+                angle = args['angle']
+                while angle < 0:
+                    angle = angle + 360
+                angle = angle%360
+                if angle == 0:
+                    continue
+                sign = args['CCW'] and -1 or 1
+                segments = arcSegments(r+w/2+s,angle,chip.wafer.arcTolerance) or max(int(self.ptDensity*angle/360),1)
+                #arc points at the segment midpoints plus the end (as CurveRect), measured from the start heading
+                t = np.append((np.arange(segments)+0.5)*math.radians(angle)/segments,math.radians(angle))
+                cx,cy = x - sign*r*math.sin(a),y + sign*r*math.cos(a)
+                psi = a + sign*t
+                samples.append((cx + sign*r*np.sin(psi),cy - sign*r*np.cos(psi),psi,np.full(len(t),w),np.full(len(t),s)))
+                x,y,d = cx + sign*r*math.sin(psi[-1]),cy - sign*r*math.cos(psi[-1]),d + sign*angle
+                length += r*math.radians(angle)
+            elif kind == 'wiggles':
+                kwargs = dict(args)
+                r = kwargs.pop('radius')
+                if r is None:
+                    r = radius
+                expanded = r is not None and self._expandWiggles(chip,structure,w,s,r,**kwargs)
+                if not expanded:
+                    print('\x1b[33mError:\x1b[0m not enough params specified for CPWPath wiggles in '+str(chip.chipID))
+                    return None
+                todo[0:0] = expanded
+            else:
+                print('\x1b[33mError:\x1b[0m unknown CPWPath segment '+str(kind))
+                return None
+        cols = [np.concatenate([np.asarray(smp[i],dtype=np.float64) for smp in samples]) for i in range(5)]
+        return cols,(x,y,d),length
+    
+    def draw(self,chip,structure,bgcolor=None,**kwargs):
+        ''' add both gaps to the chip (one polygon each) and move structure to the end of the path, returns the exact length '''
+        def struct():
+            if isinstance(structure,m.Structure):
+                return structure
+            elif isinstance(structure,tuple):
+                return m.Structure(chip,structure)
+            else:
+                return chip.structure(structure)
+        if bgcolor is None:
+            bgcolor = chip.wafer.bg()
+        line = self.centerline(chip,structure)
+        if line is None:
+            return None
+        (x,y,psi,w,s),(x1,y1,turn),self.length = line
+        nx,ny = -np.sin(psi),np.cos(psi)
+        for side in (1,-1):
+            #inner edge forward, outer edge back: FILL_QUADS pairs the two halves
+            inner = np.column_stack((x + side*(w/2)*nx,y + side*(w/2)*ny))
+            outer = np.column_stack((x + side*(w/2+s)*nx,y + side*(w/2+s)*ny))[::-1]
+            pts = struct().getPosMany(np.vstack((inner,outer)))
+            gap = SolidPline((0,0),points=pts,bgcolor=bgcolor,solidFillQuads=True,**kwargs)
+            if side == 1:
+                chip.add(gap)
+            else:
+                chip.add(gap,structure=structure,absolutePos=struct().getPos((x1,y1)),angle=turn)
+        return self.length
+
 # ===============================================================================
 # Airbridges (Lincoln Labs designs)
 # ===============================================================================
@@ -1334,10 +1540,11 @@ def setupAirbridgeLayers(wafer:m.Wafer,BRLAYER='BRIDGE',RRLAYER='TETHER',brcolor
 
 def Airbridge(
     chip, structure, cpw_w=None, cpw_s=None, xvr_width=None, xvr_length=None, rr_width=None, rr_length=None,
-    rr_br_gap=None, rr_cpw_gap=None, shape_overlap=0, br_radius=0, clockwise=False, lincolnLabs=False, BRLAYER=None, RRLAYER=None, **kwargs):
+    rr_br_gap=None, rr_cpw_gap=None, shape_overlap=0, br_radius=0, clockwise=False, lincolnLabs=False, BRLAYER=None, RRLAYER=None, instance=True, **kwargs):
     """
     Define either cpw_w and cpw_s (refers to the cpw that the airbridge goes across) or xvr_length.
     xvr_length overrides cpw_w and cpw_s.
+    instance: draw the bridge once per parameter set as a block and place it with an insert
     """
     assert lincolnLabs, 'Not implemented for normal usage'
     def struct():
@@ -1405,25 +1612,38 @@ def Airbridge(
         delta_right = 0
         delta_left = delta
 
-    chip.add(DogBone(struct().start,
-                     xvr_width,
-                     xvr_length,
-                     rr_width,
-                     rr_length,
-                     rr_br_gap,
-                     delta_left,
-                     delta_right,
-                     rotation=struct().direction, layer=BRLAYER, **kwargs),
-             structure=struct().clone())
-
-    s_left = struct().cloneAlong(vector=(0, xvr_length/2+delta_left+rr_br_gap))
-    s_left.direction += 90
-    Strip_straight(chip, s_left, length=rr_length, w=rr_width, layer=RRLAYER, **kwargs)
-
-    s_right = struct().cloneAlong(vector=(0, -(xvr_length/2+delta_left+rr_br_gap)))
-    s_right.direction -= 90
-    Strip_straight(chip, s_right, length=rr_length, w=rr_width, layer=RRLAYER, **kwargs)
+    def draw(chip,structure):
+        chip.add(DogBone(structure.start,
+                         xvr_width,
+                         xvr_length,
+                         rr_width,
+                         rr_length,
+                         rr_br_gap,
+                         delta_left,
+                         delta_right,
+                         rotation=structure.direction, layer=BRLAYER, **kwargs),
+                 structure=structure.clone())
+        
+        s_left = structure.cloneAlong(vector=(0, xvr_length/2+delta_left+rr_br_gap))
+        s_left.direction += 90
+        Strip_straight(chip, s_left, length=rr_length, w=rr_width, layer=RRLAYER, **kwargs)
+        
+        s_right = structure.cloneAlong(vector=(0, -(xvr_length/2+delta_left+rr_br_gap)))
+        s_right.direction -= 90
+        Strip_straight(chip, s_right, length=rr_length, w=rr_width, layer=RRLAYER, **kwargs)
+    
+    if instance:
+        #one block per unique bridge (name is a hash of everything that goes into the geometry)
+        key = repr((xvr_width,xvr_length,rr_width,rr_length,rr_br_gap,delta_left,delta_right,BRLAYER,RRLAYER,chip.wafer.bg(),sorted(kwargs.items())))
+        name = chip.defineBlock('AIRBRIDGE_'+hashlib.sha1(key.encode()).hexdigest()[:10],lambda c: draw(c,m.Structure(c,defaults=struct().defaults)))
+        chip.add(dxf.insert(name,insert=struct().start,rotation=struct().direction))
+    else:
+        draw(chip,struct())
 
+    s_left = struct().cloneAlong(vector=(0, xvr_length/2+delta_left+rr_br_gap),newDirection=90)
+    s_right = struct().cloneAlong(vector=(0, -(xvr_length/2+delta_left+rr_br_gap)),newDirection=-90)
+    s_left.shiftPos(rr_length)
+    s_right.shiftPos(rr_length)
     s_l = s_left.cloneAlong(vector=(rr_br_gap,0))
     s_r = s_right.cloneAlong(vector=(rr_br_gap,0))
 
@@ -1800,3 +2020,4 @@ def Capa_linker_tee(chip, pos, length, width, dist_ground_height,
             Airbridge(chip, this_struct, **kwargs)
             this_struct.shiftPos(bond_pitch)
 
+instrument(globals())
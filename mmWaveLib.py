@@ -13,6 +13,7 @@ from dxfwrite import const
 
 from maskLib.Entities import SolidPline, RoundRect, SkewRect
 from maskLib.utilities import kwargStrip
+from maskLib.profileLib import instrument
 
        
 # ===============================================================================
@@ -446,7 +447,5 @@ class BilayerResistancePad(m.BlankCenteredWR10):
         self.add(dxf.rectangle((-pad_extend+offset[0],0),pad_extend+self.width/2-l/2,self.height,layer=layer,bgcolor=wafer.bg(layer)))
         self.add(dxf.rectangle((self.width/2 + l/2+offset[0],0),pad_extend+self.width/2-l/2,self.height,layer=layer,bgcolor=wafer.bg(layer)))
         self.add(dxf.rectangle(self.centered((-l/2,-w/2)),l,w,layer=layer,bgcolor=wafer.bg(layer)))
-        
-        
-        
-        
\ No newline at end of file
+
+instrument(globals())
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:20:05 2026
+
+@author: sasha
+
+Opt-in profiling of mask builds. Component functions are wrapped when their module is imported (instrument),
+the wrappers only record while a Profiler is active (from Wafer(...,profile=True) until that wafer is saved).
+Each call records wall time plus the polygons / vertices / dxf entities it added to its chip, calls are
+grouped in one track per chip and can be exported as speedscope or chrome trace (chrome://tracing, perfetto) json.
+"""
+import functools
+import inspect
+import json
+import time
+
+from maskLib.geometryLib import GeometryRun
+
+_profiler = None #active Profiler (None: wrappers call straight through)
+
+def startProfiler(profiler):
+    global _profiler
+    _profiler = profiler
+
+def stopProfiler():
+    global _profiler
+    _profiler = None
+
+def activeProfiler():
+    return _profiler
+
+def profiled(func):
+    ''' wrap func so that calls are recorded by the active profiler '''
+    name = func.__module__.split('.')[-1]+'.'+func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args,**kwargs):
+        profiler = _profiler
+        if profiler is None:
+            return func(*args,**kwargs)
+        profiler.enter(name,args)
+        try:
+            return func(*args,**kwargs)
+        finally:
+            profiler.exit()
+    return wrapper
+
+def instrument(namespace):
+    ''' wrap the public functions defined in a module, called as instrument(globals()) at the end of the module '''
+    module = namespace['__name__']
+    for name,obj in list(namespace.items()):
+        if inspect.isfunction(obj) and obj.__module__ == module and not name.startswith('_') and not hasattr(obj,'__wrapped__'):
+            namespace[name] = profiled(obj)
+
+def _chipOf(args):
+    #the first argument of components is usually the chip (or the wafer / a block for markers)
+    if args:
+        a = args[0]
+        if hasattr(a,'chipBlock') and hasattr(a,'geometry'):
+            return a
+    return None
+
+class Profiler:
+    ''' Call recorder. Tracks are named after the chip of the outermost call (WAFER for everything else),
+        nested calls stay on the track of their outermost caller
+    '''
+
+    def __init__(self,name='mask'):
+        self.name = name
+        self.frames = [] #frame names
+        self.frameIds = {}
+        self.tracks = []
+        self.trackIds = {}
+        self.events = [] #(open?, frame, track, time) in call order
+        self.calls = [] #finished calls: (frame, track, depth, start, end, polygons, vertices, entities, self time)
+        self.stack = [] #open calls: [frame, track, start, chip counts, child time]
+        self.t0 = time.perf_counter()
+
+    def _id(self,name,names,ids):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    def _counts(self,chip):
+        if chip is None:
+            return None
+        return chip.geometry,chip.geometry.n,chip.geometry.nverts(),chip.chipBlock,len(chip.chipBlock.get_data())
+
+    def enter(self,name,args):
+        chip = _chipOf(args)
+        frame = self._id(name,self.frames,self.frameIds)
+        if self.stack:
+            track = self.stack[-1][1]
+        else:
+            track = self._id(chip is not None and chip.ID or 'WAFER',self.tracks,self.trackIds)
+        t = time.perf_counter()
+        self.stack.append([frame,track,t,(chip,self._counts(chip)),0.])
+        self.events.append((True,frame,track,t))
+
+    def exit(self):
+        #close the innermost open call (the wrappers close calls in order, even on exceptions)
+        t = time.perf_counter()
+        frame,track,start,(chip,before),child = self.stack.pop()
+        polygons = vertices = entities = 0
+        after = self._counts(chip)
+        if before is not None and after[0] is before[0]:
+            polygons,vertices = after[1]-before[1],after[2]-before[2]
+            entities = polygons
+            if after[3] is before[3]:
+                #new block entries that are not polygon runs (inserts, text ...)
+                entities += sum(not isinstance(obj,GeometryRun) for obj in chip.chipBlock.get_data()[before[4]:])
+        if self.stack:
+            self.stack[-1][4] += t-start
+        self.events.append((False,frame,track,t))
+        self.calls.append((frame,track,len(self.stack),start,t,polygons,vertices,entities,t-start-child))
+
+    # ------------------------------ output ------------------------------
+
+    def summary(self):
+        ''' per function: [calls, total s, self s, polygons, vertices, entities], totals of outermost calls only (no double counting of recursion) '''
+        out = {}
+        until = {} #end of the outermost running call of each function
+        for frame,track,depth,start,end,polygons,vertices,entities,own in sorted(self.calls,key=lambda c: c[3]):
+            row = out.setdefault(self.frames[frame],[0,0.,0.,0,0,0])
+            row[0] += 1
+            row[2] += own
+            if until.get(frame,-1) < start:
+                #not inside another call of the same function
+                row[1] += end-start
+                row[3] += polygons
+                row[4] += vertices
+                row[5] += entities
+                until[frame] = end
+        return out
+
+    def report(self,limit=20):
+        rows = sorted(self.summary().items(),key=lambda item: -item[1][2])
+        print('Profile '+self.name+': '+str(len(self.calls))+' calls on '+str(len(self.tracks))+' tracks')
+        print('    %-40s %8s %10s %10s %10s %10s %10s' % ('function','calls','total s','self s','polygons','vertices','entities'))
+        for name,(calls,total,own,polygons,vertices,entities) in rows[:limit]:
+            print('    %-40s %8d %10.3f %10.3f %10d %10d %10d' % (name,calls,total,own,polygons,vertices,entities))
+        if len(rows) > limit:
+            print('    ...')
+
+    def speedscope(self):
+        ''' speedscope json (https://www.speedscope.app): one evented profile per track, times in ms '''
+        profiles = []
+        for track,trackName in enumerate(self.tracks):
+            events = [{'type':opened and 'O' or 'C','frame':frame,'at':(t-self.t0)*1e3} for opened,frame,tr,t in self.events if tr == track]
+            if not events:
+                continue
+            profiles.append({'type':'evented','name':trackName,'unit':'milliseconds',
+                             'startValue':events[0]['at'],'endValue':events[-1]['at'],'events':events})
+        return {'$schema':'https://www.speedscope.app/file-format-schema.json','name':self.name,'exporter':'maskLib',
+                'shared':{'frames':[{'name':name} for name in self.frames]},'profiles':profiles}
+
+    def trace(self):
+        ''' chrome trace event json: complete events with the counts as args, one thread per track '''
+        events = [{'name':'thread_name','ph':'M','pid':0,'tid':track,'args':{'name':name}} for track,name in enumerate(self.tracks)]
+        for frame,track,depth,start,end,polygons,vertices,entities,own in self.calls:
+            events.append({'name':self.frames[frame],'ph':'X','pid':0,'tid':track,'ts':(start-self.t0)*1e6,'dur':(end-start)*1e6,
+                           'args':{'polygons':polygons,'vertices':vertices,'entities':entities}})
+        return {'traceEvents':events,'displayTimeUnit':'ms'}
+
+    def save(self,fileName,format=None):
+        ''' write speedscope json, or chrome trace json if format is 'trace' (default: from the file name, *.trace.json is a trace) '''
+        if format is None:
+            format = fileName.endswith('.trace.json') and 'trace' or 'speedscope'
+        with open(fileName,'w') as f:
+            json.dump(format == 'trace' and self.trace() or self.speedscope(),f)
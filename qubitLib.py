@@ -17,6 +17,7 @@ from maskLib.microwaveLib import CPW_stub_open, CPW_straight, Strip_straight, St
 from maskLib.junctionLib import DolanJunction, JContact_tab, ManhattanJunction, JcalcTabDims, JContact_slot, JContact_tab, JSingleProbePad, JProbePads
 
 from maskLib.utilities import kwargStrip
+from maskLib.profileLib import instrument
 
 
 
@@ -949,23 +950,4 @@ def Headsetmon(chip, pos, pad_width=100, pad_length=100, pad_distance=40, pad_ra
 
     return s
 
-
-
-
-
-
-
-
-
-    
-
-
-
-
-
-
-    
-
-
-            
-    
\ No newline at end of file
+instrument(globals())
@@ -23,6 +23,7 @@ from maskLib.microwaveLib import wiggle_calc,Inductor_wiggles
 
 from maskLib.Entities import SolidPline, SkewRect, CurveRect, RoundRect, InsideCurve
 from maskLib.utilities import kwargStrip
+from maskLib.profileLib import instrument
 
 
 # ===============================================================================
@@ -586,8 +587,6 @@ def HotdogResonator(chip,structure,res_width,l_ind,w_ind=3,w_cap=None,s_cap=None
     Strip_stub_short(chip,s_r,r_ins=r_taper,w=l_ind,flipped=True,**kwargs)
     Strip_stub_short(chip,s_l,r_ins=r_taper,w=l_ind,flipped=True,**kwargs)
     Strip_straight(chip,s_r,(w_taper-w_ind)/2.,w=l_ind,**kwargs)
-    Strip_straight(chip,s_l,(w_taper-w_ind)/2.,w=l_ind,**kwargs)    
-        
-    
-        
-        
\ No newline at end of file
+    Strip_straight(chip,s_l,(w_taper-w_ind)/2.,w=l_ind,**kwargs)
+
+instrument(globals())
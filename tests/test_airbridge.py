@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:13:02 2026
+
+@author: sasha
+
+Airbridge instancing (run with pytest, maskLib has to be importable)
+"""
+import numpy as np
+from dxfwrite.entities import Insert
+
+import maskLib.MaskLib as m
+import maskLib.microwaveLib as mw
+from maskLib.geometryLib import GeometryStore
+
+def bridgedChip(path,instance):
+    wafer = m.Wafer('bridges',str(path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.setupAirbridgeLayers()
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL',defaults={'w':10,'s':6,'radius':100})
+    s = m.Structure(chip,start=(500,500),direction=20)
+    tethers = []
+    for k in range(3):
+        tethers.append(mw.Airbridge(chip,s,lincolnLabs=True,instance=instance))
+        mw.CPW_straight(chip,s,300)
+        s.direction += 45
+    return chip,tethers
+
+def polygons(chip):
+    #every polygon on the chip, inserts expanded, as (layer, rounded vertices) in a fixed order
+    store = GeometryStore()
+    for i in range(chip.geometry.n):
+        store.add(chip.geometry.polygon(i),*chip.geometry.properties(i))
+    store.addReferences(chip.chipBlock.get_data(),chip.subBlocks)
+    return sorted((store.layer(i),np.round(store.polygon(i),6).tolist()) for i in range(store.n))
+
+def test_instancedMatchesFlat(tmp_path):
+    flat,flatTethers = bridgedChip(tmp_path,False)
+    inst,instTethers = bridgedChip(tmp_path,True)
+    #one block for the three identical bridges, placed three times
+    assert len(inst.subBlocks) == 1 and not flat.subBlocks
+    assert len([e for e in inst.chipBlock.get_data() if isinstance(e,Insert)]) == 3
+    assert polygons(inst) == polygons(flat)
+    for a,b in zip(flatTethers,instTethers):
+        assert [(s.start,s.direction) for s in a] == [(s.start,s.direction) for s in b]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:16:51 2026
+
+@author: sasha
+
+Benchmark harness helpers (run with pytest, maskLib has to be importable)
+"""
+from dxfwrite import DXFEngine as dxf
+
+from maskLib.benchmarkLib import compare, dxfCounts
+
+def test_dxfCounts(tmp_path):
+    drawing = dxf.drawing(str(tmp_path/'count.dxf'))
+    block = dxf.block('B')
+    block.add(dxf.polyline([(0,0),(1,0),(1,1)],flags=1))
+    drawing.blocks.add(block)
+    drawing.add(dxf.polyline([(0,0),(5,0),(5,5),(0,5)],flags=1))
+    drawing.add(dxf.rectangle((0,0),3,3,bgcolor=2))
+    drawing.add(dxf.insert('B',insert=(10,10)))
+    drawing.add(dxf.text('T',(0,0)))
+    drawing.add_layer('L')
+    drawing.save()
+    #entities: 3 polylines, 1 solid, insert, text and the VIEWPORT dxfwrite adds. vertices: 3 + 4 + 4
+    assert dxfCounts(str(tmp_path/'count.dxf')) == (7,11)
+
+def result(**metrics):
+    row = {'total':1.,'construction':0.5,'waffle':0.1,'save':0.4,'peakRSS':100,'entities':1000,'vertices':5000,'bytes':100000}
+    row.update(metrics)
+    return {'root':'x','results':{'A':row}}
+
+def test_compare():
+    assert compare(result(),result()) == []
+    #slower beyond threshold and noise floor
+    assert compare(result(),result(total=1.2)) == [('A','total',1.,1.2)]
+    #within the threshold, or below the noise floor
+    assert compare(result(),result(total=1.05)) == []
+    assert compare(result(waffle=0.01),result(waffle=0.02)) == []
+    #counts regress when they grow at all beyond the threshold
+    assert compare(result(),result(entities=1200,vertices=4000)) == [('A','entities',1000,1200)]
+    #an example that stopped running
+    old,new = result(),result()
+    new['results']['A'] = {'error':'boom'}
+    assert compare(old,new) == [('A','error',None,'boom')]
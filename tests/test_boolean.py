@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:04:27 2026
+
+@author: sasha
+
+Polygon booleans and layer flattening (run with pytest, maskLib has to be importable)
+"""
+import numpy as np
+from dxfwrite import DXFEngine as dxf
+
+import maskLib.MaskLib as m
+from maskLib.booleanLib import area, boolean, merge, trapezoids
+
+def rect(x,y,w,h):
+    return [(x,y),(x+w,y),(x+w,y+h),(x,y+h)]
+
+def test_booleanAreas():
+    a,b = [rect(0,0,10,10)],[rect(5,5,10,10)]
+    assert area(trapezoids(a,b,'or')) == 175
+    assert area(trapezoids(a,b,'and')) == 25
+    assert area(trapezoids(a,b,'xor')) == 150
+    assert area(trapezoids(a,b,'not')) == 75
+    assert boolean(a,b,'and').shape == (1,4,2)
+
+def test_flattenXOR(tmp_path):
+    #polygons on layer '0' and on the named chip layer both take part
+    wafer = m.Wafer('xor',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.setupXORlayer()
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL')
+    boxes = {'0':(0,0,100,100),'BASEMETAL':(50,0,100,100),'XOR':(120,20,60,20)}
+    for layer,(x,y,w,h) in boxes.items():
+        chip.add(dxf.rectangle((x,y),w,h,layer=layer))
+    polys = {layer:rect(*box) for layer,box in boxes.items()}
+    chip.flattenXOR()
+    store = chip.geometry
+    assert {store.layer(i) for i in range(store.n)} == {'0'}
+    expected = area(trapezoids([polys['0'],polys['BASEMETAL']],[polys['XOR']],'xor'))
+    assert np.isclose(area(trapezoids([store.polygon(i) for i in range(store.n)])),expected)
+
+def ringArea(pts):
+    pts = np.asarray(pts)
+    return abs(np.dot(pts[:,0],np.roll(pts[:,1],-1)) - np.dot(pts[:,1],np.roll(pts[:,0],-1)))/2
+
+def test_merge():
+    #abutting rectangles become one outline, a ring keeps its hole (joined by a slit)
+    out = merge([rect(0,0,10,10),rect(10,0,10,10),rect(5,10,5,5)])
+    assert len(out) == 1 and np.isclose(ringArea(out[0]),225)
+    frame = merge([rect(0,0,30,5),rect(0,25,30,5),rect(0,5,5,20),rect(25,5,5,20)])
+    assert len(frame) == 1 and np.isclose(ringArea(frame[0]),30*30-20*20)
+    assert len(merge([rect(0,0,1,1),rect(5,5,1,1)])) == 2
+
+def test_mergeLayers(tmp_path):
+    wafer = m.Wafer('merge',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4],['OTHER',3]])
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL')
+    for x in range(0,100,10):
+        chip.add(dxf.rectangle((x,0),10,20,layer='BASEMETAL'))
+    chip.add(dxf.rectangle((100,0),10,20,layer='OTHER'))
+    chip.mergeLayers()
+    store = chip.geometry
+    layers = [store.layer(i) for i in range(store.n)]
+    assert sorted(layers) == ['BASEMETAL','OTHER']
+    assert np.isclose(ringArea(store.polygon(layers.index('BASEMETAL'))),2000)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:12:15 2026
+
+@author: sasha
+
+Building chips in worker processes (run with pytest, maskLib has to be importable)
+"""
+import os
+
+import maskLib.MaskLib as m
+import maskLib.microwaveLib as mw
+from maskLib.exportLib import ChipCache
+
+class MeanderChip(m.Chip):
+    def __init__(self,wafer,chipID,layer,length=1000,turns=2):
+        m.Chip.__init__(self,wafer,chipID,layer,defaults={'w':10,'s':6,'radius':60})
+        s = m.Structure(self,start=(200,self.height/2))
+        for k in range(turns):
+            mw.CPW_straight(self,s,length)
+            mw.CPW_bend(self,s,180,CCW=k%2==0)
+        mw.CPW_straight(self,s,length)
+
+def newWafer(path):
+    os.makedirs(path,exist_ok=True)
+    wafer = m.Wafer('build',str(path)+'/',7000,7000)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    return wafer
+
+def test_buildChipsMatchesSerial(tmp_path):
+    lengths = [400,800,1200]
+    serial = newWafer(tmp_path/'serial')
+    for i in range(1,len(lengths)+1):
+        serial.setChipBuffer(MeanderChip(serial,'M'+str(i),'BASEMETAL',length=lengths[i-1]).save(serial),i)
+    serial.populate()
+    serial.save()
+    parallel = newWafer(tmp_path/'parallel')
+    chips = parallel.buildChips([(MeanderChip,('M'+str(i),'BASEMETAL'),{'length':lengths[i-1]}) for i in range(1,len(lengths)+1)],
+                                indices=range(1,len(lengths)+1),workers=2)
+    assert [chip.ID for chip in chips] == ['CHIP_M1','CHIP_M2','CHIP_M3']
+    assert all(chip.wafer is parallel for chip in chips)
+    parallel.populate()
+    parallel.save()
+    assert open(tmp_path/'parallel'/'build.dxf','rb').read() == open(tmp_path/'serial'/'build.dxf','rb').read()
+
+def test_chipCache(tmp_path):
+    cache = ChipCache(str(tmp_path/'cache'))
+    factories = [(MeanderChip,('M1','BASEMETAL'),{'length':500}),(MeanderChip,('M2','BASEMETAL'),{'length':700})]
+    first = newWafer(tmp_path/'first')
+    first.buildChips(factories,indices=[1,2],workers=1,cache=cache)
+    assert (cache.hits,cache.misses) == (0,2)
+    first.populate()
+    first.save()
+    #unchanged chips come from the cache and save the same
+    second = newWafer(tmp_path/'second')
+    second.buildChips(factories,indices=[1,2],workers=1,cache=cache)
+    assert (cache.hits,cache.misses) == (2,2)
+    second.populate()
+    second.save()
+    assert open(tmp_path/'second'/'build.dxf','rb').read() == open(tmp_path/'first'/'build.dxf','rb').read()
+    cache.clear()
+    assert cache.load(cache.key(factories[0],second)) is None
+
+def test_chipCacheKey(tmp_path):
+    cache = ChipCache(str(tmp_path))
+    wafer = newWafer(tmp_path)
+    key = cache.key((MeanderChip,('M1','BASEMETAL'),{'length':500}),wafer)
+    assert key == cache.key((MeanderChip,('M1','BASEMETAL'),{'length':500}),wafer)
+    #arguments, wafer settings and the layer table are part of the key
+    assert key != cache.key((MeanderChip,('M1','BASEMETAL'),{'length':501}),wafer)
+    wafer.arcTolerance = 0.01
+    assert key != cache.key((MeanderChip,('M1','BASEMETAL'),{'length':500}),wafer)
+    wafer.arcTolerance = None
+    wafer.addLayer('EXTRA',5)
+    assert key != cache.key((MeanderChip,('M1','BASEMETAL'),{'length':500}),wafer)
+    #so are the chip class and its bases
+    class Other(MeanderChip):
+        pass
+    assert key != cache.key((Other,('M1','BASEMETAL'),{'length':500}),wafer)
+    assert cache.key((MeanderChip,(lambda: 0,),{}),wafer) is None
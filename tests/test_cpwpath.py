@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:48:27 2026
+
+@author: sasha
+
+CPWPath length and end pose against the per-segment CPW functions (run with pytest, maskLib has to be importable)
+"""
+import math
+
+import pytest
+
+import maskLib.MaskLib as m
+from maskLib.microwaveLib import CPWPath, CPW_bend, CPW_straight, CPW_taper
+
+def newChip(tmp_path):
+    wafer = m.Wafer('path',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    return m.Chip(wafer,'A','BASEMETAL',defaults={'w':10,'s':6,'radius':100})
+
+ROUTES = [
+    [('straight',200)],
+    [('straight',200),('bend',90),('straight',50)],
+    [('bend',90,{'CCW':False}),('bend',45,{'radius':60}),('straight',120)],
+    [('straight',100),('taper',50,{'w1':4,'s1':2}),('straight',30),('bend',180)],
+    [('bend',-90),('straight',10),('bend',270,{'CCW':False})],
+]
+
+def expected(segments):
+    #exact centerline length: straights and tapers plus r*angle for bends
+    length = 0.
+    for segment in segments:
+        args = list(segment[1:])
+        kwargs = args and isinstance(args[-1],dict) and args.pop() or {}
+        if segment[0] == 'bend':
+            angle = (args and args[0] or kwargs.get('angle',90)) % 360
+            length += kwargs.get('radius',100)*math.radians(angle)
+        else:
+            length += args[0]
+    return length
+
+@pytest.mark.parametrize('segments',ROUTES)
+def test_length(tmp_path,segments):
+    chip = newChip(tmp_path)
+    s = m.Structure(chip,start=(500,500),direction=30)
+    path = CPWPath(segments)
+    length = path.draw(chip,s)
+    assert length == path.length and length == pytest.approx(expected(segments),abs=1e-9)
+
+@pytest.mark.parametrize('segments',ROUTES)
+def test_endPose(tmp_path,segments):
+    #the structure ends where the equivalent CPW_straight / CPW_taper / CPW_bend sequence leaves it
+    chip = newChip(tmp_path)
+    s = m.Structure(chip,start=(500,500),direction=30)
+    ref = m.Structure(chip,start=(500,500),direction=30)
+    CPWPath(segments).draw(chip,s)
+    w,sw = 10,6
+    for segment in segments:
+        args = list(segment[1:])
+        kwargs = args and isinstance(args[-1],dict) and args.pop() or {}
+        if segment[0] == 'straight':
+            CPW_straight(chip,ref,args[0],w=w,s=sw)
+        elif segment[0] == 'taper':
+            CPW_taper(chip,ref,args[0],w0=w,s0=sw,w1=kwargs['w1'],s1=kwargs['s1'])
+            w,sw = kwargs['w1'],kwargs['s1']
+        else:
+            CPW_bend(chip,ref,*args,w=w,s=sw,**kwargs)
+    assert s.start == pytest.approx(ref.start,abs=1e-6)
+    assert (s.direction - ref.direction) % 360 == pytest.approx(0,abs=1e-9)
+
+def test_singlePolygonPerGap(tmp_path):
+    chip = newChip(tmp_path)
+    before = len(chip.geometry)
+    CPWPath(ROUTES[3]).draw(chip,m.Structure(chip,start=(500,500)))
+    assert len(chip.geometry) - before == 2
+
+def test_radiusTooSmall(tmp_path,capsys):
+    chip = newChip(tmp_path)
+    s = m.Structure(chip,start=(500,500))
+    assert CPWPath([('bend',90,{'radius':5})]).draw(chip,s) is None
+    assert 'Error:' in capsys.readouterr().out and s.start == (500,500)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:05:41 2026
+
+@author: sasha
+
+Design rule checks on small hand made layouts, one passing and one failing fixture per rule
+"""
+import pytest
+
+from maskLib.geometryLib import GeometryStore
+from maskLib.drcLib import CHECKS
+
+def rect(x,y,w,h):
+    return [(x,y),(x+w,y),(x+w,y+h),(x,y+h)]
+
+def store(*polys):
+    s = GeometryStore()
+    for layer,pts in polys:
+        s.add(pts,layer)
+    return s
+
+FIXTURES = [
+    #(check, layers, value, passing layout, failing layout)
+    ('width','M',3,[('M',rect(0,0,3,50))],[('M',rect(0,0,2,50))]),
+    ('width','JJ',0.1,[('JJ',rect(0,0,0.1,2))],[('JJ',rect(0,0,0.09,2))]),
+    ('space','M',3,[('M',rect(0,0,20,50)),('M',rect(23,0,20,50))],[('M',rect(0,0,20,50)),('M',rect(21,0,20,50))]),
+    ('enclosure',('RR','BR'),1.5,[('RR',rect(2,2,8,8)),('BR',rect(0,0,12,12))],[('RR',rect(1,1,8,8)),('BR',rect(0,0,12,12))]),
+    ('enclosure',('RR','BR'),1.5,[('RR',rect(2,2,8,8)),('BR',rect(0,0,12,12))],[('RR',rect(10,2,8,8)),('BR',rect(0,0,12,12))]),
+    ('overlap',('RR','M'),0,[('RR',rect(0,0,8,8)),('M',rect(8,0,8,8))],[('RR',rect(0,0,8,8)),('M',rect(6,0,8,8))]),
+]
+
+@pytest.mark.parametrize('check,layers,value,good,bad',FIXTURES)
+def test_rule(check,layers,value,good,bad):
+    assert len(CHECKS[check](store(*good),layers,value)[0]) == 0
+    assert len(CHECKS[check](store(*bad),layers,value)[0]) > 0
+
+def test_abuttingRectangles():
+    #primitives are unioned first, so the shared edge is not a width violation
+    s = store(('M',rect(0,0,2,50)),('M',rect(2,0,2,50)))
+    assert len(CHECKS['width'](s,'M',3)[0]) == 0
+
+def test_chipLayer():
+    #polygons on layer '0' belong to the chip layer
+    s = store(('0',rect(0,0,2,50)))
+    assert len(CHECKS['width'](s,'M',3,'M')[0]) > 0
+    assert len(CHECKS['width'](s,'M',3)[0]) == 0
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:02:11 2026
+
+@author: sasha
+
+Entity rendering checks (run with pytest, maskLib has to be importable)
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from dxfwrite import const
+
+from maskLib.Entities import CurveRect, InsideCurve, RoundRect, SolidPline
+
+def wafer(trueArcs):
+    return SimpleNamespace(arcTolerance=None,trueArcs=trueArcs)
+
+@pytest.mark.parametrize('trueArcs',[False,True])
+def test_insideCurveRenders(trueArcs):
+    #inside corners are always segmented, whatever the wafer's true arc mode
+    curve = InsideCurve((10,20),5,rotation=30,bgcolor=3)
+    curve.applyWafer(wafer(trueArcs))
+    dxf = curve.__dxf__()
+    assert 'POLYLINE' in dxf and 'SOLID' in dxf
+    assert '\n 42\n' not in dxf
+
+@pytest.mark.parametrize('trueArcs',[False,True])
+def test_curveRectFollowsWafer(trueArcs):
+    curve = CurveRect((0,0),6,50,roffset=5,angle=90,bgcolor=3)
+    curve.applyWafer(wafer(trueArcs))
+    dxf = curve.__dxf__()
+    assert ('\n 42\n' in dxf) == trueArcs
+
+def test_roundRectCorners():
+    #corner arcs stay inside the rectangle and hit its edges, centered alignment moves the whole outline
+    rect = RoundRect((0,0),40,20,5,roundCorners=[1,0,1,0],halign=const.CENTER,valign=const.MIDDLE,ptDensity=360)
+    pts = np.asarray(rect.points)
+    assert np.allclose(pts.min(axis=0),(-20,-10)) and np.allclose(pts.max(axis=0),(20,10))
+    #rounded corners: 90 degree arcs of radius 5 around (corner -/+ 5)
+    for corner,center in [((-20,-10),(-15,-5)),((20,10),(15,5))]:
+        near = pts[np.hypot(*(pts-corner).T) < 5+1e-9]
+        assert len(near) > 2 and np.allclose(np.hypot(*(near-center).T),5)
+    #square corners are kept as they are
+    assert (np.abs(pts-(20,-10)).sum(axis=1) < 1e-12).any()
+
+def test_tagsCached():
+    #tags are built once, and rebuilt when an attribute or the points change
+    pline = SolidPline((5,5),rotation=10,bgcolor=3,points=[(0,0),(10,0),(10,4),(0,4)])
+    tags = pline.__dxftags__()
+    assert pline.__dxftags__() is tags
+    pline.rotation = 0
+    assert pline.__dxftags__() is not tags
+    assert pline.__dxf__() == SolidPline((5,5),bgcolor=3,points=[(0,0),(10,0),(10,4),(0,4)]).__dxf__()
+    pline['layer'] = 'M'
+    assert '\n  8\nM\n' in pline.__dxf__()
+    before = pline.__dxf__()
+    pline.add_vertex((-2,2))
+    assert pline.__dxf__() != before and pline.__dxf__().count('VERTEX') == 5
+
+def test_curveRectTolerance():
+    #the segment count follows the wafer's arc tolerance, each entity keeps the one it was drawn with
+    fine,coarse = [CurveRect((0,0),6,50,angle=90,ptDensity=120) for i in range(2)]
+    fine.applyWafer(SimpleNamespace(arcTolerance=0.001,trueArcs=False))
+    coarse.applyWafer(SimpleNamespace(arcTolerance=0.5,trueArcs=False))
+    assert fine.__dxf__().count('VERTEX') > coarse.__dxf__().count('VERTEX')
+    default = CurveRect((0,0),6,50,angle=90,ptDensity=120)
+    default.applyWafer(wafer(False))
+    assert default.__dxf__() == CurveRect((0,0),6,50,angle=90,ptDensity=120).__dxf__()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:10:38 2026
+
+@author: sasha
+
+GDSII output (run with pytest, maskLib has to be importable)
+"""
+import struct
+
+import numpy as np
+from dxfwrite import DXFEngine as dxf
+
+from maskLib.exportLib import GDSWriter, gdsReal8, _splitPolygon
+from maskLib.exportLib import GDS_AREF, GDS_BOUNDARY, GDS_COLROW, GDS_ENDLIB, GDS_LAYER, GDS_SNAME, GDS_SREF, GDS_STRNAME, GDS_XY
+
+def records(fileName):
+    data = open(fileName,'rb').read()
+    out = []
+    i = 0
+    while i < len(data):
+        n,rtype = struct.unpack('>HH',data[i:i+4])
+        out.append((rtype,data[i+4:i+n]))
+        i += n
+    return out
+
+def strings(recs,rtype):
+    return [data.rstrip(b'\0').decode() for r,data in recs if r == rtype]
+
+def test_real8():
+    assert gdsReal8(0) == bytes(8)
+    assert gdsReal8(1) == bytes.fromhex('4110000000000000')
+    assert gdsReal8(-0.5) == bytes.fromhex('C080000000000000')
+    for value in (1e-3,1e-9,-123.456,2**-20):
+        bits = struct.unpack('>Q',gdsReal8(value))[0]
+        sign = bits >> 63 and -1 or 1
+        assert sign*(bits & (2**56-1))/2**56*16.**((bits >> 56 & 0x7F)-64) == value
+
+def test_blocksAndReferences(tmp_path):
+    #a block with layer '0' geometry inserted on two layers is written once per layer
+    cell = dxf.block('CELL')
+    cell.add(dxf.rectangle((0,0),10,5))
+    entities = [dxf.insert('CELL',insert=(100,200),layer='A'),
+                dxf.insert('CELL',insert=(0,0),columns=2,rows=3,colspacing=20,rowspacing=30,layer='B')]
+    fileName = str(tmp_path/'test.gds')
+    GDSWriter(fileName,{'A':1,'B':2}).save({'CELL':cell},entities,'TOP')
+    recs = records(fileName)
+    assert recs[-1][0] == GDS_ENDLIB
+    assert strings(recs,GDS_STRNAME) == ['CELL_A','CELL_B','TOP']
+    assert strings(recs,GDS_SNAME) == ['CELL_A','CELL_B']
+    assert [r for r,d in recs].count(GDS_BOUNDARY) == 2
+    assert [struct.unpack('>h',d)[0] for r,d in recs if r == GDS_LAYER] == [1,2]
+    #rectangle in database units (1nm), closed
+    xy = np.frombuffer([d for r,d in recs if r == GDS_XY][0],dtype='>i4').reshape(-1,2)
+    assert xy.tolist() == [[0,0],[10000,0],[10000,5000],[0,5000],[0,0]]
+    #one SREF and one AREF with the array corners
+    kinds = [r for r,d in recs if r in (GDS_SREF,GDS_AREF)]
+    assert kinds == [GDS_SREF,GDS_AREF]
+    assert struct.unpack('>hh',[d for r,d in recs if r == GDS_COLROW][0]) == (2,3)
+    corners = np.frombuffer([d for r,d in recs if r == GDS_XY][-1],dtype='>i4').reshape(-1,2)
+    assert corners.tolist() == [[0,0],[40000,0],[0,90000]]
+
+def test_splitPolygon():
+    #polygons with more points than an XY record holds are cut into pieces with the same area
+    t = np.linspace(0,2*np.pi,20000,endpoint=False)
+    pts = np.column_stack((np.cos(t),np.sin(t)))
+    pieces = _splitPolygon(pts,1000)
+    area = lambda p: abs(np.dot(p[:,0],np.roll(p[:,1],-1)) - np.dot(p[:,1],np.roll(p[:,0],-1)))/2
+    assert all(len(p) <= 1000 for p in pieces)
+    assert np.isclose(sum(area(p) for p in pieces),area(pts))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:15:20 2026
+
+@author: sasha
+
+Spatial index queries (run with pytest, maskLib has to be importable)
+"""
+import numpy as np
+from dxfwrite import DXFEngine as dxf
+
+import maskLib.MaskLib as m
+from maskLib.geometryLib import GeometryStore, SpatialIndex, polygonBoxes, polygonDistance
+
+def randomStore(rng,n):
+    #rectangles of all sizes (a few spanning many cells) on two layers
+    store = GeometryStore()
+    addRandom(store,rng,n)
+    return store
+
+def addRandom(store,rng,n):
+    for k in range(n):
+        x,y = rng.uniform(-2000,2000,2)
+        w,h = rng.uniform(1,k % 20 and 150 or 3000,2)
+        store.add([(x,y),(x+w,y),(x+w,y+h),(x,y+h)],k % 3 and 'A' or 'B')
+
+def bruteQuery(store,bbox,layers=None):
+    x0,y0,x1,y1 = polygonBoxes(store)
+    hit = (x0 <= bbox[2]) & (x1 >= bbox[0]) & (y0 <= bbox[3]) & (y1 >= bbox[1])
+    if layers is not None:
+        hit &= np.isin([store.layer(i) for i in range(store.n)],layers)
+    return np.nonzero(hit)[0]
+
+def test_query():
+    rng = np.random.default_rng(3)
+    store = randomStore(rng,400)
+    index = SpatialIndex(store,cell=100)
+    for k in range(50):
+        x,y = rng.uniform(-2500,2500,2)
+        bbox = (x,y,x+rng.uniform(0,600),y+rng.uniform(0,600))
+        assert index.query(bbox).tolist() == bruteQuery(store,bbox).tolist()
+        assert index.query(bbox,['B']).tolist() == bruteQuery(store,bbox,['B']).tolist()
+        #polygons appended later are found by the next query
+        addRandom(store,rng,5)
+    store.remove(np.arange(0,store.n,4))
+    assert index.query((-3000,-3000,3000,3000)).tolist() == list(range(store.n))
+
+def test_nearest():
+    rng = np.random.default_rng(5)
+    store = randomStore(rng,300)
+    index = SpatialIndex(store,cell=50)
+    for k in range(50):
+        x,y = rng.uniform(-4000,4000,2)
+        i,dist = index.nearest((x,y))
+        assert np.isclose(dist,polygonDistance(store,np.arange(store.n),x,y).min())
+        assert np.isclose(polygonDistance(store,[i],x,y)[0],dist)
+    assert SpatialIndex(GeometryStore()).nearest((0,0)) == (None,np.inf)
+
+def test_chipQuery(tmp_path):
+    #chip queries include polygons placed by inserts, and polygons added after the first query
+    wafer = m.Wafer('index',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL')
+    block = dxf.block('PAD')
+    block.add(dxf.rectangle((0,0),10,10))
+    chip.addBlock(block)
+    chip.add(dxf.insert('PAD',insert=(1000,1000),columns=3,rows=1,colspacing=100,rowspacing=0))
+    assert len(chip.query((0,0,7000,7000))) == 3
+    chip.add(dxf.rectangle((1150,1000),20,20))
+    assert len(chip.query((1140,990,1180,1030))) == 1
+    pts,dist = chip.nearest((1105,1005))
+    assert dist == 0 and np.allclose(pts.min(axis=0),(1100,1000))
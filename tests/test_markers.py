@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:13:48 2026
+
+@author: sasha
+
+Glyph blocks for text (run with pytest, maskLib has to be importable)
+"""
+import numpy as np
+from dxfwrite.entities import Insert
+
+import maskLib.MaskLib as m
+from maskLib.geometryLib import GeometryStore
+from maskLib.markerLib import AlphaNumLabels, AlphaNumStr
+
+def newChip(path,ID='A'):
+    wafer = m.Wafer('glyphs',str(path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4],['MARKERS',2]])
+    wafer.init()
+    return m.Chip(wafer,ID,'BASEMETAL')
+
+def polygons(chip):
+    #every polygon on the chip, inserts expanded, as (layer, rounded vertices) in a fixed order
+    store = GeometryStore()
+    for i in range(chip.geometry.n):
+        store.add(chip.geometry.polygon(i),*chip.geometry.properties(i))
+    store.addReferences(chip.chipBlock.get_data(),chip.subBlocks)
+    return sorted((store.layer(i),np.round(store.polygon(i),6).tolist()) for i in range(store.n))
+
+def test_glyphsMatchStrokes(tmp_path):
+    strokes,glyphs = newChip(tmp_path),newChip(tmp_path)
+    for chip,instance in ((strokes,False),(glyphs,True)):
+        AlphaNumStr(chip,m.Structure(chip,start=(1000,2000),direction=30),'abc12a',(80,120),centered=True,layer='MARKERS',instance=instance)
+    #one block per distinct character
+    assert len(glyphs.subBlocks) == 5
+    assert len([e for e in glyphs.chipBlock.get_data() if isinstance(e,Insert)]) == 6
+    assert polygons(glyphs) == polygons(strokes)
+
+def test_labels(tmp_path):
+    single,labels = newChip(tmp_path),newChip(tmp_path)
+    positions,strings = [(500,500),(3000,1200),(2000,4000)],['a1','b22','c']
+    for pos,string in zip(positions,strings):
+        AlphaNumStr(single,m.Structure(single,start=pos,direction=90),string,(60,60),centered=True)
+    AlphaNumLabels(labels,positions,strings,(60,60),rotation=90,centered=True)
+    assert polygons(labels) == polygons(single)
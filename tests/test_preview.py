@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:16:04 2026
+
+@author: sasha
+
+PNG previews (run with pytest, maskLib has to be importable)
+"""
+import struct
+import zlib
+
+import numpy as np
+from dxfwrite import DXFEngine as dxf
+
+import maskLib.MaskLib as m
+from maskLib.exportLib import ACI_RGB, Raster
+from maskLib.geometryLib import GeometryStore
+
+def readPNG(fileName):
+    #(height,width,3) array of an 8 bit RGB png without filters, as writePNG makes them
+    data = open(fileName,'rb').read()
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    width,height = struct.unpack('>II',data[16:24])
+    idat = b''
+    i = 8
+    while i < len(data):
+        n,tag = struct.unpack('>I4s',data[i:i+8])
+        if tag == b'IDAT':
+            idat += data[i+8:i+8+n]
+        i += n+12
+    rows = np.frombuffer(zlib.decompress(idat),dtype=np.uint8).reshape(height,1+3*width)
+    assert not rows[:,0].any()
+    return rows[:,1:].reshape(height,width,3)
+
+def test_aciColors():
+    assert ACI_RGB[1].tolist() == [255,0,0] and ACI_RGB[5].tolist() == [0,0,255] and ACI_RGB[7].tolist() == [255,255,255]
+    assert ACI_RGB[10].tolist() == [255,0,0] and ACI_RGB[255].tolist() == [255,255,255]
+
+def test_paint(tmp_path):
+    #a filled 30x20 rectangle at 1 unit pixels covers 600 pixels in its layer color, an outline only the pixels its edges cross
+    store = GeometryStore()
+    store.add([(10,10),(40,10),(40,30),(10,30)],'A',bgcolor=1)
+    store.add([(50.5,10.5),(60.5,10.5),(60.5,20.5),(50.5,20.5)],'B',bgcolor=None)
+    raster = Raster(0,0,100,50,1).paint([store],{'A':1,'B':5},alpha=1)
+    assert raster.covered[:50].sum() == 600 and raster.covered[50:].sum() == 40
+    assert raster.rgb[20,15].tolist() == [255,0,0]
+    assert raster.covered[55,15] == False and raster.covered[50,15] == True
+    raster.save(str(tmp_path/'test.png'))
+    png = readPNG(str(tmp_path/'test.png'))
+    #rows top to bottom
+    assert png.shape == (50,100,3) and png[49-15,20].tolist() == [255,0,0]
+
+def test_blit():
+    tile = Raster(0,0,10,10,1)
+    tile.rgb[:] = 200
+    tile.covered[:5] = True
+    big = Raster(-20,-20,40,40,1)
+    big.blit(tile,5,5)
+    assert big.covered.sum() == 50
+    assert big.covered[25:30,25:35].all()
+
+def test_chipPreview(tmp_path):
+    wafer = m.Wafer('preview',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL')
+    chip.add(dxf.rectangle((1000,1000),2000,1000,bgcolor=4,layer='BASEMETAL'))
+    chip.preview(str(tmp_path/'chip.png'),dpi=254)
+    png = readPNG(str(tmp_path/'chip.png'))
+    #100um pixels: the chip plus its saw lane (7203.2um) is 73 pixels. The raster starts half a lane
+    #(101.6um) before the chip, so the 20x10 pixel rectangle touches 21x11 pixels
+    assert png.shape == (73,73,3)
+    assert (png.any(axis=2)).sum() == 21*11
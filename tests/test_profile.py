@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:07:30 2026
+
+@author: sasha
+
+Build profiling (run with pytest, maskLib has to be importable)
+"""
+import json
+
+import maskLib.MaskLib as m
+import maskLib.microwaveLib as mw
+from maskLib.profileLib import activeProfiler
+
+def build(path,profile):
+    wafer = m.Wafer('prof',str(path)+'/',7000,7000,frame=False,markers=False,profile=profile)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL',defaults={'w':10,'s':6,'radius':50})
+    mw.CPW_straight(chip,m.Structure(chip,start=(100,100)),500)
+    return wafer,chip
+
+def test_profileRecordsUntilSave(tmp_path):
+    wafer,chip = build(tmp_path,True)
+    assert activeProfiler() is wafer.profiler
+    row = wafer.profiler.summary()['microwaveLib.CPW_straight']
+    assert row[0] == 1 and row[3] > 0
+    wafer.save()
+    assert activeProfiler() is None
+    #calls after the save are not recorded in the saved wafer's profile
+    mw.CPW_straight(chip,m.Structure(chip,start=(100,300)),500)
+    assert wafer.profiler.summary()['microwaveLib.CPW_straight'][0] == 1
+    wafer.saveProfile()
+    profile = json.load(open(str(tmp_path)+'/prof.speedscope.json'))
+    for track in profile['profiles']:
+        opened = [e['type'] for e in track['events']]
+        assert opened.count('O') == opened.count('C')
+
+def test_unprofiledWaferStopsProfile(tmp_path):
+    wafer,chip = build(tmp_path,True)
+    other,chip = build(tmp_path,False)
+    assert activeProfiler() is None and other.profiler is None
+    assert wafer.profiler.summary()['microwaveLib.CPW_straight'][0] == 1
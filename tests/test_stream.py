@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:09:52 2026
+
+@author: sasha
+
+Streaming dxf output (run with pytest, maskLib has to be importable)
+"""
+import os
+
+from dxfwrite import DXFEngine as dxf
+
+import maskLib.MaskLib as m
+import maskLib.microwaveLib as mw
+import maskLib.drcLib as drc
+
+def build(path,stream):
+    os.makedirs(path,exist_ok=True)
+    wafer = m.Wafer('stream',str(path)+'/',7000,7000,stream=stream)
+    wafer.SetupLayers([['BASEMETAL',4],['MARKERS',2]])
+    wafer.init()
+    chip = m.Chip(wafer,'A','BASEMETAL',defaults={'w':10,'s':6,'radius':50})
+    s = m.Structure(chip,start=(100,3000))
+    mw.CPW_straight(chip,s,1000)
+    mw.CPW_bend(chip,s,90,radius=100)
+    mw.CPW_straight(chip,s,500)
+    chip.add(dxf.text('A',(500,500),height=100,layer='MARKERS'))
+    mw.waffle(chip,200,width=20,layer='MARKERS')
+    chip.save(wafer)
+    for i in range(len(wafer.chips)):
+        wafer.setChipBuffer(chip,i)
+    wafer.populate()
+    wafer.save()
+    return wafer,chip
+
+def test_streamMatchesDrawing(tmp_path):
+    build(tmp_path/'drawing',False)
+    build(tmp_path/'stream',True)
+    drawing = open(tmp_path/'drawing'/'stream.dxf','rb').read()
+    assert len(drawing) > 0 and open(tmp_path/'stream'/'stream.dxf','rb').read() == drawing
+
+def test_streamedChipIsOnDisk(tmp_path,capsys):
+    wafer,chip = build(tmp_path,True)
+    capsys.readouterr()
+    assert chip.query((0,0,7000,7000)) == []
+    assert chip.nearest((100,3000))[0] is None
+    assert drc.checkChip(chip,drc.lincolnLabsRules(wafer),verbose=False) == []
+    chip.preview(str(tmp_path/'chip.png'))
+    assert capsys.readouterr().out.count('Error:') == 4
+    assert not os.path.exists(tmp_path/'chip.png')
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:06:12 2026
+
+@author: sasha
+
+Structure positioning and defaults (run with pytest, maskLib has to be importable)
+"""
+import math
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from dxfwrite.algebra import rotate_2d
+from dxfwrite.vector2d import vadd
+
+import maskLib.MaskLib as m
+from maskLib.MaskLib import Defaults, Structure
+
+def chip():
+    return SimpleNamespace(defaults={'w':10,'s':6})
+
+@pytest.mark.parametrize('direction',[0,30,90,135,180,270,-45])
+def test_getPos(direction):
+    #same arithmetic as vadd(start,rotate_2d(vector,radians(direction)))
+    s = Structure(chip(),start=(12.5,-3),direction=direction)
+    for v in [(0,0),(10,0),(0,10),(-3.5,7.25)]:
+        assert s.getPos(v) == vadd(s.start,rotate_2d(v,math.radians(direction)))
+    assert s.getPos(distance=7) == vadd(s.start,rotate_2d((7,0),math.radians(direction)))
+    pts = np.array([(0,0),(10,0),(0,10),(-3.5,7.25)])
+    assert np.array_equal(s.getPosMany(pts),np.array([s.getPos(p) for p in pts]))
+
+def test_shiftPos():
+    s = Structure(chip(),start=(1,2),direction=60)
+    end = vadd((1,2),rotate_2d((5,0),math.radians(60)))
+    s.shiftPos(5,angle=30)
+    assert s.start == end and s.direction == 90 and s.last == (1,2)
+    #the previous direction is still used by getLastPos
+    assert s.getLastPos((5,0)) == end
+
+def test_defaultsShared():
+    c = chip()
+    c.defaults = Defaults(c.defaults)
+    s = Structure(c)
+    #read through to the same dict until one side writes
+    assert s.defaults._data is c.defaults._data
+    s.defaults['w'] = 20
+    assert c.defaults['w'] == 10 and s.defaults['w'] == 20
+    c.defaults['s'] = 8
+    assert s.defaults['s'] == 6
+    #clones take their own snapshot of the parent defaults
+    t = s.clone()
+    del t.defaults['s']
+    assert 's' in s.defaults and 's' not in t.defaults
+
+def test_defaultsCopy():
+    d = Defaults({'w':10})
+    e = d.copy()
+    e['w'] = 5
+    d['r'] = 1
+    assert dict(d) == {'w':10,'r':1} and dict(e) == {'w':5}
+
+def test_defaultsPickle():
+    d = Defaults({'w':10})
+    e = d.copy()
+    p = pickle.loads(pickle.dumps(e))
+    assert isinstance(p,Defaults) and dict(p) == {'w':10} and not p._shared
+    assert pickle.dumps(d) == pickle.dumps(Defaults({'w':10}))
+
+def test_chipDefaults(tmp_path):
+    wafer = m.Wafer('defaults',str(tmp_path)+'/',7000,7000,frame=False,markers=False)
+    plain = {'w':10}
+    c = m.Chip(wafer,'A','BASEMETAL',defaults=plain)
+    assert isinstance(c.defaults,Defaults) and isinstance(m.Chip(wafer,'B','BASEMETAL').defaults,Defaults)
+    #assigned dicts are copied, not aliased
+    c.defaults['w'] = 20
+    assert plain == {'w':10}
+    c.defaults = {'s':6}
+    assert isinstance(c.defaults,Defaults) and dict(c.defaults) == {'s':6}
+
+def test_slots():
+    s = Structure(chip())
+    assert not hasattr(s,'__dict__') and not hasattr(s.defaults,'__dict__')
+    with pytest.raises(AttributeError):
+        s.width = 10
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:11:26 2026
+
+@author: sasha
+
+Point generation helpers (run with pytest, maskLib has to be importable)
+"""
+import math
+
+import numpy as np
+import pytest
+from dxfwrite.algebra import rotate_2d
+from dxfwrite.vector2d import vadd, vsub, midpoint, vmul_scalar
+
+from maskLib.utilities import arcSegments, bulgePoints, curveAB, transformPoints
+
+def loopCurveAB(a,b,clockwise=True,angleDeg=90,ptDensity=120):
+    #point by point version with dxfwrite vector math
+    angle = math.radians(angleDeg)
+    segments = int(angle/(2*math.pi) *ptDensity)
+    center = vadd(midpoint(a,b),vmul_scalar(rotate_2d(vsub(b,a),-clockwise*math.pi/2),0.5/math.tan(angle/2)))
+    return [vadd(center,rotate_2d(vsub(a,center),-clockwise*i*angle/segments)) for i in range(segments+1)]
+
+@pytest.mark.parametrize('clockwise,angleDeg',[(1,90),(-1,90),(1,45),(-1,170)])
+def test_curveAB(clockwise,angleDeg):
+    a,b = (10,-5),(30,12.5)
+    pts = curveAB(a,b,clockwise,angleDeg,ptDensity=360)
+    ref = loopCurveAB(a,b,clockwise,angleDeg,ptDensity=360)
+    assert len(pts) == len(ref)
+    assert np.allclose(pts,ref,rtol=0,atol=1e-12)
+    assert np.allclose(pts[-1],b,rtol=0,atol=1e-9)
+
+def test_transformPoints():
+    pts = [(0,0),(1,0),(2.5,-3),(-7,4)]
+    out = transformPoints(pts,(10,20),math.radians(33))
+    assert out.tolist() == [list(vadd((10,20),rotate_2d(p,math.radians(33)))) for p in pts]
+    assert transformPoints([],(1,1),0.5).shape == (0,2)
+
+@pytest.mark.parametrize('radius,angleDeg,tolerance',[(100,90,0.01),(100,90,0.5),(5,360,0.001),(2000,30,0.005)])
+def test_arcSegments(radius,angleDeg,tolerance):
+    #fewest segments with a chord error (sagitta) within tolerance
+    n = arcSegments(radius,angleDeg,tolerance)
+    sagitta = lambda k: radius*(1-math.cos(math.radians(angleDeg)/k/2))
+    assert sagitta(n) <= tolerance*(1+1e-9)
+    assert n == 1 or sagitta(n-1) > tolerance
+    assert arcSegments(radius,angleDeg) is None
+
+def test_curveABTolerance():
+    #with a tolerance the point count follows the radius, without it ptDensity
+    a,b = (0,0),(100,100)
+    pts = np.array(curveAB(a,b,1,90,tolerance=0.01))
+    center = (100,0)
+    assert np.allclose(np.hypot(pts[:,0]-center[0],pts[:,1]-center[1]),100)
+    mid = (pts[1:]+pts[:-1])/2
+    assert (100-np.hypot(mid[:,0]-center[0],mid[:,1]-center[1])).max() <= 0.01
+    assert len(pts) == arcSegments(100,90,0.01)+1
+    assert len(curveAB(a,b,1,90,ptDensity=120)) == 31
+
+def test_bulgePoints():
+    #half circle from (0,0) to (10,0), counterclockwise: below the chord
+    pts = bulgePoints((0,0),(10,0),1,tolerance=0.001)
+    assert np.allclose(np.hypot(pts[:,0]-5,pts[:,1]),5)
+    assert pts[len(pts)//2][1] < 0 and tuple(pts[-1]) == (10,0)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:14:33 2026
+
+@author: sasha
+
+Wafer level placement (run with pytest, maskLib has to be importable)
+"""
+import pytest
+from dxfwrite.entities import Insert
+
+import maskLib.MaskLib as m
+
+def newWafer(path,chipSize=1000,diameter=m.waferDiameters['2in'],**kwargs):
+    wafer = m.Wafer('wafer',str(path)+'/',chipSize,chipSize,waferDiameter=diameter,**kwargs)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    return wafer
+
+def placements(wafer):
+    #every block placement of the top level inserts, arrays expanded: (block, layer, x, y)
+    out = []
+    for e in wafer.drawing.entities.entities:
+        if not isinstance(e,Insert):
+            continue
+        attr = lambda key,default: key in e.attribs and e[key] or default
+        x,y = e['insert']['xy'][:2]
+        for i in range(attr('columns',1)):
+            for j in range(attr('rows',1)):
+                out.append((e['blockname'],e['layer'],round(x+i*attr('colspacing',0),6),round(y+j*attr('rowspacing',0),6)))
+    return sorted(out)
+
+def inserts(wafer):
+    return sum(isinstance(e,Insert) for e in wafer.drawing.entities.entities)
+
+@pytest.mark.parametrize('step',['populate','DicingBorder','mark1000'])
+def test_arrayedPlacements(tmp_path,step):
+    wafers = [newWafer(tmp_path) for arrayed in (True,False)]
+    for wafer,arrayed in zip(wafers,(True,False)):
+        before = inserts(wafer)
+        if step == 'populate':
+            #two different chips, the second one on a few scattered positions
+            other = m.Chip(wafer,'OTHER','BASEMETAL')
+            for i in range(0,len(wafer.chips),7):
+                wafer.setChipBuffer(other,i)
+            wafer.populate(arrayed=arrayed)
+        elif step == 'DicingBorder':
+            wafer.DicingBorder(arrayed=arrayed)
+        else:
+            wafer.mark1000(400,0,len(wafer.chipPts)-1,'MARKERS',arrayed=arrayed)
+        wafer.added = inserts(wafer)-before
+    arrayed,single = wafers
+    assert placements(arrayed) == placements(single)
+    assert arrayed.added < single.added
+
+def test_insertGridOffLattice(tmp_path):
+    #a 3x2 block of lattice points becomes one array, the odd point its own insert
+    wafer = newWafer(tmp_path)
+    dx,dy = wafer.chipX,wafer.chipY
+    pts = [(i*dx,j*dy) for i in range(3) for j in range(2)] + [(333,333)]
+    before = inserts(wafer)
+    wafer.insertGrid('X',pts,'BASEMETAL')
+    assert inserts(wafer)-before == 2
+    assert [p[2:] for p in placements(wafer) if p[0] == 'X'] == sorted((round(x,6),round(y,6)) for x,y in pts)
+
+def loopTiling(chipX,chipY,diameter,padding,singleChipRow=False,singleChipColumn=False):
+    #chip corners and column counts the way Wafer.init used to find them, one chip at a time
+    pts,columns = [],[]
+    r2 = (diameter/2 - padding)**2
+    nx = ny = 0
+    if singleChipColumn and singleChipRow:
+        pts.append([-0.5*chipX,-0.5*chipY])
+        columns.append(1)
+    elif singleChipColumn:
+        while ((ny+1)*chipY)**2 + (0.5*chipX)**2 < r2:
+            pts += [[-0.5*chipX,ny*chipY],[-0.5*chipX,(-ny-1)*chipY]]
+            ny += 1
+        columns.append(2*ny)
+    elif singleChipRow:
+        while ((nx+1)*chipX)**2 + chipY**2 < r2:
+            pts += [[nx*chipX,-0.5*chipY],[(-nx-1)*chipX,-0.5*chipY]]
+            columns.append(1)
+            nx += 1
+    else:
+        while ((nx+1)*chipX)**2 + chipY**2 < r2:
+            ny = 0
+            while ((ny+1)*chipY)**2 + ((nx+1)*chipX)**2 < r2:
+                pts += [[nx*chipX,ny*chipY],[nx*chipX,(-ny-1)*chipY],[(-nx-1)*chipX,ny*chipY],[(-nx-1)*chipX,(-ny-1)*chipY]]
+                ny += 1
+            columns.append(2*ny)
+            nx += 1
+    return sorted(pts),columns[::-1]
+
+@pytest.mark.parametrize('chipX,chipY,diameter,padding',[(7000,7000,50800,2500),(1203.2,1203.2,50800,2500),(3000,9000,76200,1000),(10000,2000,101600,5000)])
+@pytest.mark.parametrize('singleChipRow,singleChipColumn',[(False,False),(True,False),(False,True),(True,True)])
+def test_tiling(chipX,chipY,diameter,padding,singleChipRow,singleChipColumn):
+    wafer = m.Wafer('tiles','',chipX-203.2,chipY-203.2,waferDiameter=diameter,padding=padding,
+                    singleChipRow=singleChipRow,singleChipColumn=singleChipColumn)
+    wafer.init()
+    pts,columns = loopTiling(wafer.chipX,wafer.chipY,diameter,padding,singleChipRow,singleChipColumn)
+    assert wafer.chipPts == pts
+    assert wafer.chipColumns == columns
+    #every chip can be looked up by its column and row
+    grid = wafer.chipGrid
+    assert (wafer.chipIndex[grid['col'],grid['row']] == range(len(grid))).all()
+
+def test_flatAndNotch():
+    full = m.tileWafer(5000,5000,50800,1000)
+    flat = m.tileWafer(5000,5000,50800,1000,flat=32500)
+    notch = m.tileWafer(5000,5000,50800,1000,notch=5000)
+    yflat = -(25400**2 - 16250**2)**0.5 + 1000
+    assert len(flat) < len(full) and (flat['y'] >= yflat).all()
+    assert len(full[full['y'] >= yflat]) == len(flat)
+    #only chips near the bottom edge lose out to the notch
+    lost = set(map(tuple,full[['x','y']].tolist())) - set(map(tuple,notch[['x','y']].tolist()))
+    assert lost and all(y < -15000 and abs(x+2500) <= 5000 for x,y in lost)
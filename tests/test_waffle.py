@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:08:44 2026
+
+@author: sasha
+
+Waffle (ground plane hole) placement (run with pytest, maskLib has to be importable)
+"""
+import numpy as np
+from dxfwrite import DXFEngine as dxf
+from dxfwrite.entities import Insert
+
+import maskLib.MaskLib as m
+import maskLib.microwaveLib as mw
+from maskLib.geometryLib import rectangleCover
+
+def emptyChip(path,size=7000):
+    wafer = m.Wafer('waffle',str(path)+'/',size,size,frame=False,markers=False)
+    wafer.SetupLayers([['BASEMETAL',4]])
+    wafer.init()
+    return m.Chip(wafer,'A','BASEMETAL')
+
+def holes(chip,start=0):
+    #centers of the holes waffle added after polygon start
+    store = chip.geometry
+    return np.array([store.polygon(i).mean(axis=0) for i in range(start,store.n)])
+
+def test_closedPolylineIsOccupied(tmp_path):
+    chip = emptyChip(tmp_path)
+    chip.add(dxf.polyline([(1000,1000),(3000,1000),(3000,3000),(1000,3000)],flags=1,layer='BASEMETAL'))
+    #open polylines are lines, not areas
+    chip.add(dxf.polyline([(4000,4000),(5000,4000),(5000,5000)],layer='BASEMETAL'))
+    mw.waffle(chip,100)
+    h = holes(chip)
+    inside = (h[:,0] > 1000) & (h[:,0] < 3000) & (h[:,1] > 1000) & (h[:,1] < 3000)
+    assert len(h) > 0 and not inside.any()
+    assert ((np.abs(h[:,0]-4550) < 50) & (np.abs(h[:,1]-4550) < 50)).any()
+
+def loopOccupied(polys,nx,ny,grid,radius):
+    #cell by cell occupancy with matplotlib paths, as waffle did it before rasterizing
+    from matplotlib.path import Path
+    from matplotlib.transforms import Bbox
+    occupied = np.zeros((nx,ny),dtype=bool)
+    occupied[:,[0,-1]] = True
+    occupied[[0,-1],:] = True
+    for pts in polys:
+        pts = np.vstack((pts,pts[:1]))/grid
+        cells = [(int(x),int(y)) for x,y in pts if 0 <= int(x) < nx and 0 <= int(y) < ny]
+        if not cells:
+            continue
+        path = Path(pts,closed=True)
+        xs,ys = [c[0] for c in cells],[c[1] for c in cells]
+        for x in range(max(min(xs)-1,0),min(max(xs)+2,nx)):
+            for y in range(max(min(ys)-1,0),min(max(ys)+2,ny)):
+                if path.contains_point([x+.5,y+.5]) or path.intersects_bbox(Bbox.from_bounds(x,y,1.,1.),filled=True):
+                    occupied[x,y] = True
+    for r in range(radius):
+        grown = occupied.copy()
+        grown[1:] |= occupied[:-1]
+        grown[:-1] |= occupied[1:]
+        grown[:,1:] |= occupied[:,:-1]
+        grown[:,:-1] |= occupied[:,1:]
+        occupied = grown
+    return occupied
+
+def test_matchesCellLoop(tmp_path):
+    chip = emptyChip(tmp_path,3000)
+    chip.defaults = {'w':10,'s':6,'radius':80}
+    s = m.Structure(chip,start=(150,1500),direction=10)
+    for k in range(3):
+        mw.CPW_straight(chip,s,900)
+        mw.CPW_bend(chip,s,180,CCW=k%2==0)
+    chip.add(dxf.rectangle((2200,300),300,120,rotation=35,layer='BASEMETAL'))
+    store = chip.geometry
+    polys = [store.polygon(i) for i in store.select(outline=True)]
+    grid = 37.5
+    nx,ny = int(chip.width/grid),int(chip.height/grid)
+    expected = loopOccupied(polys,nx,ny,grid,2)
+    start = store.n
+    mw.waffle(chip,grid,width=5,bleedRadius=2)
+    i,j = np.nonzero(~expected)
+    assert sorted(map(tuple,holes(chip,start).tolist())) == sorted(zip((i*grid+grid/2).tolist(),(j*grid+grid/2).tolist()))
+
+def test_holeBlock(tmp_path):
+    #arrayed inserts of one hole block cover the same cells as the individual holes
+    def draw(chip):
+        s = m.Structure(chip,start=(150,1500),direction=-20,defaults={'w':10,'s':6,'radius':80})
+        mw.CPW_straight(chip,s,1200)
+        mw.CPW_bend(chip,s,90)
+        mw.CPW_straight(chip,s,600)
+        return chip.geometry.n
+    plain,arrayed = emptyChip(tmp_path,3000),emptyChip(tmp_path,3000)
+    start = draw(plain)
+    draw(arrayed)
+    mw.waffle(plain,50,width=8,padx=200)
+    mw.waffle(arrayed,50,width=8,padx=200,holeBlock=True)
+    inserts = [e for e in arrayed.chipBlock.get_data() if isinstance(e,Insert)]
+    assert list(arrayed.subBlocks) == ['WAFFLE_0_8x8'] and 0 < len(inserts) < len(holes(plain,start))
+    centers = []
+    for e in inserts:
+        x,y = e['insert']['xy'][:2]
+        cols,rows = 'columns' in e.attribs and e['columns'] or 1,'rows' in e.attribs and e['rows'] or 1
+        centers.extend((x+50*i,y+50*j) for i in range(cols) for j in range(rows))
+    assert sorted(centers) == sorted(map(tuple,holes(plain,start).tolist()))
+
+def test_rectangleCover():
+    mask = np.random.default_rng(7).random((40,30)) > 0.3
+    mask[5:25,3:20] = True
+    cover = np.zeros(mask.shape,dtype=int)
+    for i,j,ni,nj in zip(*rectangleCover(mask)):
+        cover[i:i+ni,j:j+nj] += 1
+    assert np.array_equal(cover,mask.astype(int))
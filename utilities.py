@@ -8,35 +8,73 @@ from dxfwrite import DXFEngine as dxf
 from dxfwrite.algebra import rotate_2d
 from dxfwrite.vector2d import vadd,midpoint,vmul_scalar,vsub
 import math
+import numpy as np
 
 # ===============================================================================
 #  UTILITY FUNCTIONS  
 # ===============================================================================
      
+#arc tolerance (max chord error, same units as the drawing) is a wafer setting (Wafer.arcTolerance), passed in by the caller.
+#None: use each function's ptDensity
 
-def curveAB(a,b,clockwise=True,angleDeg=90,ptDensity=120):
+def bulgePoints(a,b,bulge,ptDensity=120,tolerance=None):
+    # points from A to B (inclusive) along a dxf bulge arc. bulge = tan(angle/4), positive is counterclockwise
+    angle = 4*math.atan(bulge)
+    segments = max(arcSegments(math.dist(a,b)/(2*math.sin(abs(angle)/2)),math.degrees(angle),tolerance) or int(abs(angle)/(2*math.pi)*ptDensity),1)
+    #chord midpoint, then the center is offset perpendicular to the chord
+    mx,my = (a[0]+b[0])/2,(a[1]+b[1])/2
+    d = (1-bulge**2)/(4*bulge)
+    cx,cy = mx - d*(b[1]-a[1]),my + d*(b[0]-a[0])
+    theta = math.atan2(a[1]-cy,a[0]-cx) + np.arange(segments+1)*angle/segments
+    r = math.hypot(a[0]-cx,a[1]-cy)
+    pts = np.column_stack((cx + r*np.cos(theta),cy + r*np.sin(theta)))
+    pts[-1] = b[:2]
+    return pts
+
+def arcSegments(radius,angleDeg,tolerance=None):
+    # number of segments needed to keep the chord error of an arc below tolerance
+    # returns None if no tolerance is given (caller falls back to its ptDensity)
+    if tolerance is None:
+        return None
+    if abs(radius) <= tolerance/2:
+        return 1
+    step = 2*math.acos(1 - tolerance/abs(radius))
+    return max(int(math.ceil(math.radians(abs(angleDeg))/step - 1e-9)),1)
+
+
+def curveAB(a,b,clockwise=True,angleDeg=90,ptDensity=120,tolerance=None):
     # generate a segmented curve from A to B specified by angle. Point density = #pts / revolution
     # return list of points
     # clockwise can be boolean {1,0} or sign type {1,-1}
+    # tolerance: max chord error (usually chip.wafer.arcTolerance), overrides ptDensity. Leave out when the points themselves matter (bond positions)
     
     if clockwise == 0:
         clockwise = -1
         
     angle = math.radians(angleDeg)
-    segments = int(angle/(2*math.pi) *ptDensity)
+    segments = arcSegments(math.dist(a,b)/(2*math.sin(angle/2)),angleDeg,tolerance) or int(angle/(2*math.pi) *ptDensity)
     center = vadd(midpoint(a,b),vmul_scalar(rotate_2d(vsub(b,a),-clockwise*math.pi/2),0.5/math.tan(angle/2)))
-    points = []
-    for i in range(segments+1):
-        points.append(vadd(center,rotate_2d(vsub(a,center),-clockwise*i*angle/segments)))
-    return points
+    #rotate (a - center) through all segment angles at once
+    theta = -clockwise*np.arange(segments+1)*angle/segments
+    x0,y0 = vsub(a,center)
+    cos,sin = np.cos(theta),np.sin(theta)
+    return list(zip((center[0] + (x0*cos - y0*sin)).tolist(),(center[1] + (y0*cos + x0*sin)).tolist()))
 
-def cornerRound(vertex,quadrant,radius,clockwise=True,ptDensity=120):
+def cornerRound(vertex,quadrant,radius,clockwise=True,ptDensity=120,tolerance=None):
     #quadrant corresponds to quadrants 1-4
     #generate a curve to replace the vertex
     ptA = vadd(vertex,rotate_2d((0,radius),quadrant * math.pi/2))
     ptB = vadd(vertex,rotate_2d((0,radius),(quadrant+1) * math.pi/2))
 
-    return clockwise>0 and curveAB(ptA,ptB,1,ptDensity=ptDensity) or curveAB(ptB,ptA,-1,ptDensity=ptDensity)
+    return clockwise>0 and curveAB(ptA,ptB,1,ptDensity=ptDensity,tolerance=tolerance) or curveAB(ptB,ptA,-1,ptDensity=ptDensity,tolerance=tolerance)
+
+def transformPoints(points,insert=(0,0),rotation=0.):
+    #rotate an array of points about the origin (radians), then move to insert. Same as vadd(insert,rotate_2d(p,rotation)) for each point
+    pts = np.asarray(points,dtype=np.float64)
+    if len(pts) == 0:
+        return np.empty((0,2))
+    cos,sin = math.cos(rotation),math.sin(rotation)
+    return np.column_stack((insert[0] + (pts[:,0]*cos - pts[:,1]*sin),insert[1] + (pts[:,1]*cos + pts[:,0]*sin)))
 
 def transformedQuadrants(vflip=False,hflip=False):
     #return quadrant list with vertical and horizontal flips applied. Updated to match dxfwrite style